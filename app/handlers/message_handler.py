@@ -1,8 +1,9 @@
 import uuid
 import logging
-from app.services.dynamodb import is_duplicate_message, mark_message_as_processed
+from app.services.dynamodb import claim_message, complete_message
 from app.services.openai_service import (
     check_if_thread_exists,
+    client,
     run_assistant_and_get_response,
 )
 from app.services.whatsapp_service import (
@@ -13,6 +14,7 @@ from app.services.whatsapp_service import (
     save_file_to_s3,
 )
 from app.services.dynamodb import save_thread
+from app.utils.deadline import new_deadline
 
 
 def is_valid_whatsapp_message(body):
@@ -31,13 +33,56 @@ def extract_whatsapp_message(body):
     return wa_id, name, message
 
 
+def iter_whatsapp_messages(body):
+    """
+    Yield (wa_id, name, message) for every message in every change of every
+    entry. Meta batches several messages/changes into one delivery under load,
+    so looking only at entry[0].changes[0].messages[0] drops the rest.
+    """
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            contacts = value.get("contacts") or []
+            names = {
+                c.get("wa_id"): (c.get("profile") or {}).get("name") for c in contacts
+            }
+            default_wa_id = contacts[0].get("wa_id") if contacts else None
+            for message in value.get("messages") or []:
+                wa_id = message.get("from") or default_wa_id
+                if not wa_id:
+                    logging.warning("Skipping message without sender: %s", message)
+                    continue
+                yield wa_id, names.get(wa_id) or "Candidate", message
+
+
+def iter_whatsapp_statuses(body):
+    """Yield every status object across all entries/changes."""
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for status in value.get("statuses") or []:
+                yield status
+
+
+def build_sqs_payload(wa_id, name, message):
+    """Normalize one WhatsApp message into the payload the SQS worker expects."""
+    return {
+        "wa_id": wa_id,
+        "name": name,
+        "message_type": message.get("type"),
+        "message_body": message.get("text", {}).get("body"),
+        "media_id": message.get("document", {}).get("id"),
+        "filename": message.get("document", {}).get("filename"),
+        "message_id": message.get("id"),
+        # Every stage downstream sizes its timeouts from this
+        "deadline_at": new_deadline(),
+    }
+
+
 def initialize_thread_if_needed(wa_id):
     thread_id = check_if_thread_exists(wa_id)
     if not thread_id:
         logging.info("Creating new thread for wa_id %s", wa_id)
-        from openai import OpenAI
-
-        client = OpenAI()
         thread = client.beta.threads.create()
         thread_id = thread.id
         save_thread(wa_id, thread_id)
@@ -93,11 +138,10 @@ def handle_whatsapp_event(body):
         message_id = message["id"]
         msg_type = message["type"]
 
-        if is_duplicate_message(message_id):
+        if not claim_message(message_id):
             logging.info("Duplicate message %s ignored.", message_id)
             return
 
-        mark_message_as_processed(message_id)
         thread_id = initialize_thread_if_needed(wa_id)
 
         if msg_type == "document":
@@ -106,6 +150,7 @@ def handle_whatsapp_event(body):
             handle_text_message(wa_id, name, message["text"]["body"])
         else:
             logging.warning("Unhandled message type: %s", msg_type)
+        complete_message(message_id)
 
     except Exception as e:
         logging.exception("Failed to handle WhatsApp event: %s", str(e))
@@ -1,17 +1,27 @@
 # --- app/routes/webhook.py ---
 import logging
+import os
 from flask import Blueprint, request, jsonify, current_app
 
+from app.utils.cache import TTLCache
 from app.utils.responses import respond_error
 from app.decorators.security import signature_required
-from app.services.sqs import push_message_to_sqs
+from app.services.sqs import push_messages_to_sqs
 from app.handlers.message_handler import (
-    is_valid_whatsapp_message,
-    extract_whatsapp_message,
+    iter_whatsapp_messages,
+    iter_whatsapp_statuses,
+    build_sqs_payload,
 )
 
 webhook_blueprint = Blueprint("webhook", __name__)
 
+# Message IDs this process already enqueued; Meta retries deliveries it thinks
+# failed, and those are dropped here before any SQS call.
+_enqueued_ids = TTLCache(
+    maxsize=int(os.getenv("RECENT_MESSAGE_IDS_SIZE", "50000")),
+    ttl=float(os.getenv("RECENT_MESSAGE_IDS_TTL", "3600")),
+)
+
 
 @webhook_blueprint.route("/webhook", methods=["GET"])
 def webhook_get():
@@ -31,26 +41,18 @@ def webhook_get():
 def webhook_post():
     try:
         body = request.get_json()
-        if is_valid_whatsapp_message(body):
-            wa_id, name, message = extract_whatsapp_message(body)
-            push_message_to_sqs(
-                {
-                    "wa_id": wa_id,
-                    "name": name,
-                    "message_type": message.get("type"),
-                    "message_body": message.get("text", {}).get("body"),
-                    "media_id": message.get("document", {}).get("id"),
-                    "filename": message.get("document", {}).get("filename"),
-                    "message_id": message.get("id"),
-                }
-            )
-        statuses = (
-            body.get("entry", [])[0]
-            .get("changes", [])[0]
-            .get("value", {})
-            .get("statuses", [])
-        )
-        for status in statuses:
+        payloads = [
+            build_sqs_payload(wa_id, name, message)
+            for wa_id, name, message in iter_whatsapp_messages(body)
+            if message.get("id") not in _enqueued_ids
+        ]
+        if payloads:
+            push_messages_to_sqs(payloads)
+            for payload in payloads:
+                if payload["message_id"]:
+                    _enqueued_ids.set(payload["message_id"], True)
+
+        for status in iter_whatsapp_statuses(body):
             message_id = status.get("id")
             status_type = status.get("status")
             errors = status.get("errors", [])
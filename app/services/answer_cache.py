@@ -0,0 +1,223 @@
+# --- app/services/answer_cache.py ---
+# Most inbound texts are the same few questions (salary, location, remote,
+# how to apply). The answer cache sits in front of generate_response: exact
+# hits on normalized text, then a character-shingle Jaccard match for
+# rephrasings. Only generic questions are cached, only answers generated
+# without any earlier conversation are stored (the caller decides that), and
+# the candidate's name is templated out, so nothing personal is shared between
+# candidates. A rephrasing must not differ in a negation or a content word
+# ("not remote", "java" vs "python"), which shingles alone would let through.
+# Entries are dropped wholesale when the fingerprint (JD corpus + run
+# instructions) changes.
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+
+from app.utils.cache import TTLCache
+
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "0") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+ANSWER_CACHE_MAX_WORDS = int(os.getenv("ANSWER_CACHE_MAX_WORDS", "16"))
+
+_NAME_SLOT = "\x00name\x00"
+_WORD = re.compile(r"[a-z0-9']+")
+_FILLER = frozenset(
+    "hi hello hey dear sir madam team please pls kindly thanks thank ok okay".split()
+)
+# Messages about the candidate themselves or earlier turns need their own answer
+_PERSONAL = frozenset(
+    "i i'm im me my mine myself we our us it that this those these again above "
+    "mentioned earlier before previous".split()
+)
+_SENSITIVE = re.compile(r"\d{5,}|@|https?://", re.I)
+# Words two rephrasings may differ in without changing the question
+_MINOR = frozenset(
+    "a an the is are am be do does did can could will would should any there "
+    "for of to in on at about what whats what's which how job role position".split()
+)
+_NEGATION = frozenset(
+    "no not never non without isn't isnt aren't arent don't dont doesn't doesnt "
+    "can't cant cannot won't wont".split()
+)
+
+
+def normalize(text: str) -> str:
+    words = [w for w in _WORD.findall((text or "").lower()) if w not in _FILLER]
+    return " ".join(words)
+
+
+def shingles(normalized: str, size: int = 3) -> frozenset:
+    padded = f" {normalized} "
+    return frozenset(padded[i : i + size] for i in range(len(padded) - size + 1))
+
+
+def is_cacheable_question(text: str) -> bool:
+    """Short, generic, and not about this candidate or the conversation so far."""
+    if not text or _SENSITIVE.search(text):
+        return False
+    words = _WORD.findall(text.lower())
+    if not words or len(words) > ANSWER_CACHE_MAX_WORDS:
+        return False
+    return not any(w in _PERSONAL for w in words)
+
+
+def same_question(a: str, b: str) -> bool:
+    """
+    Whether two normalized texts that look alike can share an answer: every
+    word one has and the other lacks must be minor or a variant of a word the
+    other has (remote/remotely). Negations never are.
+    """
+    words_a, words_b = set(a.split()), set(b.split())
+    return all(_minor_difference(w, words_b) for w in words_a - words_b) and all(
+        _minor_difference(w, words_a) for w in words_b - words_a
+    )
+
+
+def _minor_difference(word: str, other: set) -> bool:
+    if word in _NEGATION:
+        return False
+    if word in _MINOR:
+        return True
+    return len(word) >= 4 and any(o[:4] == word[:4] for o in other if len(o) >= 4)
+
+
+def _template_name(answer: str, name: str) -> str:
+    """Swap the candidate's full and first name for a slot filled in on a hit."""
+    if not name or len(name) < 3 or name.lower() == "candidate":
+        return answer
+    for variant in (name, name.split()[0]):
+        answer = re.sub(rf"\b{re.escape(variant)}\b", _NAME_SLOT, answer, flags=re.I)
+    return answer
+
+
+class AnswerCache:
+    """
+    lookup(message, name) -> answer or None; store(message, name, answer,
+    latency) after a fresh reply. fingerprint() is called on every lookup and
+    store; a new value empties the cache.
+    """
+
+    def __init__(
+        self,
+        fingerprint,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self._fingerprint = fingerprint
+        self._current = None
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)  # key -> (answer, latency)
+        self.similarity = similarity
+        self._shingles = {}  # key -> shingle set, for the similarity fallback
+        self._by_shingle = defaultdict(set)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    def _check_fingerprint(self):
+        current = self._fingerprint()
+        if current != self._current:
+            with self._lock:
+                if self._current is not None:
+                    self.invalidations += 1
+                    logging.info("[AnswerCache] Fingerprint changed, clearing cache")
+                self._current = current
+                self.entries.clear()
+                self._shingles.clear()
+                self._by_shingle.clear()
+
+    def lookup(self, message: str, name: str = "") -> str:
+        if not is_cacheable_question(message):
+            self.bypassed += 1
+            return None
+        entry, exact = self._find(message)
+        if entry is None:
+            self.misses += 1
+            return None
+        if exact:
+            self.exact_hits += 1
+        else:
+            self.similar_hits += 1
+        answer, latency = entry
+        self.latency_saved += latency
+        return answer.replace(_NAME_SLOT, name or "there")
+
+    def has_answer(self, message: str) -> bool:
+        """Whether lookup() would hit, without counting it in stats()."""
+        return is_cacheable_question(message) and self._find(message)[0] is not None
+
+    def _find(self, message: str):
+        """(entry, exact) for the stored answer to message; entry is None on a miss."""
+        self._check_fingerprint()
+        key = normalize(message)
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry, True
+        similar = self._most_similar(key)
+        return (self.entries.get(similar) if similar else None), False
+
+    def _most_similar(self, key: str):
+        wanted = shingles(key)
+        if not wanted:
+            return None
+        with self._lock:
+            overlap = defaultdict(int)
+            for shingle in wanted:
+                for candidate in self._by_shingle.get(shingle, ()):
+                    overlap[candidate] += 1
+            best, best_score = None, 0.0
+            for candidate, shared in overlap.items():
+                score = shared / (len(wanted) + len(self._shingles[candidate]) - shared)
+                if (
+                    score > best_score
+                    and score >= self.similarity
+                    and same_question(key, candidate)
+                ):
+                    best, best_score = candidate, score
+        return best
+
+    def store(self, message: str, name: str, answer: str, latency: float = 0.0):
+        if not answer or not is_cacheable_question(message):
+            return
+        self._check_fingerprint()
+        answer = _template_name(answer, name)
+        key = normalize(message)
+        self.entries.set(key, (answer, latency))
+        with self._lock:
+            if key not in self._shingles:
+                self._shingles[key] = shingles(key)
+                for shingle in self._shingles[key]:
+                    self._by_shingle[shingle].add(key)
+            if len(self._shingles) > 2 * self.entries.maxsize:
+                self._prune()
+
+    def _prune(self):
+        # Drop index entries whose answers the TTLCache already evicted
+        for key in [k for k in self._shingles if k not in self.entries]:
+            for shingle in self._shingles.pop(key):
+                keys = self._by_shingle[shingle]
+                keys.discard(key)
+                if not keys:
+                    del self._by_shingle[shingle]
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "latency_saved_secs": round(self.latency_saved, 2),
+            "invalidations": self.invalidations,
+        }
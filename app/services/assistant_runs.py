@@ -0,0 +1,340 @@
+# --- app/services/assistant_runs.py ---
+# One place that starts an Assistants run and waits for it to finish.
+# Runs are streamed when possible, so completion (and the reply text) arrives
+# as soon as the model is done instead of on the next poll tick. When the
+# stream can't be opened we fall back to polling with adaptive backoff.
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import openai
+
+STREAM_RUNS = os.getenv("OPENAI_STREAM_RUNS", "1") != "0"
+
+ACTIVE_RUN_STATUSES = ("queued", "in_progress", "requires_action", "cancelling")
+FAILED_RUN_STATUSES = ("failed", "cancelled", "expired", "incomplete")
+
+_TERMINAL_EVENTS = {
+    "thread.run.completed": "completed",
+    "thread.run.failed": "failed",
+    "thread.run.cancelled": "cancelled",
+    "thread.run.expired": "expired",
+    "thread.run.incomplete": "incomplete",
+    "thread.run.requires_action": "requires_action",
+}
+
+
+def _cancel_requires_action(client, thread_id: str, run_id: str):
+    """
+    Runs here never use function tools, so requires_action can't be answered;
+    the run would otherwise stay active and block the thread's next run.
+    """
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except openai.APIError as e:
+        logging.warning("[assistant_runs] Could not cancel run %s: %s", run_id, e)
+
+
+async def _cancel_requires_action_async(client, thread_id: str, run_id: str):
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except openai.APIError as e:
+        logging.warning("[assistant_runs] Could not cancel run %s: %s", run_id, e)
+
+
+class RunSuperseded(Exception):
+    """The run was cancelled on purpose because a newer user message arrived."""
+
+
+@dataclass
+class RunEvent:
+    """
+    Emitted to on_event callbacks.
+    type is one of "created", "delta", "completed", "failed".
+    """
+
+    type: str
+    run_id: Optional[str] = None
+    status: Optional[str] = None
+    text: str = ""
+    error: Any = None
+
+
+@dataclass
+class RunResult:
+    completed: bool
+    status: str
+    run_id: Optional[str]
+    text: str = ""  # full assistant text when the run was streamed
+    last_error: Any = None
+
+
+def backoff_intervals(initial=0.1, factor=1.6, maximum=2.0):
+    """0.1s, 0.16s, 0.26s ... capped at 2s: fast first checks, few late ones."""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(maximum, delay * factor)
+
+
+def _delta_text(delta) -> str:
+    parts = []
+    for block in getattr(delta, "content", None) or []:
+        text = getattr(block, "text", None)
+        value = getattr(text, "value", None) if text else None
+        if value:
+            parts.append(value)
+    return "".join(parts)
+
+
+def _run_params(assistant_id, instructions, metadata, tools) -> dict:
+    params = {"assistant_id": assistant_id}
+    if instructions:
+        params["instructions"] = instructions
+    if metadata:
+        params["metadata"] = metadata
+    if tools is not None:
+        params["tools"] = tools  # per-run override of the assistant's tools
+    return params
+
+
+class _StreamState:
+    """Accumulates what a run stream has told us so far."""
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.run_id = None
+        self.status = None
+        self.last_error = None
+        self.chunks = []
+        self._message_id = None
+
+    def handle(self, event) -> bool:
+        """Process one stream event; return True once the run is terminal."""
+        kind = getattr(event, "event", None)
+        data = getattr(event, "data", None)
+
+        if kind == "thread.run.created":
+            self.run_id = data.id
+            self.status = data.status
+            self.emit(RunEvent("created", self.run_id, self.status))
+        elif kind == "thread.message.delta":
+            if self._message_id and data.id != self._message_id:
+                self.chunks.append("\n")
+            self._message_id = data.id
+            text = _delta_text(data.delta)
+            if text:
+                self.chunks.append(text)
+                self.emit(RunEvent("delta", self.run_id, self.status, text=text))
+        elif kind in _TERMINAL_EVENTS:
+            self.run_id = getattr(data, "id", None) or self.run_id
+            self.status = _TERMINAL_EVENTS[kind]
+            if self.status == "completed":
+                self.emit(RunEvent("completed", self.run_id, self.status, self.text))
+            else:
+                self.last_error = getattr(data, "last_error", None)
+                self.emit(
+                    RunEvent(
+                        "failed", self.run_id, self.status, error=self.last_error
+                    )
+                )
+            return True
+        elif kind == "error":
+            self.status = "failed"
+            self.last_error = data
+            self.emit(RunEvent("failed", self.run_id, self.status, error=data))
+            return True
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks).strip()
+
+    def result(self) -> RunResult:
+        return RunResult(
+            completed=self.status == "completed",
+            status=self.status,
+            run_id=self.run_id,
+            text=self.text if self.status == "completed" else "",
+            last_error=self.last_error,
+        )
+
+
+def poll_run(
+    client,
+    thread_id: str,
+    run_id: str,
+    timeout_secs: float = 30,
+    on_event: Callable[[RunEvent], None] = None,
+) -> RunResult:
+    """Wait for an existing run with adaptive backoff polling."""
+    emit = on_event or (lambda event: None)
+    deadline = time.time() + timeout_secs
+    intervals = backoff_intervals()
+    while True:
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        if run.status == "requires_action":
+            _cancel_requires_action(client, thread_id, run_id)
+            emit(RunEvent("failed", run_id, run.status))
+            return RunResult(False, run.status, run_id)
+        if run.status == "completed":
+            emit(RunEvent("completed", run_id, run.status))
+            return RunResult(True, run.status, run_id)
+        if run.status in FAILED_RUN_STATUSES:
+            last_error = getattr(run, "last_error", None)
+            emit(RunEvent("failed", run_id, run.status, error=last_error))
+            return RunResult(False, run.status, run_id, last_error=last_error)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            emit(RunEvent("failed", run_id, run.status))
+            return RunResult(False, run.status, run_id)
+        time.sleep(min(next(intervals), remaining))
+
+
+def execute_run(
+    client,
+    thread_id: str,
+    assistant_id: str,
+    instructions: str = None,
+    metadata: dict = None,
+    on_event: Callable[[RunEvent], None] = None,
+    timeout_secs: float = 30,
+    stream: bool = None,
+    tools: list = None,
+) -> RunResult:
+    """
+    Start a run on thread_id and block until it is terminal or times out.
+    Streams by default (completed runs carry the reply in RunResult.text);
+    falls back to poll_run when the stream can't be used.
+    """
+    emit = on_event or (lambda event: None)
+    params = _run_params(assistant_id, instructions, metadata, tools)
+    deadline = time.time() + timeout_secs
+
+    if STREAM_RUNS if stream is None else stream:
+        state = _StreamState(emit)
+        try:
+            # timeout also bounds each read, so a stalled stream can't hang us
+            with client.beta.threads.runs.stream(
+                thread_id=thread_id, timeout=timeout_secs, **params
+            ) as events:
+                for event in events:
+                    if state.handle(event):
+                        if state.status == "requires_action":
+                            _cancel_requires_action(client, thread_id, state.run_id)
+                        return state.result()
+                    if time.time() > deadline:
+                        logging.warning(
+                            "[assistant_runs] Stream for run %s timed out", state.run_id
+                        )
+                        break
+        except openai.APIError as e:
+            logging.warning("[assistant_runs] Run stream unavailable: %s", e)
+
+        if state.run_id is None:
+            # Stream never got as far as creating the run: start it the old way
+            run = client.beta.threads.runs.create(thread_id=thread_id, **params)
+            emit(RunEvent("created", run.id, run.status))
+            state.run_id = run.id
+        return poll_run(
+            client,
+            thread_id,
+            state.run_id,
+            max(0.0, deadline - time.time()),
+            on_event=emit,
+        )
+
+    run = client.beta.threads.runs.create(thread_id=thread_id, **params)
+    emit(RunEvent("created", run.id, run.status))
+    return poll_run(client, thread_id, run.id, timeout_secs, on_event=emit)
+
+
+async def poll_run_async(
+    client,
+    thread_id: str,
+    run_id: str,
+    timeout_secs: float = 30,
+    on_event: Callable[[RunEvent], None] = None,
+) -> RunResult:
+    emit = on_event or (lambda event: None)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_secs
+    intervals = backoff_intervals()
+    while True:
+        run = await client.beta.threads.runs.retrieve(
+            thread_id=thread_id, run_id=run_id
+        )
+        if run.status == "requires_action":
+            await _cancel_requires_action_async(client, thread_id, run_id)
+            emit(RunEvent("failed", run_id, run.status))
+            return RunResult(False, run.status, run_id)
+        if run.status == "completed":
+            emit(RunEvent("completed", run_id, run.status))
+            return RunResult(True, run.status, run_id)
+        if run.status in FAILED_RUN_STATUSES:
+            last_error = getattr(run, "last_error", None)
+            emit(RunEvent("failed", run_id, run.status, error=last_error))
+            return RunResult(False, run.status, run_id, last_error=last_error)
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            emit(RunEvent("failed", run_id, run.status))
+            return RunResult(False, run.status, run_id)
+        await asyncio.sleep(min(next(intervals), remaining))
+
+
+async def execute_run_async(
+    client,
+    thread_id: str,
+    assistant_id: str,
+    instructions: str = None,
+    metadata: dict = None,
+    on_event: Callable[[RunEvent], None] = None,
+    timeout_secs: float = 30,
+    stream: bool = None,
+    tools: list = None,
+) -> RunResult:
+    """execute_run for an AsyncOpenAI client."""
+    emit = on_event or (lambda event: None)
+    params = _run_params(assistant_id, instructions, metadata, tools)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_secs
+
+    if STREAM_RUNS if stream is None else stream:
+        state = _StreamState(emit)
+        try:
+            async with client.beta.threads.runs.stream(
+                thread_id=thread_id, timeout=timeout_secs, **params
+            ) as events:
+                async for event in events:
+                    if state.handle(event):
+                        if state.status == "requires_action":
+                            await _cancel_requires_action_async(
+                                client, thread_id, state.run_id
+                            )
+                        return state.result()
+                    if loop.time() > deadline:
+                        logging.warning(
+                            "[assistant_runs] Stream for run %s timed out", state.run_id
+                        )
+                        break
+        except openai.APIError as e:
+            logging.warning("[assistant_runs] Run stream unavailable: %s", e)
+
+        if state.run_id is None:
+            run = await client.beta.threads.runs.create(thread_id=thread_id, **params)
+            emit(RunEvent("created", run.id, run.status))
+            state.run_id = run.id
+        return await poll_run_async(
+            client,
+            thread_id,
+            state.run_id,
+            max(0.0, deadline - loop.time()),
+            on_event=emit,
+        )
+
+    run = await client.beta.threads.runs.create(thread_id=thread_id, **params)
+    emit(RunEvent("created", run.id, run.status))
+    return await poll_run_async(client, thread_id, run.id, timeout_secs, on_event=emit)
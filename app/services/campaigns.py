@@ -0,0 +1,184 @@
+# --- app/services/campaigns.py ---
+# Bulk outbound campaigns: fan a text or template message out to a candidate
+# list through the rate-limited OutboundDispatcher, checkpointing each result
+# so an interrupted campaign can be resumed without double-sending.
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from app.services.whatsapp_service import (
+    get_template_message_input,
+    get_text_message_input,
+    outbound,
+)
+
+# Candidates submitted to the dispatcher but not yet finished
+CAMPAIGN_MAX_PENDING = int(os.getenv("CAMPAIGN_MAX_PENDING", "500"))
+
+
+def load_candidates(path: str):
+    """Yield candidate dicts from a .csv (header row) or .jsonl file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            wa_id = str(row.get("wa_id") or row.get("phone") or "").strip().lstrip("+")
+            if not wa_id:
+                logging.warning("[Campaign] Skipping row without wa_id: %s", row)
+                continue
+            yield {**row, "wa_id": wa_id}
+
+
+def text_message_builder(text: str):
+    """Text body with {field} placeholders filled from the candidate row."""
+
+    def build(candidate: dict) -> dict:
+        return get_text_message_input(
+            candidate["wa_id"], text.format_map(_Defaulting(candidate))
+        )
+
+    return build
+
+
+def template_message_builder(template_name: str, language="en_US", params=()):
+    """Approved template; params name the candidate fields used as body values."""
+
+    def build(candidate: dict) -> dict:
+        values = [candidate.get(field, "") for field in params]
+        return get_template_message_input(
+            candidate["wa_id"], template_name, language, values
+        )
+
+    return build
+
+
+class _Defaulting(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class CampaignCheckpoint:
+    """
+    Append-only JSONL log of per-candidate outcomes. Each line is written and
+    flushed as soon as the send finishes, so a restart skips everyone already
+    sent.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sent = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if record.get("status") == "sent":
+                        self.sent.add(record["wa_id"])
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write("\n")  # don't glue the next record onto a torn line
+
+    def record(self, wa_id: str, status: str, **extra):
+        line = json.dumps({"wa_id": wa_id, "status": status, "ts": time.time(), **extra})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if status == "sent":
+                self.sent.add(wa_id)
+
+    def close(self):
+        self._file.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _message_id(response):
+    try:
+        return response.json()["messages"][0]["id"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def run_campaign(
+    candidates,
+    build_message,
+    checkpoint: CampaignCheckpoint,
+    dispatcher=outbound,
+    max_pending: int = CAMPAIGN_MAX_PENDING,
+) -> dict:
+    """
+    Send build_message(candidate) to every candidate not already in the
+    checkpoint. Returns sent/failed/skipped counts and throughput.
+    """
+    stats = {"sent": 0, "failed": 0, "skipped": 0}
+    pending = {}  # future -> wa_id
+    seen = set()
+    started = time.monotonic()
+
+    def settle(futures):
+        for future in futures:
+            wa_id = pending.pop(future)
+            try:
+                response = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                checkpoint.record(wa_id, "failed", error=str(e))
+                continue
+            if response is not None and response.status_code < 400:
+                stats["sent"] += 1
+                checkpoint.record(wa_id, "sent", message_id=_message_id(response))
+            else:
+                stats["failed"] += 1
+                checkpoint.record(
+                    wa_id,
+                    "failed",
+                    status_code=getattr(response, "status_code", None),
+                    error=getattr(response, "text", None),
+                )
+        done = stats["sent"] + stats["failed"]
+        if done and done % 100 == 0:
+            logging.info("[Campaign] Progress: %s", _with_rate(stats, started))
+
+    for candidate in candidates:
+        wa_id = candidate["wa_id"]
+        if wa_id in checkpoint.sent or wa_id in seen:
+            stats["skipped"] += 1
+            continue
+        seen.add(wa_id)
+
+        while len(pending) >= max_pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            settle(done)
+
+        pending[dispatcher.submit(build_message(candidate))] = wa_id
+
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        settle(done)
+
+    result = _with_rate(stats, started)
+    logging.info("[Campaign] Finished: %s", result)
+    return result
+
+
+def _with_rate(stats: dict, started: float) -> dict:
+    elapsed = time.monotonic() - started
+    return {
+        **stats,
+        "elapsed_secs": round(elapsed, 3),
+        "messages_per_sec": round(stats["sent"] / elapsed, 2) if elapsed else 0.0,
+    }
@@ -0,0 +1,297 @@
+# --- app/services/document_classifier.py ---
+# Cheap local pass over an uploaded document before anything goes to OpenAI.
+# The real type is sniffed from magic bytes (a renamed JPEG is still a JPEG),
+# text is pulled out of PDF/DOCX with bounded reads, and a heuristic score
+# decides the obvious cases. Only ambiguous documents reach the model, as
+# extracted text rather than a file upload.
+import logging
+import os
+import re
+import zipfile
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+from xml.etree import ElementTree
+
+try:  # optional: without it PDFs are left to the model
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Stop extracting after this much text / these many PDF pages
+DOC_TEXT_MAX_CHARS = int(os.getenv("DOC_TEXT_MAX_CHARS", "20000"))
+DOC_MAX_PAGES = int(os.getenv("DOC_MAX_PAGES", "8"))
+# Score thresholds: >= accept is a resume, <= reject is not, between goes to GPT.
+# Rejecting needs negative evidence; "no resume signals" alone is ambiguous.
+RESUME_ACCEPT_SCORE = float(os.getenv("RESUME_ACCEPT_SCORE", "6"))
+RESUME_REJECT_SCORE = float(os.getenv("RESUME_REJECT_SCORE", "-2"))
+
+RESUME, NOT_RESUME, AMBIGUOUS = "resume", "not_resume", "ambiguous"
+
+_MAGIC = (
+    (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole2"),  # legacy .doc/.xls/.ppt
+    (b"{\\rtf", "rtf"),
+    (b"\x89PNG\r\n\x1a\n", "image"),
+    (b"\xff\xd8\xff", "image"),
+    (b"GIF8", "image"),
+    (b"II*\x00", "image"),
+    (b"MM\x00*", "image"),
+)
+
+_SECTIONS = (
+    "experience",
+    "work experience",
+    "professional experience",
+    "employment history",
+    "work history",
+    "education",
+    "skills",
+    "technical skills",
+    "summary",
+    "professional summary",
+    "objective",
+    "career objective",
+    "certifications",
+    "projects",
+    "achievements",
+    "languages",
+    "references",
+)
+_SECTION_LINE = re.compile(
+    r"^\s*(?:" + "|".join(re.escape(s) for s in _SECTIONS) + r")\s*:?\s*$",
+    re.I | re.M,
+)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{8,}\d")
+# "2019 - 2021 2022" has the shape of a phone number; drop year ranges first
+_YEAR_RANGE = re.compile(r"\b(?:19|20)\d\d\s*[-–]\s*(?:19|20)\d\d\b")
+_PROFILE = re.compile(r"linkedin\.com/|github\.com/", re.I)
+_DATE_RANGE = re.compile(
+    r"\b(?:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+)?"
+    r"(?:19|20)\d{2}\s*(?:-|–|—|to)\s*(?:present|current|now|"
+    r"(?:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+)?(?:19|20)\d{2})\b",
+    re.I,
+)
+_NOT_RESUME_CUES = re.compile(
+    r"\b(?:invoice|receipt|amount due|purchase order|table of contents|chapter \d|"
+    r"abstract|bibliography|terms and conditions|bank statement|boarding pass)\b",
+    re.I,
+)
+
+# What the candidate is told when the local score rejects a document; the
+# score breakdown goes to the logs and the saved verdict instead
+_NOT_RESUME_REASON = (
+    "We couldn't find what a resume usually has (contact details, work "
+    "experience, education, skills). Please send your resume as a PDF or DOCX."
+)
+
+# Outcome counts for /stats
+decisions = Counter()
+
+
+@dataclass
+class PreClassification:
+    decision: str  # RESUME, NOT_RESUME or AMBIGUOUS
+    reason: str  # fit to show the candidate
+    kind: str  # sniffed type: pdf, docx, text, image, ...
+    score: float = 0.0
+    text: Optional[str] = None  # extracted text when we could get it
+    details: str = ""  # score breakdown, for logs and the saved verdict
+
+    def as_verdict(self) -> dict:
+        """The {"is_resume", "reason"} shape analyze_* returns, plus details."""
+        return {
+            "is_resume": self.decision == RESUME,
+            "reason": self.reason,
+            "details": self.details,
+        }
+
+
+def sniff_type(fileobj) -> str:
+    fileobj.seek(0)
+    head = fileobj.read(8)
+    fileobj.seek(0)
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return _zip_kind(fileobj) if kind == "zip" else kind
+    if head[:4] == b"RIFF":
+        return "image"  # webp
+    return "text" if _looks_like_text(fileobj) else "binary"
+
+
+def _zip_kind(fileobj) -> str:
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            names = set(archive.namelist())
+    except zipfile.BadZipFile:
+        return "binary"
+    finally:
+        fileobj.seek(0)
+    if "word/document.xml" in names:
+        return "docx"
+    if any(n.startswith("xl/") for n in names):
+        return "spreadsheet"
+    if any(n.startswith("ppt/") for n in names):
+        return "presentation"
+    return "zip"
+
+
+def _looks_like_text(fileobj) -> bool:
+    sample = fileobj.read(4096)
+    fileobj.seek(0)
+    if not sample or b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e.start > len(sample) - 4  # cut mid-character at the end
+    return True
+
+
+def _pdf_text(fileobj):
+    """(text, page_count) from the first DOC_MAX_PAGES pages."""
+    reader = PdfReader(fileobj)
+    parts, size = [], 0
+    for page in reader.pages[:DOC_MAX_PAGES]:
+        text = page.extract_text() or ""
+        parts.append(text)
+        size += len(text)
+        if size >= DOC_TEXT_MAX_CHARS:
+            break
+    return "\n".join(parts)[:DOC_TEXT_MAX_CHARS], len(reader.pages)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _docx_text(fileobj) -> str:
+    """Paragraph text of word/document.xml, parsed incrementally."""
+    parts, size = [], 0
+    with zipfile.ZipFile(fileobj) as archive, archive.open("word/document.xml") as xml:
+        paragraph = []
+        for event, elem in ElementTree.iterparse(xml, events=("end",)):
+            if elem.tag == _W + "t" and elem.text:
+                paragraph.append(elem.text)
+            elif elem.tag == _W + "p":
+                line = "".join(paragraph)
+                parts.append(line)
+                size += len(line) + 1
+                paragraph = []
+                elem.clear()
+                if size >= DOC_TEXT_MAX_CHARS:
+                    break
+    return "\n".join(parts)[:DOC_TEXT_MAX_CHARS]
+
+
+def extract_text(fileobj, kind: str):
+    """(text, page_count); text is None when this type can't be read locally."""
+    try:
+        if kind == "pdf" and PdfReader is not None:
+            return _pdf_text(fileobj)
+        if kind == "docx":
+            return _docx_text(fileobj), None
+        if kind == "text":
+            raw = fileobj.read(DOC_TEXT_MAX_CHARS * 4)
+            return raw.decode("utf-8", errors="ignore")[:DOC_TEXT_MAX_CHARS], None
+    except Exception as e:
+        logging.warning("[DocClassifier] Text extraction failed (%s): %s", kind, e)
+    finally:
+        fileobj.seek(0)
+    return None, None
+
+
+def _has_phone(text: str) -> bool:
+    """A 10-15 digit run shaped like a phone number, ignoring year ranges."""
+    for match in _PHONE.finditer(_YEAR_RANGE.sub(" ", text)):
+        if 10 <= sum(ch.isdigit() for ch in match.group()) <= 15:
+            return True
+    return False
+
+
+def _has_contact(text: str) -> bool:
+    return bool(_EMAIL.search(text) or _has_phone(text) or _PROFILE.search(text))
+
+
+def score_resume(text: str, pages: int = None):
+    """Heuristic resume likelihood; returns (score, reasons)."""
+    score, reasons = 0.0, []
+    words = len(text.split())
+
+    sections = {m.group(0).strip().rstrip(":").lower() for m in _SECTION_LINE.finditer(text)}
+    if sections:
+        score += min(len(sections), 5) * 1.5
+        reasons.append(f"{len(sections)} resume sections")
+    if _EMAIL.search(text):
+        score += 1.5
+        reasons.append("email address")
+    if _has_phone(text):
+        score += 1
+        reasons.append("phone number")
+    if _PROFILE.search(text):
+        score += 1
+        reasons.append("LinkedIn/GitHub profile")
+    date_ranges = len(_DATE_RANGE.findall(text))
+    if date_ranges:
+        score += min(date_ranges, 3)
+        reasons.append(f"{date_ranges} date ranges")
+
+    if words < 80:
+        score -= 3
+        reasons.append(f"very little text ({words} words)")
+    if pages and pages > 6:
+        score -= min(pages - 6, 10)
+        reasons.append(f"{pages} pages")
+    cues = {m.group(0).lower() for m in _NOT_RESUME_CUES.finditer(text)}
+    if cues:
+        score -= 2 * len(cues)
+        reasons.append("looks like " + ", ".join(sorted(cues)))
+    return score, reasons
+
+
+_UNREADABLE_REASONS = {
+    "image": "This is an image. Please send your resume as a PDF or DOCX document.",
+    "spreadsheet": "This is a spreadsheet, not a resume.",
+    "presentation": "This is a presentation, not a resume.",
+    "zip": "This is an archive. Please send your resume as a single PDF or DOCX file.",
+    "binary": "We couldn't read this file type. Please send your resume as a PDF or DOCX.",
+}
+
+
+def pre_classify(fileobj) -> PreClassification:
+    """Decide locally when the answer is obvious; AMBIGUOUS otherwise."""
+    kind = sniff_type(fileobj)
+    if kind in _UNREADABLE_REASONS:
+        result = PreClassification(NOT_RESUME, _UNREADABLE_REASONS[kind], kind)
+    else:
+        text, pages = extract_text(fileobj, kind)
+        if text is None:
+            # .doc, .rtf, or a PDF without pypdf: leave it to the model
+            result = PreClassification(AMBIGUOUS, "not readable locally", kind)
+        elif not text.strip():
+            result = PreClassification(AMBIGUOUS, "no extractable text (scanned?)", kind)
+        else:
+            score, reasons = score_resume(text, pages)
+            details = "; ".join(reasons) or "no resume signals"
+            if score >= RESUME_ACCEPT_SCORE and _has_contact(text):
+                decision, reason = RESUME, "Looks like a resume."
+            elif score >= RESUME_ACCEPT_SCORE:
+                # Headings alone also fit reports and templates
+                decision, reason = AMBIGUOUS, "no contact details"
+                details += "; no contact details"
+            elif score <= RESUME_REJECT_SCORE:
+                decision, reason = NOT_RESUME, _NOT_RESUME_REASON
+            else:
+                decision, reason = AMBIGUOUS, details
+            result = PreClassification(decision, reason, kind, score, text, details)
+
+    decisions[result.decision] += 1
+    logging.info(
+        "[DocClassifier] %s (%s, score=%.1f): %s",
+        result.decision,
+        result.kind,
+        result.score,
+        result.details or result.reason,
+    )
+    return result
@@ -1,10 +1,15 @@
 import boto3
 import os
 import logging
+import time
 from datetime import datetime, timezone
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
 
+from app.utils.cache import TTLCache
+from app.services.write_behind import WriteBehindBuffer
+
 load_dotenv()
 # Proper env fallbacks
 THREADS_TABLE = os.getenv("THREADS_TABLE")
@@ -20,6 +25,57 @@ dynamodb = boto3.resource("dynamodb", region_name=os.getenv("AWS_REGION", "us-ea
 threads_table = dynamodb.Table(THREADS_TABLE)
 messages_table = dynamodb.Table(MESSAGES_TABLE)
 
+# Idempotency records; enable DynamoDB TTL on "expires_at" so they age out
+PROCESSED_TABLE = os.getenv("PROCESSED_TABLE", "ProcessedMessages")
+PROCESSED_TTL_SECONDS = int(os.getenv("PROCESSED_TTL_SECONDS", str(7 * 24 * 3600)))
+processed_table = dynamodb.Table(PROCESSED_TABLE)
+# How long a claim stays exclusive when the caller gives no lease_until; keep
+# it below the SQS visibility timeout so a redelivery finds it expired
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "60"))
+
+# Resume-check verdicts keyed by the document's SHA-256 (partition key
+# "sha256"); enable TTL on "expires_at"
+VERDICTS_TABLE = os.getenv("VERDICTS_TABLE", "DocumentVerdicts")
+VERDICT_TTL_SECONDS = int(os.getenv("VERDICT_TTL_SECONDS", str(180 * 24 * 3600)))
+verdicts_table = dynamodb.Table(VERDICTS_TABLE)
+
+# OpenAI files / temp threads awaiting deletion (partition key "resource_id");
+# enable TTL on "expires_at" so records of resources that never could be
+# deleted eventually age out
+OPENAI_RESOURCES_TABLE = os.getenv("OPENAI_RESOURCES_TABLE", "OpenAIResources")
+OPENAI_RESOURCE_RECORD_TTL = int(os.getenv("OPENAI_RESOURCE_RECORD_TTL", str(30 * 24 * 3600)))
+openai_resources_table = dynamodb.Table(OPENAI_RESOURCES_TABLE)
+
+# Shared OpenAI request/token budget (partition key "budget"), used when
+# OPENAI_BUDGET_BACKEND=dynamodb so every worker draws from one bucket
+OPENAI_BUDGET_TABLE = os.getenv("OPENAI_BUDGET_TABLE", "OpenAIRateBudget")
+openai_budget_table = dynamodb.Table(OPENAI_BUDGET_TABLE)
+
+# Running summary of a REPLY_BACKEND=local conversation (partition key
+# "wa_id"), so it outlives this process's conversation cache
+SUMMARIES_TABLE = os.getenv("SUMMARIES_TABLE", "ConversationSummaries")
+summaries_table = dynamodb.Table(SUMMARIES_TABLE)
+
+# Message IDs this process has already claimed or seen claimed; Meta's webhook
+# retries hit this and are rejected without a network call.
+recent_message_ids = TTLCache(
+    maxsize=int(os.getenv("RECENT_MESSAGE_IDS_SIZE", "50000")),
+    ttl=float(os.getenv("RECENT_MESSAGE_IDS_TTL", "3600")),
+)
+
+# wa_id -> thread record. Thread IDs almost never change, so most get_thread
+# calls on the hot path are served from here; save_thread invalidates.
+thread_cache = TTLCache(
+    maxsize=int(os.getenv("THREAD_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("THREAD_CACHE_TTL", "600")),
+)
+
+# sha256 -> verdict record, in front of verdicts_table
+verdict_cache = TTLCache(
+    maxsize=int(os.getenv("VERDICT_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("VERDICT_CACHE_TTL", "3600")),
+)
+
 
 def get_threads_table():
     return os.getenv("THREADS_TABLE", "WhatsAppThreads")
@@ -30,8 +86,7 @@ def get_messages_table():
 
 
 def save_thread(wa_id, thread_id):
-    table = dynamodb.Table(get_threads_table())
-    table.put_item(
+    threads_table.put_item(
         Item={
             "wa_id": wa_id,
             "thread_id": thread_id,
@@ -39,63 +94,243 @@ def save_thread(wa_id, thread_id):
             "updated_at": datetime.now(timezone.utc).isoformat(),
         }
     )
+    thread_cache.invalidate(wa_id)
 
 
 def get_thread(wa_id):
     """
     Get the most recent thread (if any) for a given wa_id.
     Assumes wa_id is the partition key and thread_id is the sort key.
+    Served from thread_cache when possible; misses are not cached.
     """
-    table = dynamodb.Table(get_threads_table())
-    response = table.query(
+    item = thread_cache.get(wa_id)
+    if item is not None:
+        return item
+
+    response = threads_table.query(
         KeyConditionExpression=Key("wa_id").eq(wa_id), ScanIndexForward=False, Limit=1
     )
     items = response.get("Items", [])
-    return items[0] if items else None
+    if not items:
+        return None
+    thread_cache.set(wa_id, items[0])
+    return items[0]
 
 
 def save_message(wa_id, message_id, body, msg_type):
-    table = dynamodb.Table(get_messages_table())
-    table.put_item(
-        Item={
-            "wa_id": wa_id,
-            "message_id": message_id,
-            "message_body": body,
-            "message_type": msg_type,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        }
-    )
+    item = {
+        "wa_id": wa_id,
+        "message_id": message_id,
+        "message_body": body,
+        "message_type": msg_type,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if MESSAGE_WRITE_BEHIND:
+        # Off the reply's latency path; flushed in batches by message_writer
+        message_writer.put(item)
+    else:
+        messages_table.put_item(Item=item)
+    return item
 
 
-def is_duplicate_message(message_id):
-    table = dynamodb.Table("ProcessedMessages")
-    try:
-        response = table.get_item(Key={"message_id": message_id})
-        return "Item" in response
-    except Exception as e:
-        logging.error("Failed to check duplicate: %s", e)
-        return False
+def batch_write_items(table_name, items, max_attempts=5):
+    """
+    BatchWriteItem (<= 25 puts) with retries for UnprocessedItems.
+    Returns the items that still weren't written.
+    """
+    request = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+    delay = 0.05
+    for attempt in range(max_attempts):
+        response = dynamodb.meta.client.batch_write_item(RequestItems=request)
+        request = response.get("UnprocessedItems") or {}
+        if not request:
+            return []
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return [r["PutRequest"]["Item"] for r in request.get(table_name, [])]
+
+
+def _write_messages_directly(items):
+    return batch_write_items(MESSAGES_TABLE, items)
+
+
+def _write_messages_via_celery(items):
+    from app.tasks.background_tasks import store_messages_batch_to_dynamodb
+
+    store_messages_batch_to_dynamodb.delay(items)
+    return []
 
 
-def mark_message_as_processed(message_id):
-    table = dynamodb.Table("ProcessedMessages")
+# Write-behind for conversation messages. MESSAGE_WRITE_SINK=celery hands each
+# batch to a Celery task instead of writing from this process.
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "1") == "1"
+message_writer = WriteBehindBuffer(
+    sink=(
+        _write_messages_via_celery
+        if os.getenv("MESSAGE_WRITE_SINK") == "celery"
+        else _write_messages_directly
+    ),
+    name="message-writer",
+    flush_size=25,
+    flush_interval=float(os.getenv("MESSAGE_FLUSH_INTERVAL", "1.0")),
+)
+
+
+def claim_message(message_id, lease_until=None) -> bool:
+    """
+    Atomically claim a WhatsApp message for handling.
+    Returns True if the caller now owns the message, False if it is already
+    done or another worker holds an unexpired claim on it. A claim is a lease:
+    call complete_message() once the reply is out. If the handler dies first
+    the lease lapses at lease_until (default now + CLAIM_LEASE_SECONDS) and a
+    redelivery can claim the message again instead of being dropped.
+    """
+    if not message_id:
+        return True
+    if message_id in recent_message_ids:
+        return False
+
+    now = int(time.time())
     try:
-        table.put_item(
+        processed_table.put_item(
             Item={
                 "message_id": message_id,
-                "processed_at": datetime.utcnow().isoformat(),
-            }
+                "status": "processing",
+                "lease_until": int(lease_until or now + CLAIM_LEASE_SECONDS),
+                "processed_at": datetime.now(timezone.utc).isoformat(),
+                "expires_at": now + PROCESSED_TTL_SECONDS,
+            },
+            ConditionExpression=Attr("message_id").not_exists()
+            | (Attr("status").eq("processing") & Attr("lease_until").lt(now)),
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
         )
-    except Exception as e:
-        logging.error("Failed to mark message as processed: %s", e)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            # Records written before leases existed have no status: done
+            status = e.response.get("Item", {}).get("status", {}).get("S", "done")
+            if status == "done":
+                recent_message_ids.set(message_id, True)
+            return False
+        # Fail open like before: better a rare double reply than a lost message
+        logging.error("Failed to claim message %s: %s", message_id, e)
+        return True
+
+    return True
+
+
+def complete_message(message_id):
+    """Mark a claimed message done; every later delivery of it is a duplicate."""
+    if not message_id:
+        return
+    recent_message_ids.set(message_id, True)
+    try:
+        processed_table.update_item(
+            Key={"message_id": message_id},
+            UpdateExpression="SET #status = :done",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":done": "done"},
+        )
+    except ClientError as e:
+        # The lease still lapses, so the worst case is a late duplicate reply
+        logging.error("Failed to complete message %s: %s", message_id, e)
 
 
 def get_recent_messages(wa_id, limit=4):
-    table = dynamodb.Table(get_messages_table())
-    response = table.query(
+    response = messages_table.query(
         KeyConditionExpression=Key("wa_id").eq(wa_id),
         ScanIndexForward=False,
         Limit=limit,
     )
     return response.get("Items", [])
+
+
+def get_conversation_summary(wa_id):
+    """{"summary", "summarized_through"} for wa_id, or None. Errors count as none."""
+    try:
+        return summaries_table.get_item(Key={"wa_id": wa_id}).get("Item")
+    except (BotoCoreError, ClientError) as e:
+        logging.warning("Summary lookup failed for %s: %s", wa_id, e)
+        return None
+
+
+def save_conversation_summary(wa_id, summary, summarized_through):
+    """summarized_through is the timestamp of the newest turn the summary covers."""
+    summaries_table.put_item(
+        Item={
+            "wa_id": wa_id,
+            "summary": summary,
+            "summarized_through": summarized_through,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+
+def get_document_verdict(sha256):
+    """
+    Earlier resume-check verdict for identical document bytes, or None:
+    {"is_resume", "reason", "s3_key"?}. Lookup errors count as a miss.
+    """
+    if not sha256:
+        return None
+    item = verdict_cache.get(sha256)
+    if item is not None:
+        return item
+    try:
+        item = verdicts_table.get_item(Key={"sha256": sha256}).get("Item")
+    except (BotoCoreError, ClientError) as e:
+        logging.warning("Verdict lookup failed for %s: %s", sha256, e)
+        return None
+    if item:
+        verdict_cache.set(sha256, item)
+    return item
+
+
+def save_document_verdict(sha256, is_resume, reason, s3_key=None, details=None):
+    """reason is what the candidate is told; details how the verdict was reached."""
+    item = {
+        "sha256": sha256,
+        "is_resume": bool(is_resume),
+        "reason": reason or "",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "expires_at": int(time.time()) + VERDICT_TTL_SECONDS,
+    }
+    if s3_key:
+        item["s3_key"] = s3_key
+    if details:
+        item["details"] = details
+    verdict_cache.set(sha256, item)
+    try:
+        verdicts_table.put_item(Item=item)
+    except (BotoCoreError, ClientError) as e:
+        # Only a cache: the next duplicate just gets classified again
+        logging.warning("Failed to save verdict for %s: %s", sha256, e)
+
+
+def record_openai_resource(kind, resource_id, delete_after):
+    """Remember an OpenAI resource so the reaper deletes it after delete_after (epoch secs)."""
+    openai_resources_table.put_item(
+        Item={
+            "resource_id": resource_id,
+            "kind": kind,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "delete_after": int(delete_after),
+            "expires_at": int(time.time()) + OPENAI_RESOURCE_RECORD_TTL,
+        }
+    )
+
+
+def forget_openai_resource(resource_id):
+    openai_resources_table.delete_item(Key={"resource_id": resource_id})
+
+
+def due_openai_resources(now, limit=200):
+    """Up to `limit` recorded resources whose delete_after has passed."""
+    items, kwargs = [], {"FilterExpression": Attr("delete_after").lte(int(now))}
+    while len(items) < limit:
+        response = openai_resources_table.scan(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return items[:limit]
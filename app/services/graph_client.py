@@ -0,0 +1,64 @@
+# --- app/services/graph_client.py ---
+# Shared, connection-pooled HTTP clients for Graph API traffic. Reusing one
+# client keeps TCP+TLS connections to graph.facebook.com alive between sends
+# (and multiplexes them over HTTP/2 when the h2 package is installed).
+import os
+import threading
+
+import httpx
+
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com")
+
+GRAPH_MAX_CONNECTIONS = int(os.getenv("GRAPH_MAX_CONNECTIONS", "100"))
+GRAPH_MAX_KEEPALIVE = int(os.getenv("GRAPH_MAX_KEEPALIVE", "20"))
+GRAPH_KEEPALIVE_EXPIRY = float(os.getenv("GRAPH_KEEPALIVE_EXPIRY", "60"))
+GRAPH_CONNECT_TIMEOUT = float(os.getenv("GRAPH_CONNECT_TIMEOUT", "5"))
+GRAPH_TIMEOUT = float(os.getenv("GRAPH_TIMEOUT", "10"))
+GRAPH_HTTP2 = os.getenv("GRAPH_HTTP2", "1") == "1"
+
+_lock = threading.Lock()
+_sync_client = None
+_async_client = None
+
+
+def _http2_enabled() -> bool:
+    if not GRAPH_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options() -> dict:
+    return {
+        "http2": _http2_enabled(),
+        "limits": httpx.Limits(
+            max_connections=GRAPH_MAX_CONNECTIONS,
+            max_keepalive_connections=GRAPH_MAX_KEEPALIVE,
+            keepalive_expiry=GRAPH_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(GRAPH_TIMEOUT, connect=GRAPH_CONNECT_TIMEOUT),
+    }
+
+
+def get_graph_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_options())
+    return _sync_client
+
+
+def get_async_graph_client() -> httpx.AsyncClient:
+    # The async worker runs a single event loop, so one client per process
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_options())
+    return _async_client
+
+
+def graph_url(path: str) -> str:
+    return f"{GRAPH_API_BASE}/{path.lstrip('/')}"
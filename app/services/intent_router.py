@@ -0,0 +1,221 @@
+# --- app/services/intent_router.py ---
+# Table-driven fast path for messages that don't need the assistant. Every
+# keyword of every intent is compiled into one Aho-Corasick automaton, so a
+# message is scanned once no matter how many intents exist; only intents
+# whose keywords were actually seen are then checked (keyword groups, an
+# optional verifying regex, a length limit).
+#
+# To add an intent, append to INTENTS. An intent matches when the message
+# has at least one keyword from EACH of its groups.
+import logging
+import re
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces, padded so keywords match whole words."""
+    return " " + " ".join(_WORD.findall((text or "").lower())) + " "
+
+
+@dataclass
+class Intent:
+    name: str
+    groups: tuple  # tuple of keyword tuples; one hit needed from each
+    reply: str = ""  # {name} is filled in with the candidate's name
+    pattern: str = None  # optional regex the raw message must also match
+    max_words: int = 30  # longer messages carry more than this one intent
+    priority: int = 0  # higher wins when several intents match
+    _regex: Optional[re.Pattern] = field(default=None, repr=False)
+
+    def render(self, name: str = "") -> str:
+        return self.reply.format(name=name or "there")
+
+
+@dataclass
+class Route:
+    intent: Intent
+
+    @property
+    def name(self) -> str:
+        return self.intent.name
+
+    def reply(self, name: str = "") -> str:
+        return self.intent.render(name)
+
+
+UPLOAD_INSTRUCTIONS = (
+    "Yes — you can upload your resume here as a document (PDF/DOC/DOCX). "
+    "Once I receive it, I’ll analyze it and help you update or tailor it."
+)
+
+INTENTS = [
+    Intent(
+        "upload_resume",
+        groups=(
+            ("upload", "uploading", "attach", "attaching", "send", "sending", "submit"),
+            ("resume", "resumes", "cv", "document", "documents", "file", "files", "pdf", "docx"),
+        ),
+        reply=UPLOAD_INSTRUCTIONS,
+        pattern=r"^(?!.*\b(?:send|upload)\s+(?:me|us)\b)",  # not asking *us* for a file
+        priority=10,
+    ),
+    Intent(
+        "update_resume",
+        groups=(
+            ("update", "updated", "updating", "new", "latest", "revised"),
+            ("resume", "cv"),
+        ),
+        reply="Sure! Please upload your updated resume here as a PDF or DOCX and our team will review it shortly.",
+        # "new resume", "update my CV" - not "new roles ... my resume" or "any update on"
+        pattern=(
+            r"(?s)^(?!.*\bupdates?\s+on\b).*(?:"
+            r"\b(?:updated|new|latest|revised)\s+(?:resume|cv)\b|"
+            r"\bupdat(?:e|ing)\s+(?:my\s+|the\s+)?(?:resume|cv)\b)"
+        ),
+        max_words=12,
+        priority=9,
+    ),
+    Intent(
+        "how_to_apply",
+        groups=(
+            ("how", "where", "process", "steps"),
+            ("apply", "applying", "application"),
+        ),
+        reply=(
+            "You can apply right here: upload your resume as a PDF or DOCX and mention the role "
+            "you're interested in. You can also apply through our careers portal or email "
+            "careers@technogen.com with the position title in the subject line."
+        ),
+        max_words=15,
+        priority=5,
+    ),
+    Intent(
+        "greeting",
+        groups=(("hi", "hello", "hey", "hii", "good morning", "good afternoon", "good evening"),),
+        reply=(
+            "Hi {name}! I'm TechnoGen's recruiting assistant. Ask me about our open roles, "
+            "or upload your resume here as a PDF or DOCX."
+        ),
+        max_words=3,
+    ),
+    Intent(
+        "thanks",
+        groups=(("thanks", "thank you", "thank u", "thx", "ty"),),
+        reply="You're welcome, {name}! Message me anytime if you have more questions.",
+        # "no thanks" / "thanks, not interested" decline; they aren't gratitude
+        pattern=r"^(?!.*\b(?:no|not|nope|nah|don['’]?t|decline)\b)",
+        max_words=5,
+    ),
+]
+
+
+class _Automaton:
+    """Aho-Corasick over normalized text; yields the payload of every keyword found."""
+
+    def __init__(self, keywords: dict):
+        # keyword -> payload; states are dict transitions + fail links + outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for keyword, payload in keywords.items():
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(payload)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+
+class IntentRouter:
+    """
+    route(text) -> Route or None. Counts matches per intent for stats().
+    """
+
+    def __init__(self, intents=INTENTS):
+        self.intents = sorted(intents, key=lambda i: -i.priority)
+        keywords = {}
+        for index, intent in enumerate(self.intents):
+            if intent.pattern:
+                intent._regex = re.compile(intent.pattern, re.I)
+            for group_no, group in enumerate(intent.groups):
+                for keyword in group:
+                    key = normalize(keyword)
+                    keywords.setdefault(key, []).append((index, group_no))
+        # One payload list per distinct keyword; shared keywords feed several intents
+        self._automaton = _Automaton(keywords)
+        self._lock = threading.Lock()
+        self.matches = Counter()
+        self.routed = 0
+        self.unmatched = 0
+
+    def match(self, text: str) -> Optional[Intent]:
+        normalized = normalize(text)
+        seen = {}
+        for hits in self._automaton.find(normalized):
+            for index, group_no in hits:
+                seen.setdefault(index, set()).add(group_no)
+        if not seen:
+            return None
+        words = normalized.count(" ") - 1
+        for index in sorted(seen):  # intents are sorted by priority
+            intent = self.intents[index]
+            if len(seen[index]) < len(intent.groups) or words > intent.max_words:
+                continue
+            if intent._regex and not intent._regex.search(text):
+                continue
+            return intent
+        return None
+
+    def route(self, text: str) -> Optional[Route]:
+        intent = self.match(text)
+        with self._lock:
+            self.routed += 1
+            if intent is None:
+                self.unmatched += 1
+                return None
+            self.matches[intent.name] += 1
+        logging.info("[IntentRouter] Matched %s", intent.name)
+        return Route(intent)
+
+    def stats(self) -> dict:
+        matched = self.routed - self.unmatched
+        return {
+            "routed": self.routed,
+            "matched": matched,
+            "match_rate": round(matched / self.routed, 3) if self.routed else 0.0,
+            "by_intent": dict(self.matches),
+        }
+
+
+intent_router = IntentRouter()
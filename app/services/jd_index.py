@@ -0,0 +1,290 @@
+# --- app/services/jd_index.py ---
+# BM25 retrieval over the job-description corpus (data/*.txt). The corpus is
+# a handful of JDs, so an in-memory inverted index answers a query in
+# microseconds; the passages go straight into the run instructions instead of
+# making every run call file_search.
+#
+# The index is persisted as gzipped JSON next to the corpus and rebuilt per
+# source file: only files whose size/mtime changed are re-chunked.
+#   python -m app.services.jd_index            # build (e.g. at image build)
+#   python -m app.services.jd_index "java aws" # build and query
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Relative paths are taken from the repo root, not the working directory
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+JD_DIR = os.path.join(_ROOT, os.getenv("JD_DIR", "data"))
+JD_INDEX_PATH = os.getenv("JD_INDEX_PATH", os.path.join(JD_DIR, "jd_index.json.gz"))
+JD_TOP_K = int(os.getenv("JD_TOP_K", "3"))
+# How often search() looks at the corpus files for changes
+JD_INDEX_CHECK_SECS = float(os.getenv("JD_INDEX_CHECK_SECS", "30"))
+# Use these passages instead of the assistant's file_search tool
+JD_RETRIEVAL = os.getenv("JD_RETRIEVAL", "1") == "1"
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from have how i in is it me my "
+    "of on or our the their this to we what when where which who will with "
+    "you your".split()
+)
+_SEPARATOR = re.compile(r"^_{4,}\s*$")
+_JOB_TITLE = re.compile(r"^\d+\.\s+\S")
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]  # developers -> developer
+        tokens.append(token)
+    return tokens
+
+
+def _is_heading(line: str) -> bool:
+    return (
+        len(line) <= 40
+        and not line.startswith("*")
+        and ":" not in line
+        and not line.endswith(".")
+    )
+
+
+def chunk_document(text: str) -> list:
+    """
+    Split a JD file into passages: one per job section ("Key Responsibilities",
+    "Required Qualifications", ...), each prefixed with its job title so a
+    passage makes sense on its own.
+    """
+    chunks = []
+    for block in _split_blocks(text):
+        lines = [line.strip().lstrip("\ufeff") for line in block]
+        lines = [line for line in lines if line]
+        if not lines:
+            continue
+        title = re.sub(r"^\d+\.\s+", "", lines[0])
+        section, body = "Overview", []
+        for line in lines[1:]:
+            if _is_heading(line):
+                if body:
+                    chunks.append(_chunk(title, section, body))
+                section, body = line, []
+            else:
+                body.append(line)
+        if body:
+            chunks.append(_chunk(title, section, body))
+    return chunks
+
+
+def _split_blocks(text: str):
+    block = []
+    for line in text.splitlines():
+        if _SEPARATOR.match(line) or (_JOB_TITLE.match(line) and block):
+            if block:
+                yield block
+            block = [] if _SEPARATOR.match(line) else [line]
+        else:
+            block.append(line)
+    if block:
+        yield block
+
+
+def _chunk(title, section, body) -> dict:
+    heading = title if section == "Overview" else f"{title} - {section}"
+    text = heading + "\n" + "\n".join(body)
+    tf = Counter(tokenize(text))
+    return {"text": text, "tf": dict(tf), "len": sum(tf.values())}
+
+
+class JDIndex:
+    """
+    Inverted index over every *.txt file in corpus_dir. search() returns the
+    top-k passages by BM25 and transparently picks up edited files.
+    """
+
+    def __init__(self, corpus_dir=JD_DIR, index_path=JD_INDEX_PATH):
+        self.corpus_dir = corpus_dir
+        self.index_path = index_path
+        self._sources = {}  # path -> {"size", "mtime", "chunks"}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._loaded = False
+        # (postings, idf, length norms, passages), swapped as one unit
+        self._state = ({}, {}, [], [])
+        self.version = ""  # changes whenever the indexed corpus does
+
+    # -- building -----------------------------------------------------------
+
+    def _corpus_files(self) -> dict:
+        files = {}
+        if os.path.isdir(self.corpus_dir):
+            for name in sorted(os.listdir(self.corpus_dir)):
+                if name.endswith(".txt"):
+                    path = os.path.join(self.corpus_dir, name)
+                    stat = os.stat(path)
+                    files[path] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def _load_persisted(self):
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._sources = data["sources"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("[JDIndex] Ignoring unreadable index %s: %s", self.index_path, e)
+
+    def _persist(self):
+        tmp = self.index_path + ".tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(
+                    {"version": INDEX_VERSION, "sources": self._sources},
+                    f,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            # Read-only image or volume: the in-memory index still works
+            logging.warning("[JDIndex] Could not persist index: %s", e)
+
+    def refresh(self) -> bool:
+        """Re-chunk new or changed corpus files, drop deleted ones. True if anything changed."""
+        with self._lock:
+            if not self._loaded:
+                self._load_persisted()
+            files = self._corpus_files()
+            changed = [
+                path
+                for path, (size, mtime) in files.items()
+                if (self._sources.get(path) or {}).get("size") != size
+                or (self._sources.get(path) or {}).get("mtime") != mtime
+            ]
+            removed = [path for path in self._sources if path not in files]
+
+            for path in changed:
+                with open(path, encoding="utf-8") as f:
+                    chunks = chunk_document(f.read())
+                size, mtime = files[path]
+                self._sources[path] = {"size": size, "mtime": mtime, "chunks": chunks}
+                logging.info("[JDIndex] Indexed %s (%d passages)", path, len(chunks))
+            for path in removed:
+                del self._sources[path]
+
+            if changed or removed:
+                self._persist()
+            if changed or removed or not self._loaded:
+                self._build()
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            return bool(changed or removed)
+
+    def _build(self):
+        chunks = [c for path in sorted(self._sources) for c in self._sources[path]["chunks"]]
+        postings = defaultdict(list)
+        for i, chunk in enumerate(chunks):
+            for term, tf in chunk["tf"].items():
+                postings[term].append((i, tf))
+
+        n = len(chunks)
+        avgdl = (sum(c["len"] for c in chunks) / n) if n else 1.0
+        idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in postings.items()
+        }
+        norms = [BM25_K1 * (1 - BM25_B + BM25_B * c["len"] / avgdl) for c in chunks]
+        self._state = (dict(postings), idf, norms, [c["text"] for c in chunks])
+        self.version = hashlib.sha1(
+            json.dumps(
+                [(path, src["size"], src["mtime"]) for path, src in sorted(self._sources.items())]
+            ).encode()
+        ).hexdigest()[:12]
+
+    # -- querying -----------------------------------------------------------
+
+    def ensure_fresh(self):
+        """refresh() if the corpus hasn't been checked for JD_INDEX_CHECK_SECS."""
+        if not self._loaded or time.monotonic() - self._checked_at > JD_INDEX_CHECK_SECS:
+            try:
+                self.refresh()
+            except OSError as e:
+                logging.warning("[JDIndex] Refresh failed: %s", e)
+
+    def search(self, query: str, k: int = JD_TOP_K) -> list:
+        """[(score, passage)] best first; empty when nothing matches."""
+        self.ensure_fresh()
+        postings, idf, norms, chunks = self._state
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            weight = idf.get(term)
+            if weight is None:
+                continue
+            for i, tf in postings[term]:
+                scores[i] += weight * tf * (BM25_K1 + 1) / (tf + norms[i])
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(round(score, 3), chunks[i]) for i, score in best]
+
+    def has_passages(self) -> bool:
+        self.ensure_fresh()
+        return bool(self._state[3])
+
+    def stats(self) -> dict:
+        postings, _, _, chunks = self._state
+        return {
+            "sources": len(self._sources),
+            "passages": len(chunks),
+            "terms": len(postings),
+        }
+
+
+jd_index = JDIndex()
+
+
+def jd_context(query: str, k: int = JD_TOP_K) -> str:
+    """Top-k JD passages formatted for run instructions ("" when none match)."""
+    if not JD_RETRIEVAL:
+        return ""
+    try:
+        hits = jd_index.search(query, k)
+    except Exception as e:
+        logging.warning("[JDIndex] Search failed: %s", e)
+        return ""
+    if not hits:
+        return ""
+    passages = "\n\n".join(passage for _, passage in hits)
+    return (
+        "Relevant TechnoGen job descriptions (answer job questions from these; "
+        "do not invent roles or details that are not listed):\n\n" + passages
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    jd_index.refresh()
+    print(json.dumps(jd_index.stats()))
+    if len(sys.argv) > 1:
+        query = " ".join(sys.argv[1:])
+        started = time.perf_counter()
+        hits = jd_index.search(query)
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        for score, passage in hits:
+            print(f"--- {score}\n{passage}\n")
+        print(f"search took {elapsed_us:.0f}us")
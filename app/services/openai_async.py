@@ -0,0 +1,230 @@
+# --- app/services/openai_async.py ---
+# asyncio counterparts of the text-reply chain in openai_service.py, used by
+# the async worker mode. Each coroutine spends its life awaiting OpenAI, so a
+# single event loop can keep hundreds of conversations in flight.
+import asyncio
+import logging
+import time
+import uuid
+
+import openai
+from openai import AsyncOpenAI
+
+from app.services.dynamodb import save_message, save_thread
+from app.services.answer_cache import is_cacheable_question
+from app.services.assistant_runs import (
+    ACTIVE_RUN_STATUSES,
+    RunSuperseded,
+    backoff_intervals,
+    execute_run_async,
+)
+from app.services.thread_state import IDLE, UNKNOWN, thread_states
+from app.utils.deadline import DeadlineExceeded, bounded_timeout, check_deadline
+from app.services.openai_scheduler import (
+    backoff_with_jitter,
+    scheduled_async_http_client,
+)
+from app.services.openai_service import (
+    FALLBACK_REPLY,
+    MIN_REPLY_SECS,
+    OPENAI_API_KEY,
+    OPENAI_ASSISTANT_ID,
+    REPLY_BACKEND,
+    RUN_TIMEOUT_SECS,
+    answer_cache,
+    build_run_instructions,
+    check_if_thread_exists,
+    generate_local_response,
+    has_history,
+    latest_assistant_reply,
+    record_cached_turn,
+    run_tools,
+    with_jd_context,
+)
+
+async_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY, http_client=scheduled_async_http_client()
+)
+
+
+async def ensure_thread_async(wa_id: str) -> str:
+    # DynamoDB has no asyncio client in our deps; run boto3 off the loop
+    thread_id = await asyncio.to_thread(check_if_thread_exists, wa_id)
+    if not thread_id:
+        thread = await async_client.beta.threads.create()
+        thread_id = thread.id
+        await asyncio.to_thread(save_thread, wa_id, thread_id)
+        logging.info("[GPT Async] Created new thread %s for %s", thread_id, wa_id)
+    return thread_id
+
+
+async def wait_until_idle_async(thread_id: str, timeout: float = 12.0) -> bool:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + bounded_timeout(timeout)
+    intervals = backoff_intervals()
+    while True:
+        runs = await async_client.beta.threads.runs.list(thread_id=thread_id, limit=1)
+        busy = runs.data and runs.data[0].status in ACTIVE_RUN_STATUSES
+        if not busy:
+            return True
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(next(intervals), remaining))
+
+
+async def safe_add_message_to_thread_async(
+    thread_id: str, content: str, wa_id: str, retries: int = 5, delay: float = 0.6
+):
+    # Same local-state rules as safe_add_message_to_thread; per-wa_id ordering
+    # comes from the AsyncKeyedExecutor, so no thread lock is taken here.
+    tag = f"{wa_id}:{uuid.uuid4().hex[:8]}"
+    state = thread_states.get(thread_id)
+    for attempt in range(retries):
+        if state.status != IDLE and await wait_until_idle_async(thread_id, timeout=5):
+            state.set(IDLE)
+        try:
+            await async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=f"{content}\n\n[MSG_TAG:{tag}]",
+                metadata={"wa_id": wa_id, "msg_tag": tag},
+            )
+            state.set(IDLE)
+            return tag
+        except openai.BadRequestError as e:
+            state.set(UNKNOWN)
+            logging.warning(
+                "Add to thread %s rejected (attempt %d): %s", thread_id, attempt + 1, e
+            )
+            await asyncio.sleep(delay)
+    raise RuntimeError("Could not add user message to the thread")
+
+
+async def cancel_timed_out_run_async(thread_id: str, run_id: str):
+    """cancel_timed_out_run for the async client."""
+    thread_states.mark_unknown(thread_id)
+    try:
+        await async_client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        logging.info("Cancelled timed-out run %s on thread %s", run_id, thread_id)
+    except openai.APIError as e:
+        logging.warning("Could not cancel timed-out run %s: %s", run_id, e)
+
+
+async def run_assistant_async(
+    thread_id, name, retries=3, delay=2, extra_instructions: str = ""
+):
+    for attempt in range(retries):
+        check_deadline("run_assistant_async", MIN_REPLY_SECS)
+        try:
+            timeout = bounded_timeout(RUN_TIMEOUT_SECS)
+            result = await execute_run_async(
+                async_client,
+                thread_id,
+                OPENAI_ASSISTANT_ID,
+                instructions=build_run_instructions(name, extra_instructions),
+                on_event=thread_states.track_run_events(thread_id),
+                timeout_secs=timeout,
+                tools=run_tools(),
+            )
+            if not result.completed:
+                if thread_states.was_superseded(thread_id, result.run_id):
+                    raise RunSuperseded(result.run_id)
+                if result.status in ACTIVE_RUN_STATUSES:
+                    await cancel_timed_out_run_async(thread_id, result.run_id)
+                    if timeout < RUN_TIMEOUT_SECS:
+                        raise DeadlineExceeded("run_assistant_async")
+                logging.error(
+                    "[run_assistant_async] Run did not complete. status=%s last_error=%s",
+                    result.status,
+                    result.last_error,
+                )
+                return None
+            if result.text:
+                return result.text
+
+            msgs = await async_client.beta.threads.messages.list(
+                thread_id=thread_id, limit=50
+            )
+            reply = latest_assistant_reply(msgs.data)
+            if reply:
+                return reply
+
+            logging.error(
+                "[run_assistant_async] No assistant message found after a completed run."
+            )
+            return None
+
+        except openai.InternalServerError as e:
+            thread_states.mark_unknown(thread_id)
+            logging.warning(
+                "[run_assistant_async] Attempt %d/%d - OpenAI server error: %s",
+                attempt + 1,
+                retries,
+                e,
+            )
+            await asyncio.sleep(
+                bounded_timeout(backoff_with_jitter(attempt, delay), floor=0)
+            )
+        except (RunSuperseded, DeadlineExceeded):
+            raise
+        except Exception:
+            thread_states.mark_unknown(thread_id)
+            raise
+
+    raise RuntimeError("Failed to retrieve assistant after retries")
+
+
+async def generate_response_async(
+    message_body, wa_id, name, extra_instructions: str = ""
+):
+    use_cache = answer_cache is not None and not extra_instructions
+    if use_cache:
+        cached = answer_cache.lookup(message_body, name)
+        if cached is not None:
+            await asyncio.to_thread(record_cached_turn, wa_id, message_body, cached)
+            return cached
+
+    shareable = (
+        use_cache
+        and is_cacheable_question(message_body)
+        and not await asyncio.to_thread(has_history, wa_id)
+    )
+    started = time.monotonic()
+    response = await _generate_response_async(
+        message_body, wa_id, name, extra_instructions
+    )
+    if shareable and response != FALLBACK_REPLY:
+        answer_cache.store(message_body, name, response, time.monotonic() - started)
+    return response
+
+
+async def _generate_response_async(
+    message_body, wa_id, name, extra_instructions: str = ""
+):
+    # Before anything is stored (see _generate_response)
+    check_deadline("generate_response_async", MIN_REPLY_SECS)
+    extra_instructions = with_jd_context(message_body, extra_instructions)
+    if REPLY_BACKEND == "local":
+        # One blocking completion call; not worth a second, async code path
+        return await asyncio.to_thread(
+            generate_local_response, message_body, wa_id, name, extra_instructions
+        )
+
+    thread_id = await ensure_thread_async(wa_id)
+
+    await asyncio.to_thread(
+        save_message, wa_id, str(uuid.uuid4()), message_body, "user"
+    )
+    await safe_add_message_to_thread_async(thread_id, message_body, wa_id)
+
+    response = await run_assistant_async(
+        thread_id, name, extra_instructions=extra_instructions
+    )
+    if not response:
+        response = FALLBACK_REPLY
+
+    await asyncio.to_thread(
+        save_message, wa_id, str(uuid.uuid4()), response, "assistant"
+    )
+    return response
@@ -0,0 +1,108 @@
+# --- app/services/openai_reaper.py ---
+# Resume checks on the Assistants API leave an uploaded file and a temp thread
+# behind. Each one is recorded in OPENAI_RESOURCES_TABLE as it is created and
+# deleted in the background once the check is done; the periodic
+# reap_openai_resources Celery task deletes whatever is still recorded after
+# OPENAI_RESOURCE_TTL (crash mid-check, failed delete). Deletes run a few at a
+# time behind a token bucket so cleanup never competes with replies for quota.
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from app.services.dynamodb import (
+    due_openai_resources,
+    forget_openai_resource,
+    record_openai_resource,
+)
+from app.services.openai_scheduler import background_priority, retry_after
+from app.utils.token_bucket import TokenBucket
+
+# Seconds after creation before the periodic task treats a resource as leaked
+OPENAI_RESOURCE_TTL = float(os.getenv("OPENAI_RESOURCE_TTL", "3600"))
+OPENAI_REAPER_BATCH = int(os.getenv("OPENAI_REAPER_BATCH", "200"))
+OPENAI_REAPER_CONCURRENCY = int(os.getenv("OPENAI_REAPER_CONCURRENCY", "4"))
+OPENAI_REAPER_RPS = float(os.getenv("OPENAI_REAPER_RPS", "5"))
+
+FILE, THREAD = "file", "thread"
+
+
+class ResourceReaper:
+    """
+    track(kind, id) when a temp resource is created, release(kind, id) when it
+    is no longer needed; reap() deletes everything overdue.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl: float = OPENAI_RESOURCE_TTL,
+        concurrency: int = OPENAI_REAPER_CONCURRENCY,
+        rps: float = OPENAI_REAPER_RPS,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="openai-reaper"
+        )
+        self._bucket = TokenBucket(rps)
+        self._lock = threading.Lock()
+        self.deleted = Counter()
+        self.failed = 0
+
+    def track(self, kind: str, resource_id: str):
+        try:
+            record_openai_resource(kind, resource_id, time.time() + self.ttl)
+        except Exception as e:
+            # Still deleted by release(); only the safety net is lost
+            logging.warning("[Reaper] Could not record %s %s: %s", kind, resource_id, e)
+
+    def release(self, kind: str, resource_id: str):
+        """Delete in the background; on failure reap() retries after the TTL."""
+        self._pool.submit(self._delete, kind, resource_id)
+
+    @background_priority()
+    def _delete(self, kind: str, resource_id: str) -> bool:
+        self._bucket.acquire()
+        try:
+            if kind == FILE:
+                self.client.files.delete(resource_id)
+            elif kind == THREAD:
+                self.client.beta.threads.delete(resource_id)
+            else:
+                raise ValueError(f"unknown resource kind {kind!r}")
+        except openai.NotFoundError:
+            pass  # already gone; just drop the record
+        except Exception as e:
+            if isinstance(e, openai.RateLimitError):
+                self._bucket.pause(retry_after(e.response.headers) or 1.0)
+            logging.warning("[Reaper] Failed to delete %s %s: %s", kind, resource_id, e)
+            with self._lock:
+                self.failed += 1
+            return False
+        with self._lock:
+            self.deleted[kind] += 1
+        try:
+            forget_openai_resource(resource_id)
+        except Exception as e:
+            # Next reap() gets NotFound for it and forgets it then
+            logging.warning("[Reaper] Could not forget %s: %s", resource_id, e)
+        return True
+
+    def reap(self, limit: int = OPENAI_REAPER_BATCH) -> dict:
+        """Delete up to `limit` overdue resources; returns {"due", "deleted"}."""
+        due = due_openai_resources(time.time(), limit)
+        results = self._pool.map(
+            lambda item: self._delete(item["kind"], item["resource_id"]), due
+        )
+        deleted = sum(results)
+        if due:
+            logging.info("[Reaper] Deleted %d of %d overdue OpenAI resources", deleted, len(due))
+        return {"due": len(due), "deleted": deleted}
+
+    def stats(self) -> dict:
+        return {"deleted": dict(self.deleted), "failed": self.failed}
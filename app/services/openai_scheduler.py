@@ -0,0 +1,436 @@
+# --- app/services/openai_scheduler.py ---
+# Client-side rate limiting for every OpenAI call. The OpenAI clients are
+# built on an httpx transport that takes one request plus an estimated token
+# count from an RPM/TPM budget before each call, and afterwards honours 429s
+# (retry-after plus jitter) and exhausted x-ratelimit-* headers by pausing
+# the budget for everyone sharing it. The transport never retries itself: the
+# SDK's own retries come back through it and wait out the pause. GETs (run
+# polls, retrieves, lists) skip the budget; they carry no tokens and would
+# otherwise cost a DynamoDB round trip each. The budget lives in memory (one
+# per process) or in DynamoDB (one for all workers and nodes). Neither waiting
+# for budget nor a request's own timeouts outlast the message deadline.
+#
+# Interactive replies may spend the whole budget. Background work (resume
+# checks, summaries, cleanup) runs under background_priority(): it leaves
+# OPENAI_BACKGROUND_RESERVE of both buckets untouched and steps aside while
+# a reply in this process is waiting.
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Optional
+
+import httpx
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import BotoCoreError, ClientError
+
+from app.services.dynamodb import openai_budget_table
+from app.utils.deadline import bounded_timeout, time_left
+from app.utils.token_bucket import TokenBucket
+
+OPENAI_RATE_LIMIT = os.getenv("OPENAI_RATE_LIMIT", "1") == "1"
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+# "memory" (per process) or "dynamodb" (shared across processes and nodes)
+OPENAI_BUDGET_BACKEND = os.getenv("OPENAI_BUDGET_BACKEND", "memory")
+OPENAI_BUDGET_KEY = os.getenv("OPENAI_BUDGET_KEY", "openai")
+# Share of both buckets background work must leave for interactive replies
+OPENAI_BACKGROUND_RESERVE = float(os.getenv("OPENAI_BACKGROUND_RESERVE", "0.2"))
+# Past this a request goes out anyway rather than stall its caller
+OPENAI_RATE_MAX_WAIT = float(os.getenv("OPENAI_RATE_MAX_WAIT", "30"))
+# Runs read the whole thread, so their size is unknown up front
+OPENAI_RUN_TOKEN_ESTIMATE = int(os.getenv("OPENAI_RUN_TOKEN_ESTIMATE", "3000"))
+
+INTERACTIVE, BACKGROUND = "interactive", "background"
+_priority = contextvars.ContextVar("openai_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority():
+    """OpenAI calls made in this block (or decorated function) are background work."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def backoff_with_jitter(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for attempt 0, 1, 2, ..."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class MemoryBudget:
+    """RPM and TPM token buckets local to this process."""
+
+    remote = False
+
+    def __init__(self, rpm: float = OPENAI_RPM, tpm: float = OPENAI_TPM):
+        self.requests = TokenBucket(rpm / 60, capacity=rpm)
+        self.tokens = TokenBucket(tpm / 60, capacity=tpm)
+        self._lock = threading.Lock()
+
+    def try_take(self, tokens: float, reserve: float = 0.0) -> float:
+        """Take one request and `tokens`: 0 if granted, else seconds to wait."""
+        tokens = min(tokens, self.tokens.capacity * (1 - reserve))
+        with self._lock:
+            wait = self.requests.try_acquire(1, reserve * self.requests.capacity)
+            if wait > 0:
+                return wait
+            wait = self.tokens.try_acquire(tokens, reserve * self.tokens.capacity)
+            if wait > 0:
+                self.requests.refund(1)
+            return wait
+
+    def pause(self, seconds: float):
+        self.requests.pause(seconds)
+
+
+def _num(value: float) -> Decimal:
+    return Decimal(str(round(value, 3)))
+
+
+class DynamoDBBudget:
+    """
+    The same two buckets kept in one DynamoDB item, so every worker draws
+    from a single budget. Writes are conditional on the item's version, so
+    concurrent takers never double-spend. DynamoDB errors fail open: a
+    hiccup there must not stop replies.
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        table=openai_budget_table,
+        key: str = OPENAI_BUDGET_KEY,
+        rpm: float = OPENAI_RPM,
+        tpm: float = OPENAI_TPM,
+    ):
+        self.table = table
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def try_take(self, tokens: float, reserve: float = 0.0) -> float:
+        tokens = min(tokens, self.tpm * (1 - reserve))
+        for _ in range(5):
+            try:
+                item = self.table.get_item(
+                    Key={"budget": self.key}, ConsistentRead=True
+                ).get("Item") or {}
+            except (BotoCoreError, ClientError) as e:
+                logging.warning("[OpenAI budget] Read failed, not limiting: %s", e)
+                return 0.0
+            now = time.time()
+            paused_until = float(item.get("paused_until", 0))
+            if paused_until > now:
+                return paused_until - now
+            elapsed = max(0.0, now - float(item.get("updated", now)))
+            requests = min(self.rpm, float(item.get("requests", self.rpm)) + elapsed * self.rpm / 60)
+            available = min(self.tpm, float(item.get("tokens", self.tpm)) + elapsed * self.tpm / 60)
+            if requests - 1 < reserve * self.rpm:
+                return (1 + reserve * self.rpm - requests) / (self.rpm / 60)
+            if available - tokens < reserve * self.tpm:
+                return (tokens + reserve * self.tpm - available) / (self.tpm / 60)
+            version = int(item.get("version", 0))
+            try:
+                self.table.put_item(
+                    Item={
+                        "budget": self.key,
+                        "version": version + 1,
+                        "requests": _num(requests - 1),
+                        "tokens": _num(available - tokens),
+                        "updated": _num(now),
+                        "paused_until": _num(paused_until),
+                    },
+                    ConditionExpression=Attr("version").not_exists()
+                    | Attr("version").eq(version),
+                )
+                return 0.0
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    logging.warning("[OpenAI budget] Write failed, not limiting: %s", e)
+                    return 0.0
+                # Another worker took from the budget first; re-read
+            except BotoCoreError as e:
+                logging.warning("[OpenAI budget] Write failed, not limiting: %s", e)
+                return 0.0
+        return 0.05
+
+    def pause(self, seconds: float):
+        until = time.time() + seconds
+        try:
+            # Bumping the version makes in-flight try_take writes re-read
+            self.table.update_item(
+                Key={"budget": self.key},
+                UpdateExpression="SET paused_until = :until, version = if_not_exists(version, :zero) + :one",
+                ConditionExpression="attribute_not_exists(paused_until) OR paused_until < :until",
+                ExpressionAttributeValues={":until": _num(until), ":zero": 0, ":one": 1},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                logging.warning("[OpenAI budget] Pause failed: %s", e)
+        except BotoCoreError as e:
+            logging.warning("[OpenAI budget] Pause failed: %s", e)
+
+
+class OpenAIScheduler:
+    """
+    acquire(tokens) before a request (blocks, by the caller's priority);
+    throttled()/observe() after it, to feed server limits back into the budget.
+    """
+
+    def __init__(
+        self,
+        backend,
+        reserve: float = OPENAI_BACKGROUND_RESERVE,
+        max_wait: float = OPENAI_RATE_MAX_WAIT,
+    ):
+        self.backend = backend
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._interactive_waiting = 0
+        self.granted = Counter()
+        self.wait_secs = Counter()
+        self.forced = 0
+        self.throttled_count = 0
+
+    def _try(self, tokens: float, priority: str) -> float:
+        if priority == INTERACTIVE:
+            return self.backend.try_take(tokens)
+        if self._interactive_waiting:
+            return 0.05
+        return self.backend.try_take(tokens, self.reserve)
+
+    def _enter(self, priority: str):
+        if priority == INTERACTIVE:
+            with self._lock:
+                self._interactive_waiting += 1
+
+    def _leave(self, priority: str, started: float, forced: bool):
+        with self._lock:
+            if priority == INTERACTIVE:
+                self._interactive_waiting -= 1
+            self.granted[priority] += 1
+            self.wait_secs[priority] += time.monotonic() - started
+            self.forced += forced
+
+    def _next_sleep(self, wait: float, started: float):
+        """Jittered sleep before the next try, or None once max_wait (or the deadline) is spent."""
+        remaining = self.max_wait - (time.monotonic() - started)
+        left = time_left()
+        if left is not None:
+            remaining = min(remaining, left)
+        if remaining <= 0:
+            return None
+        return min(wait * random.uniform(1.0, 1.2), 1.0, remaining)
+
+    def acquire(self, tokens: float = 0):
+        priority = _priority.get()
+        started = time.monotonic()
+        forced = False
+        self._enter(priority)
+        try:
+            while True:
+                wait = self._try(tokens, priority)
+                if wait <= 0:
+                    break
+                sleep = self._next_sleep(wait, started)
+                if sleep is None:
+                    forced = True
+                    break
+                time.sleep(sleep)
+        finally:
+            self._leave(priority, started, forced)
+        if forced:
+            logging.warning("[OpenAI budget] No budget after %.0fs; sending anyway", self.max_wait)
+
+    async def acquire_async(self, tokens: float = 0):
+        priority = _priority.get()
+        started = time.monotonic()
+        forced = False
+        self._enter(priority)
+        try:
+            while True:
+                if self.backend.remote:
+                    wait = await asyncio.to_thread(self._try, tokens, priority)
+                else:
+                    wait = self._try(tokens, priority)
+                if wait <= 0:
+                    break
+                sleep = self._next_sleep(wait, started)
+                if sleep is None:
+                    forced = True
+                    break
+                await asyncio.sleep(sleep)
+        finally:
+            self._leave(priority, started, forced)
+        if forced:
+            logging.warning("[OpenAI budget] No budget after %.0fs; sending anyway", self.max_wait)
+
+    def throttled(self, response: httpx.Response):
+        """A 429 came back: pause the whole budget for its retry-after."""
+        delay = retry_after(response.headers)
+        if delay is None:
+            delay = backoff_with_jitter(1)
+        else:
+            delay *= random.uniform(1.0, 1.25)
+        with self._lock:
+            self.throttled_count += 1
+        logging.warning("[OpenAI budget] 429 from OpenAI; pausing %.1fs", delay)
+        self.backend.pause(delay)
+
+    def observe(self, response: httpx.Response):
+        """Pause until reset when the server says a limit is used up."""
+        for kind in ("requests", "tokens"):
+            if response.headers.get(f"x-ratelimit-remaining-{kind}", "").strip() == "0":
+                reset = parse_duration(response.headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.backend.pause(reset)
+                    return
+
+    def stats(self) -> dict:
+        return {
+            "backend": OPENAI_BUDGET_BACKEND,
+            "granted": dict(self.granted),
+            "wait_secs": {k: round(v, 2) for k, v in self.wait_secs.items()},
+            "forced": self.forced,
+            "throttled": self.throttled_count,
+        }
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> float:
+    """OpenAI reset durations like "1s", "6m0s", "120ms"; None if unparseable."""
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def retry_after(headers) -> Optional[float]:
+    """Seconds OpenAI asked us to wait (retry-after-ms or retry-after), or None."""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Rough token cost of a request: chat completions and run creation only."""
+    path = request.url.path
+    if request.method != "POST" or not path.endswith(("/chat/completions", "/runs")):
+        return 0
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return 0
+    if path.endswith("/runs"):
+        text = (body.get("instructions") or "") + (body.get("additional_instructions") or "")
+        return OPENAI_RUN_TOKEN_ESTIMATE + len(text) // 4
+    messages = body.get("messages") or []
+    prompt = sum(len(str(m.get("content") or "")) // 4 + 4 for m in messages)
+    return prompt + int(body.get("max_tokens") or body.get("max_completion_tokens") or 500)
+
+
+def _cap_timeouts(request: httpx.Request):
+    """Shrink the request's httpx timeouts to what's left of the message deadline."""
+    if time_left() is None:
+        return
+    timeouts = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        kind: bounded_timeout(secs if secs is not None else float("inf"))
+        for kind, secs in timeouts.items()
+    }
+
+
+def _budgeted(request: httpx.Request) -> bool:
+    return request.method != "GET"
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    def __init__(self, scheduler: OpenAIScheduler, transport: httpx.BaseTransport = None):
+        self.scheduler = scheduler
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        _cap_timeouts(request)
+        if _budgeted(request):
+            self.scheduler.acquire(estimate_request_tokens(request))
+        response = self._transport.handle_request(request)
+        if response.status_code != 429:
+            self.scheduler.observe(response)
+        elif b"insufficient_quota" not in response.read():  # waiting won't help that
+            self.scheduler.throttled(response)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self, scheduler: OpenAIScheduler, transport: httpx.AsyncBaseTransport = None
+    ):
+        self.scheduler = scheduler
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _cap_timeouts(request)
+        if _budgeted(request):
+            await self.scheduler.acquire_async(estimate_request_tokens(request))
+        response = await self._transport.handle_async_request(request)
+        if response.status_code != 429:
+            # observe() may pause a remote budget: a blocking DynamoDB write
+            if self.scheduler.backend.remote:
+                await asyncio.to_thread(self.scheduler.observe, response)
+            else:
+                self.scheduler.observe(response)
+        elif b"insufficient_quota" not in await response.aread():
+            if self.scheduler.backend.remote:
+                await asyncio.to_thread(self.scheduler.throttled, response)
+            else:
+                self.scheduler.throttled(response)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _make_backend():
+    if OPENAI_BUDGET_BACKEND == "dynamodb":
+        return DynamoDBBudget()
+    return MemoryBudget()
+
+
+scheduler = OpenAIScheduler(_make_backend())
+
+
+def scheduled_http_client():
+    """httpx client for OpenAI(http_client=...); None (SDK default) when disabled."""
+    if not OPENAI_RATE_LIMIT:
+        return None
+    return httpx.Client(transport=ScheduledTransport(scheduler), follow_redirects=True)
+
+
+def scheduled_async_http_client():
+    if not OPENAI_RATE_LIMIT:
+        return None
+    return httpx.AsyncClient(
+        transport=AsyncScheduledTransport(scheduler), follow_redirects=True
+    )
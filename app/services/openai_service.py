@@ -1,22 +1,93 @@
 import logging
 import os
 import time
+import hashlib
 import json
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import openai
 from openai import OpenAI
 from app.services.dynamodb import (
+    get_conversation_summary,
+    get_recent_messages,
     get_thread,
+    save_conversation_summary,
     save_message,
+    thread_cache,
 )
 from app.services.dynamodb import save_thread
+from app.services.thread_state import IDLE, RUNNING, UNKNOWN, thread_states
+from app.services.assistant_runs import (
+    ACTIVE_RUN_STATUSES,
+    RunEvent,
+    RunSuperseded,
+    backoff_intervals,
+    execute_run,
+    poll_run,
+)
+from app.services.answer_cache import (
+    ANSWER_CACHE,
+    AnswerCache,
+    is_cacheable_question,
+)
+from app.services.intent_router import intent_router
+from app.services.jd_index import JD_RETRIEVAL, jd_context, jd_index
+from app.services.openai_reaper import FILE, THREAD, ResourceReaper
+from app.services.openai_scheduler import (
+    background_priority,
+    backoff_with_jitter,
+    scheduled_http_client,
+)
+from app.utils.cache import TTLCache
+from app.utils.deadline import DeadlineExceeded, bounded_timeout, check_deadline
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Every call goes through the shared RPM/TPM budget (openai_scheduler)
+client = OpenAI(api_key=OPENAI_API_KEY, http_client=scheduled_http_client())
+
+# Opt-in: a newer user message cancels the thread's in-flight run
+SUPERSEDE_RUNS = os.getenv("SUPERSEDE_RUNS", "0") == "1"
+
+# "threads" (Assistants threads + runs) or "local" (prompt built from our own
+# stored history, one chat completion per reply)
+REPLY_BACKEND = os.getenv("REPLY_BACKEND", "threads")
+REPLY_MODEL = os.getenv("REPLY_MODEL", "gpt-4o-mini")
+REPLY_MAX_TOKENS = int(os.getenv("REPLY_MAX_TOKENS", "500"))
+# Prompt budget for history; older turns are folded into a running summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_HISTORY_LIMIT = int(os.getenv("CONTEXT_HISTORY_LIMIT", "30"))
+
+
+def run_tools():
+    """
+    Per-run tools override. With local JD retrieval the passages ride along in
+    the instructions, so runs go without file_search; with an empty index
+    (missing corpus) the assistant keeps its own tools.
+    """
+    if JD_RETRIEVAL and jd_index.has_passages():
+        return []
+    return None
+
+
+# Deletes the temp files/threads of resume checks
+resource_reaper = ResourceReaper(client)
+
+FALLBACK_REPLY = "Sorry, I couldn't process that right now. Please try again shortly."
+
+# Longest a reply run may take; less when the message's deadline is closer
+RUN_TIMEOUT_SECS = float(os.getenv("RUN_TIMEOUT_SECS", "30"))
+# With less than this left on the deadline no model call is started; the
+# candidate gets fast_reply() instead
+MIN_REPLY_SECS = float(os.getenv("DEADLINE_MIN_REPLY_SECS", "8"))
+DEADLINE_REPLY = (
+    "Sorry for the wait, we're receiving a lot of messages right now. "
+    "Please send your question again in a few minutes."
+)
 
 
 def create_assistant():
@@ -39,80 +110,127 @@ def check_if_thread_exists(wa_id):
     return item["thread_id"]
 
 
-def poll_until_complete(thread_id, run_id, timeout_secs=30, poll_interval=0.3):
+def ensure_thread(wa_id) -> str:
+    thread_id = check_if_thread_exists(wa_id)
+    if not thread_id:
+        thread = client.beta.threads.create()
+        thread_id = thread.id
+        save_thread(wa_id, thread_id)
+    return thread_id
+
+
+def poll_until_complete(thread_id, run_id, timeout_secs=30):
     """
-    Poll the run until it completes or fails.
+    Wait for an existing run to complete or fail (adaptive backoff polling).
     Returns (completed: bool, status: str, last_error: Any)
     """
-    deadline = time.time() + timeout_secs
-    while time.time() < deadline:
-        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        if run.status == "completed":
-            return True, run.status, None
-        if run.status in ("failed", "cancelled", "expired"):
-            return False, run.status, getattr(run, "last_error", None)
-        time.sleep(poll_interval)
-
-    # Timeout: fetch one more time so we can log the actual status/last_error
-    run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-    return False, run.status, getattr(run, "last_error", None)
+    result = poll_run(client, thread_id, run_id, bounded_timeout(timeout_secs))
+    return result.completed, result.status, result.last_error
 
 
-def run_assistant(thread_id, name, retries=3, delay=2, extra_instructions: str = ""):
+def build_run_instructions(name, extra_instructions: str = "") -> str:
+    base = (
+        f"You are talking to {name}, a job candidate. "
+        "Be warm, professional, and helpful. Avoid repetition. "
+        "Respond directly to the candidate's latest message."
+    )
+    instructions = base + "\n\n" + POLICY_INSTRUCTIONS
+    if extra_instructions:
+        instructions += "\n\n" + extra_instructions
+    return instructions
+
+
+def latest_assistant_reply(messages) -> str:
+    """Text of the newest assistant message in a NEWEST → OLDEST listing."""
+    for msg in messages:
+        if msg.role == "assistant":
+            parts = []
+            for part in msg.content:
+                text = getattr(part, "text", None)
+                if text and getattr(text, "value", None):
+                    parts.append(text.value)
+            reply = "\n".join(parts).strip() if parts else ""
+            if reply:
+                return reply
+    return ""
+
+
+def run_assistant(
+    thread_id,
+    name,
+    retries=3,
+    delay=2,
+    extra_instructions: str = "",
+    on_event=None,
+):
     """
     Start a run on the given thread and return the NEWEST assistant reply.
     - Appends POLICY_INSTRUCTIONS and any extra_instructions you pass.
     - Logs run status/last_error on failure or timeout.
+    - on_event receives the run's RunEvents (e.g. text deltas while streaming).
+    - A run that already streamed text to on_event is not retried: the
+      candidate may have those sentences and a new run would repeat them.
     """
-    for attempt in range(retries):
-        try:
-            assistant = client.beta.assistants.retrieve(OPENAI_ASSISTANT_ID)
-
-            # Sanity check: make sure file_search is actually enabled on THIS assistant
-            tool_types = [getattr(t, "type", None) for t in (assistant.tools or [])]
-            if "file_search" not in tool_types:
-                logging.error(
-                    "[run_assistant] Assistant %s does not have file_search enabled. tools=%s",
-                    assistant.id,
-                    tool_types,
-                )
+    streamed = []
 
-            base = (
-                f"You are talking to {name}, a job candidate. "
-                "Be warm, professional, and helpful. Avoid repetition. "
-                "Respond directly to the candidate's latest message."
-            )
-            instructions = base + "\n\n" + POLICY_INSTRUCTIONS
-            if extra_instructions:
-                instructions += "\n\n" + extra_instructions
+    def forward(event):
+        if event.type == "delta":
+            streamed.append(event.text)
+        if on_event:
+            on_event(event)
 
-            run = client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=assistant.id,
+    for attempt in range(retries):
+        # Raises DeadlineExceeded rather than start a run that can't finish
+        check_deadline("run_assistant", MIN_REPLY_SECS)
+        try:
+            assistant_id = OPENAI_ASSISTANT_ID
+            if not JD_RETRIEVAL:
+                assistant = client.beta.assistants.retrieve(OPENAI_ASSISTANT_ID)
+                assistant_id = assistant.id
+
+                # Sanity check: make sure file_search is actually enabled on THIS assistant
+                tool_types = [getattr(t, "type", None) for t in (assistant.tools or [])]
+                if "file_search" not in tool_types:
+                    logging.error(
+                        "[run_assistant] Assistant %s does not have file_search enabled. tools=%s",
+                        assistant.id,
+                        tool_types,
+                    )
+
+            instructions = build_run_instructions(name, extra_instructions)
+
+            timeout = bounded_timeout(RUN_TIMEOUT_SECS)
+            result = execute_run(
+                client,
+                thread_id,
+                assistant_id,
                 instructions=instructions,
+                on_event=thread_states.track_run_events(thread_id, forward),
+                timeout_secs=timeout,
+                tools=run_tools(),
             )
-
-            completed, status, last_error = poll_until_complete(thread_id, run.id)
-            if not completed:
+            if not result.completed:
+                if thread_states.was_superseded(thread_id, result.run_id):
+                    raise RunSuperseded(result.run_id)
+                if result.status in ACTIVE_RUN_STATUSES:
+                    cancel_timed_out_run(thread_id, result.run_id)
+                    if timeout < RUN_TIMEOUT_SECS:
+                        # Cut short by the message deadline, not a slow model
+                        raise DeadlineExceeded("run_assistant")
                 logging.error(
                     "[run_assistant] Run did not complete. status=%s last_error=%s",
-                    status,
-                    last_error,
+                    result.status,
+                    result.last_error,
                 )
                 return None
+            if result.text:
+                return result.text
 
-            # NEWEST → OLDEST; return the first assistant message
+            # Not streamed: NEWEST → OLDEST; return the first assistant message
             msgs = client.beta.threads.messages.list(thread_id=thread_id, limit=50)
-            for msg in msgs.data:
-                if msg.role == "assistant":
-                    parts = []
-                    for part in msg.content:
-                        text = getattr(part, "text", None)
-                        if text and getattr(text, "value", None):
-                            parts.append(text.value)
-                    reply = "\n".join(parts).strip() if parts else ""
-                    if reply:
-                        return reply
+            reply = latest_assistant_reply(msgs.data)
+            if reply:
+                return reply
 
             logging.error(
                 "[run_assistant] No assistant message found after a completed run."
@@ -120,14 +238,25 @@ def run_assistant(thread_id, name, retries=3, delay=2, extra_instructions: str =
             return None
 
         except openai.InternalServerError as e:
+            thread_states.mark_unknown(thread_id)
+            if streamed:
+                # Tell the streamer to drop its unsent tail, then give up
+                forward(RunEvent("failed", status="failed", error=e))
+                logging.warning(
+                    "[run_assistant] Run failed after streaming part of the reply: %s", e
+                )
+                raise
             logging.warning(
                 "[run_assistant] Attempt %d/%d - OpenAI server error: %s",
                 attempt + 1,
                 retries,
                 e,
             )
-            time.sleep(delay)
+            time.sleep(bounded_timeout(backoff_with_jitter(attempt, delay), floor=0))
+        except (RunSuperseded, DeadlineExceeded):
+            raise
         except Exception as e:
+            thread_states.mark_unknown(thread_id)
             logging.exception(
                 "[run_assistant] Unhandled error on attempt %d: %r", attempt + 1, e
             )
@@ -145,58 +274,117 @@ Always give one clear next step; avoid generic 'How can I help?' replies.
 """
 
 
-def wait_until_idle(thread_id: str, timeout: float = 12.0, poll: float = 0.3) -> bool:
-    deadline = time.time() + timeout
-    while time.time() < deadline:
+def cancel_timed_out_run(thread_id: str, run_id: str):
+    """
+    Cancel a run we stopped waiting for; left alone it would still write a
+    reply nobody receives and hold the thread against the next message.
+    """
+    thread_states.mark_unknown(thread_id)
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        logging.info("Cancelled timed-out run %s on thread %s", run_id, thread_id)
+    except openai.APIError as e:
+        # Usually it finished in the meantime
+        logging.warning("Could not cancel timed-out run %s: %s", run_id, e)
+
+
+def wait_until_idle(thread_id: str, timeout: float = 12.0) -> bool:
+    deadline = time.time() + bounded_timeout(timeout)
+    intervals = backoff_intervals()
+    while True:
         runs = client.beta.threads.runs.list(thread_id=thread_id, limit=1)
-        busy = runs.data and runs.data[0].status in (
-            "in_progress",
-            "queued",
-            "requires_action",
-        )
+        busy = runs.data and runs.data[0].status in ACTIVE_RUN_STATUSES
         if not busy:
             return True
-        time.sleep(poll)
-    return False
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(next(intervals), remaining))
 
 
 def safe_add_message_to_thread(
-    thread_id: str, content: str, wa_id: str, retries: int = 5, delay: float = 0.6
+    thread_id: str,
+    content: str,
+    wa_id: str,
+    retries: int = 5,
+    delay: float = 0.6,
+    role: str = "user",
 ):
+    """
+    Append a message (a user one unless role says otherwise) to the thread.
+    When local state says the thread is
+    idle we create the message straight away; only an UNKNOWN or RUNNING
+    thread waits on the remote run list first. A rejected create means local
+    state was wrong, so it is reset to UNKNOWN and we retry.
+    """
     tag = f"{wa_id}:{uuid.uuid4().hex[:8]}"
-    for attempt in range(retries):
-        wait_until_idle(thread_id, timeout=5)
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=f"{content}\n\n[MSG_TAG:{tag}]",
-            metadata={"wa_id": wa_id, "msg_tag": tag},
-        )
-        # verify it's the newest user
-        msgs = client.beta.threads.messages.list(thread_id=thread_id, limit=10)
-        for m in msgs.data:  # newest → oldest
-            if m.role == "user":
-                meta = getattr(m, "metadata", None) or {}
-                text = (
-                    m.content
-                    and getattr(m.content[0], "text", None)
-                    and m.content[0].text.value
-                ) or ""
-                if meta.get("msg_tag") == tag or text.endswith(f"[MSG_TAG:{tag}]"):
-                    return tag
-                break
-        logging.warning(
-            "Top user turn not ours; retrying add (attempt %d)", attempt + 1
-        )
-        time.sleep(delay)
-    raise RuntimeError("Could not verify user message was added to the thread")
+    state = thread_states.get(thread_id)
+    with state.lock:
+        for attempt in range(retries):
+            if state.status != IDLE and wait_until_idle(thread_id, timeout=5):
+                state.set(IDLE)
+            try:
+                client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role=role,
+                    content=f"{content}\n\n[MSG_TAG:{tag}]" if role == "user" else content,
+                    metadata={"wa_id": wa_id, "msg_tag": tag},
+                )
+                state.set(IDLE)
+                return tag
+            except openai.BadRequestError as e:
+                # Usually "can't add messages while a run is active"
+                state.set(UNKNOWN)
+                logging.warning(
+                    "Add to thread %s rejected (attempt %d): %s",
+                    thread_id,
+                    attempt + 1,
+                    e,
+                )
+                time.sleep(delay)
+    raise RuntimeError(f"Could not add {role} message to the thread")
 
 
 def is_active_run(thread_id):
+    status = thread_states.status(thread_id)
+    if status != UNKNOWN:
+        return status == RUNNING
+
     runs = client.beta.threads.runs.list(thread_id=thread_id)
-    return any(
-        run.status in ("in_progress", "queued", "requires_action") for run in runs.data
-    )
+    active = [run for run in runs.data if run.status in ACTIVE_RUN_STATUSES]
+    if active:
+        thread_states.mark_running(thread_id, active[0].id)
+    else:
+        thread_states.mark_idle(thread_id)
+    return bool(active)
+
+
+def supersede_active_run(wa_id) -> bool:
+    """
+    Cancel the run in flight on wa_id's thread because a newer message
+    arrived; the handler waiting on it raises RunSuperseded instead of
+    replying, and the next run sees the whole context. Uses only local state,
+    so it costs nothing unless this process has a run going for wa_id.
+    """
+    item = thread_cache.get(wa_id)
+    thread_id = item.get("thread_id") if item else None
+    if not thread_id:
+        return False
+    state = thread_states.get(thread_id)
+    run_id = state.run_id
+    if state.status != RUNNING or not run_id:
+        return False
+
+    thread_states.mark_superseded(thread_id, run_id)
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except openai.BadRequestError:
+        # Finished before we got there; let its reply go out
+        thread_states.unmark_superseded(thread_id, run_id)
+        return False
+    thread_states.counters["superseded"] += 1
+    logging.info("Cancelled superseded run %s on thread %s", run_id, thread_id)
+    return True
 
 
 def run_assistant_and_get_response(wa_id, name, user_message=None):
@@ -221,38 +409,43 @@ def run_assistant_and_get_response(wa_id, name, user_message=None):
         return None
 
     try:
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=OPENAI_ASSISTANT_ID,
+        result = execute_run(
+            client,
+            thread_id,
+            OPENAI_ASSISTANT_ID,
             instructions=(
                 f"You are talking to {name}, a job candidate. "
                 "Be warm and professional. Keep the conversation focused."
             ),
+            on_event=thread_states.track_run_events(thread_id),
         )
-        logging.info("Created run %s for thread %s", run.id, thread_id)
+        logging.info("Run %s for thread %s: %s", result.run_id, thread_id, result.status)
 
-        if not poll_until_complete(thread_id, run.id):
+        if not result.completed:
             logging.warning("Run did not complete successfully.")
             return None
 
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        for msg in reversed(messages.data):
-            if msg.role == "assistant":
-                response = msg.content[0].text.value
-                logging.info(f"Assistant response: {response}")
-                return response
+        response = result.text
+        if not response:
+            messages = client.beta.threads.messages.list(thread_id=thread_id)
+            response = latest_assistant_reply(messages.data)
+        if response:
+            logging.info(f"Assistant response: {response}")
+            return response
 
         logging.error("No assistant response found in thread: %s", thread_id)
         return None
 
     except Exception as e:
+        thread_states.mark_unknown(thread_id)
         logging.exception("OpenAI assistant failed for thread %s: %s", thread_id, e)
         return None
 
 
 def handle_candidate_reply(message, wa_id, name):
-    if "update" in message.lower().strip():
-        return "Sure! Please upload your updated resume and our team will review it shortly."
+    route = intent_router.route(message)
+    if route:
+        return route.reply(name)
     return generate_response(
         f"Candidate has replied with '{message}'. Process the reply and respond accordingly.",
         wa_id,
@@ -260,22 +453,107 @@ def handle_candidate_reply(message, wa_id, name):
     )
 
 
-def generate_response(message_body, wa_id, name, extra_instructions: str = ""):
-    thread_id = check_if_thread_exists(wa_id)
-    if not thread_id:
-        thread = client.beta.threads.create()
-        thread_id = thread.id
-        save_thread(wa_id, thread_id)
+def fast_reply(message_body: str, name: str) -> str:
+    """No time left for the model: a cached answer if there is one, else DEADLINE_REPLY."""
+    cached = answer_cache.lookup(message_body, name) if answer_cache else None
+    return cached or DEADLINE_REPLY
+
+
+def with_jd_context(message_body: str, extra_instructions: str = "") -> str:
+    """extra_instructions plus the JD passages that match the message."""
+    return "\n\n".join(p for p in (extra_instructions, jd_context(message_body)) if p)
+
+
+def _answer_fingerprint() -> str:
+    """Changes when the JD corpus or anything shaping the run instructions does."""
+    jd_index.ensure_fresh()
+    shape = "|".join(
+        (build_run_instructions("", ""), REPLY_BACKEND, REPLY_MODEL, OPENAI_ASSISTANT_ID or "")
+    )
+    return jd_index.version + ":" + hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+answer_cache = AnswerCache(_answer_fingerprint) if ANSWER_CACHE else None
+
+
+def record_cached_turn(wa_id, message_body, response):
+    """Keep stored history and the thread complete when a reply came from answer_cache."""
+    question = save_message(wa_id, str(uuid.uuid4()), message_body, "user")
+    answer = save_message(wa_id, str(uuid.uuid4()), response, "assistant")
+    if REPLY_BACKEND == "local":
+        convo = conversation_cache.get(wa_id)
+        if convo is not None:
+            with convo["lock"]:
+                convo["turns"].extend([_turn(question), _turn(answer)])
+        return
+
+    # Later runs must see this exchange like any other
+    try:
+        thread_id = ensure_thread(wa_id)
+        safe_add_message_to_thread(thread_id, message_body, wa_id)
+        safe_add_message_to_thread(thread_id, response, wa_id, role="assistant")
+    except Exception as e:
+        logging.warning("[AnswerCache] Could not add cached turn to thread for %s: %s", wa_id, e)
+
+
+def has_history(wa_id) -> bool:
+    """Whether wa_id has earlier turns that would shape the next answer."""
+    if REPLY_BACKEND == "local":
+        convo = _load_conversation(wa_id)
+        return bool(convo["turns"] or convo["summary"])
+    return bool(get_recent_messages(wa_id, limit=1))
+
+
+def generate_response(
+    message_body, wa_id, name, extra_instructions: str = "", on_event=None
+):
+    # Caller-specific instructions make the answer specific too: no caching
+    use_cache = answer_cache is not None and not extra_instructions
+    if use_cache:
+        cached = answer_cache.lookup(message_body, name)
+        if cached is not None:
+            record_cached_turn(wa_id, message_body, cached)
+            return cached
+
+    # Only a first-turn answer is free of this candidate's context and shareable
+    shareable = (
+        use_cache and is_cacheable_question(message_body) and not has_history(wa_id)
+    )
+    started = time.monotonic()
+    response = _generate_response(
+        message_body, wa_id, name, extra_instructions, on_event
+    )
+    if shareable and response != FALLBACK_REPLY:
+        answer_cache.store(message_body, name, response, time.monotonic() - started)
+    return response
+
+
+def _generate_response(
+    message_body, wa_id, name, extra_instructions: str = "", on_event=None
+):
+    # Before anything is stored: a candidate asked to resend must not leave
+    # the question behind unanswered in the history or thread
+    check_deadline("generate_response", MIN_REPLY_SECS)
+    extra_instructions = with_jd_context(message_body, extra_instructions)
+    if REPLY_BACKEND == "local":
+        return generate_local_response(
+            message_body, wa_id, name, extra_instructions, on_event
+        )
+
+    thread_id = ensure_thread(wa_id)
 
     # Persist and add to thread
     msg_id_user = str(uuid.uuid4())
     save_message(wa_id, msg_id_user, message_body, "user")
 
-    tag = safe_add_message_to_thread(thread_id, message_body, wa_id)  # <-- NEW
-
-    response = run_assistant(thread_id, name, extra_instructions=extra_instructions)
+    # Hold the thread for add + run so nothing else in this process interleaves
+    with thread_states.get(thread_id).lock:
+        safe_add_message_to_thread(thread_id, message_body, wa_id)
+        response = run_assistant(
+            thread_id, name, extra_instructions=extra_instructions, on_event=on_event
+        )
     if not response:
-        response = "Sorry, I couldn't process that right now. Please try again shortly."
+        response = FALLBACK_REPLY
 
     # Save assistant reply
     msg_id_assistant = str(uuid.uuid4())
@@ -283,14 +561,247 @@ def generate_response(message_body, wa_id, name, extra_instructions: str = ""):
     return response
 
 
+# ---------------------------------------------------------------------------
+# Local-context backend (REPLY_BACKEND=local)
+#
+# The threads backend needs thread lookup/create, message append, run and
+# often a message list per reply. Here the conversation is rebuilt from what
+# save_message already stores, trimmed to CONTEXT_TOKEN_BUDGET, and answered
+# with a single chat completion. Turns that no longer fit are summarized in
+# the background after the reply, so the hot path never pays for it.
+# ---------------------------------------------------------------------------
+
+# wa_id -> {"summary", "summarized_through", "turns", "synced_at", "lock"};
+# a turn is {"role", "content", "message_id", "timestamp"}. Also covers this
+# process's messages still in the write-behind buffer. Other workers answer
+# the same wa_id too, so each load merges in the newest stored messages; the
+# summary is saved to SUMMARIES_TABLE and reloaded on a miss.
+conversation_cache = TTLCache(
+    maxsize=int(os.getenv("CONVERSATION_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("CONVERSATION_CACHE_TTL", "1800")),
+)
+# A conversation synced this recently isn't queried again (has_history and
+# the reply itself load it back to back)
+CONVERSATION_SYNC_SECS = float(os.getenv("CONVERSATION_SYNC_SECS", "2"))
+_summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarize")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough count (~4 chars per token plus per-message overhead); no tokenizer needed."""
+    return len(text or "") // 4 + 4
+
+
+def _turn(item) -> dict:
+    return {
+        "role": "assistant" if item.get("message_type") == "assistant" else "user",
+        "content": item.get("message_body") or "",
+        "message_id": item.get("message_id"),
+        "timestamp": item.get("timestamp", ""),
+    }
+
+
+def _load_conversation(wa_id) -> dict:
+    convo = conversation_cache.get(wa_id)
+    if convo is None:
+        stored = get_conversation_summary(wa_id) or {}
+        convo = {
+            "summary": stored.get("summary", ""),
+            "summarized_through": stored.get("summarized_through", ""),
+            "turns": [],
+            "synced_at": None,
+            "lock": threading.Lock(),
+        }
+        conversation_cache.set(wa_id, convo)
+    elif time.monotonic() - convo["synced_at"] < CONVERSATION_SYNC_SECS:
+        return convo
+
+    items = get_recent_messages(wa_id, limit=CONTEXT_HISTORY_LIMIT)
+    with convo["lock"]:
+        _merge_turns(convo, items)
+        convo["synced_at"] = time.monotonic()
+    return convo
+
+
+def _merge_turns(convo, items):
+    """Add stored messages the cache hasn't seen (e.g. answered by another worker)."""
+    known = {turn["message_id"] for turn in convo["turns"]}
+    new = [
+        _turn(item)
+        for item in items
+        if item.get("message_type") in ("user", "assistant")
+        and item.get("message_id") not in known
+        # Already folded into the summary
+        and item.get("timestamp", "") > convo["summarized_through"]
+    ]
+    if new:
+        convo["turns"] = sorted(convo["turns"] + new, key=lambda turn: turn["timestamp"])
+
+
+def build_context_messages(system: str, summary: str, turns, budget: int) -> list:
+    """
+    System prompt, the running summary, then as many of the newest turns as
+    fit in budget tokens (the last turn, the new user message, always goes).
+    """
+    messages = [{"role": "system", "content": system}]
+    if summary:
+        messages.append(
+            {"role": "system", "content": "Earlier in this conversation: " + summary}
+        )
+    remaining = budget
+    kept = []
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn["content"])
+        if kept and cost > remaining:
+            break
+        kept.append(turn)
+        remaining -= cost
+    messages.extend(
+        {"role": turn["role"], "content": turn["content"]} for turn in reversed(kept)
+    )
+    return messages
+
+
+@background_priority()
+def _fold_overflow(wa_id, convo):
+    """Summarize the oldest turns until the rest fit in half the budget."""
+    with convo["lock"]:
+        # One fold per conversation at a time: a second one would compute its
+        # cut from the same turns and then drop turns nobody summarized
+        if convo.get("folding"):
+            return
+        turns = convo["turns"]
+        total = sum(estimate_tokens(t["content"]) for t in turns)
+        if total <= CONTEXT_TOKEN_BUDGET:
+            return
+        cut = 0
+        while cut < len(turns) - 1 and total > CONTEXT_TOKEN_BUDGET // 2:
+            total -= estimate_tokens(turns[cut]["content"])
+            cut += 1
+        old, summary = turns[:cut], convo["summary"]
+        convo["folding"] = True
+
+    try:
+        _summarize_turns(wa_id, convo, old, summary)
+    finally:
+        with convo["lock"]:
+            convo["folding"] = False
+
+
+def _summarize_turns(wa_id, convo, old, summary):
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in old)
+    try:
+        completion = client.chat.completions.create(
+            model=REPLY_MODEL,
+            max_tokens=300,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Update the running summary of a recruiting chat with a job "
+                        "candidate. Keep facts that matter later: roles discussed, "
+                        "skills, experience, location, availability, documents sent, "
+                        "promised next steps. Under 150 words."
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}",
+                },
+            ],
+        )
+        new_summary = (completion.choices[0].message.content or "").strip()
+    except Exception as e:
+        logging.warning("[local_context] Summary for %s failed: %s", wa_id, e)
+        return
+
+    folded = {turn["message_id"] for turn in old}
+    through = max(turn["timestamp"] for turn in old)
+    with convo["lock"]:
+        # By id: a merge may have inserted turns since the cut was taken
+        convo["turns"] = [t for t in convo["turns"] if t["message_id"] not in folded]
+        convo["summary"] = new_summary
+        convo["summarized_through"] = through
+    try:
+        save_conversation_summary(wa_id, new_summary, through)
+    except Exception as e:
+        # Still used by this process; another one reloads the older summary
+        logging.warning("[local_context] Could not save summary for %s: %s", wa_id, e)
+
+
+def _complete_chat(messages, on_event=None) -> str:
+    """One chat completion; streamed (as RunEvents) when someone is listening."""
+    if not on_event:
+        completion = client.chat.completions.create(
+            model=REPLY_MODEL, messages=messages, max_tokens=REPLY_MAX_TOKENS
+        )
+        return (completion.choices[0].message.content or "").strip()
+
+    chunks = []
+    try:
+        stream = client.chat.completions.create(
+            model=REPLY_MODEL,
+            messages=messages,
+            max_tokens=REPLY_MAX_TOKENS,
+            stream=True,
+        )
+        for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                chunks.append(text)
+                on_event(RunEvent("delta", text=text))
+    except Exception as e:
+        on_event(RunEvent("failed", status="failed", error=e))
+        raise
+    reply = "".join(chunks).strip()
+    on_event(RunEvent("completed", status="completed", text=reply))
+    return reply
+
+
+def generate_local_response(
+    message_body, wa_id, name, extra_instructions: str = "", on_event=None
+):
+    """generate_response for REPLY_BACKEND=local: no Assistants thread involved."""
+    # Load before saving: a cold load would already include the new turn
+    convo = _load_conversation(wa_id)
+    question = save_message(wa_id, str(uuid.uuid4()), message_body, "user")
+
+    with convo["lock"]:
+        convo["turns"].append(_turn(question))
+        messages = build_context_messages(
+            build_run_instructions(name, extra_instructions),
+            convo["summary"],
+            list(convo["turns"]),
+            CONTEXT_TOKEN_BUDGET,
+        )
+
+    try:
+        response = _complete_chat(messages, on_event)
+    except Exception as e:
+        logging.exception("[local_context] Completion failed for %s: %s", wa_id, e)
+        response = None
+    if not response:
+        response = FALLBACK_REPLY
+
+    answer = save_message(wa_id, str(uuid.uuid4()), response, "assistant")
+    with convo["lock"]:
+        convo["turns"].append(_turn(answer))
+    _summarizer.submit(_fold_overflow, wa_id, convo)
+    return response
+
+
+@background_priority()
 def analyze_uploaded_document_with_gpt(
-    wa_id: str, name: str, file_bytes: bytes, filename: str, content_type: str
+    wa_id: str, name: str, file_bytes, filename: str, content_type: str
 ) -> dict:
+    # file_bytes may be raw bytes or a binary file object (streamed downloads)
+    openai_file = temp_thread = None
     try:
         file_obj = (filename, file_bytes, content_type)
         openai_file = client.files.create(file=file_obj, purpose="assistants")
+        resource_reaper.track(FILE, openai_file.id)
 
-        temp_thread = client.beta.threads.create()
+        temp_thread = client.beta.threads.create(metadata={"kind": "resume_check"})
+        resource_reaper.track(THREAD, temp_thread.id)
         client.beta.threads.messages.create(
             thread_id=temp_thread.id,
             role="user",
@@ -304,40 +815,68 @@ def analyze_uploaded_document_with_gpt(
             metadata={"kind": "resume_check"},
         )
 
-        run = client.beta.threads.runs.create(
-            thread_id=temp_thread.id,
-            assistant_id=OPENAI_ASSISTANT_ID,
+        result = execute_run(
+            client,
+            temp_thread.id,
+            OPENAI_ASSISTANT_ID,
             instructions=(
                 'Return strictly JSON with keys "is_resume" (boolean) and "reason" (string).'
             ),
             metadata={"kind": "resume_check"},
+            timeout_secs=bounded_timeout(10),
         )
+        if not result.completed:
+            logging.error(
+                "Resume check run failed: %s %s", result.status, result.last_error
+            )
+            return None
 
-        # poll
-        import time, logging, json as _json
+        raw = result.text
+        if not raw:
+            msgs = client.beta.threads.messages.list(thread_id=temp_thread.id, limit=10)
+            raw = latest_assistant_reply(msgs.data)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+    except Exception:
+        logging.exception("Error analyzing document with GPT:")
+        return None
+    finally:
+        # Both are single-use; nothing reads them after the verdict
+        if temp_thread is not None:
+            resource_reaper.release(THREAD, temp_thread.id)
+        if openai_file is not None:
+            resource_reaper.release(FILE, openai_file.id)
 
-        for _ in range(40):
-            s = client.beta.threads.runs.retrieve(
-                thread_id=temp_thread.id, run_id=run.id
-            )
-            if s.status == "completed":
-                break
-            if s.status in ("failed", "cancelled", "expired"):
-                logging.error("Resume check run failed: %s", s.last_error)
-                return None
-            time.sleep(0.25)
-
-        msgs = client.beta.threads.messages.list(thread_id=temp_thread.id, limit=10)
-        for m in msgs.data:
-            if m.role == "assistant":
-                raw = m.content[0].text.value
-                try:
-                    return _json.loads(raw)
-                except _json.JSONDecodeError:
-                    return None
+
+@background_priority()
+def analyze_document_text_with_gpt(wa_id: str, name: str, text: str, filename: str) -> dict:
+    """
+    Resume check on text we already extracted locally: one chat completion,
+    no file upload or temp thread. Same {"is_resume", "reason"} result.
+    """
+    try:
+        completion = client.chat.completions.create(
+            model=REPLY_MODEL,
+            max_tokens=150,
+            response_format={"type": "json_object"},
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Decide whether the document text is a resume/CV. "
+                        'Return strictly JSON with keys "is_resume" (boolean) and "reason" (string).'
+                    ),
+                },
+                {"role": "user", "content": f"Filename: {filename}\n\n{text[:12000]}"},
+            ],
+        )
+        return json.loads(completion.choices[0].message.content or "")
+    except json.JSONDecodeError:
         return None
     except Exception:
-        import logging
-
-        logging.exception("Error analyzing document with GPT:")
+        logging.exception("Error analyzing document text with GPT:")
         return None
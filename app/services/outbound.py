@@ -0,0 +1,185 @@
+# --- app/services/outbound.py ---
+# Outbound WhatsApp dispatch: queues sends, applies the Cloud API throughput
+# limits (per business number and per recipient pair) with token buckets, and
+# retries rate-limit / transient failures with backoff. Sends to the same
+# recipient go out in submission order.
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from app.utils.keyed_executor import KeyedExecutor
+from app.utils.token_bucket import TokenBucket
+
+# Business-number throughput (messages/second) and per-recipient pair limit
+WHATSAPP_NUMBER_MPS = float(os.getenv("WHATSAPP_NUMBER_MPS", "80"))
+WHATSAPP_RECIPIENT_RATE = float(os.getenv("WHATSAPP_RECIPIENT_RATE", str(1 / 6)))
+WHATSAPP_RECIPIENT_BURST = float(os.getenv("WHATSAPP_RECIPIENT_BURST", "10"))
+
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "16"))
+OUTBOUND_MAX_QUEUE = int(os.getenv("OUTBOUND_MAX_QUEUE", "10000"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+
+# Graph error codes that mean "slow down" or "try again"
+# 4: app request limit, 80007: WABA rate limit, 130429: throughput reached,
+# 131056: pair rate limit, 131048: spam rate limit, 1/2/131000: transient
+RETRYABLE_ERROR_CODES = {1, 2, 4, 80007, 130429, 131000, 131048, 131056}
+
+
+def _graph_error_code(response) -> Optional[int]:
+    try:
+        return int(response.json().get("error", {}).get("code"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def is_retryable(response) -> bool:
+    if response.status_code == 429 or response.status_code >= 500:
+        return True
+    if response.status_code >= 400:
+        return _graph_error_code(response) in RETRYABLE_ERROR_CODES
+    return False
+
+
+def _retry_after(response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class OutboundDispatcher:
+    def __init__(
+        self,
+        sender,
+        number_mps: float = WHATSAPP_NUMBER_MPS,
+        recipient_rate: float = WHATSAPP_RECIPIENT_RATE,
+        recipient_burst: float = WHATSAPP_RECIPIENT_BURST,
+        concurrency: int = OUTBOUND_CONCURRENCY,
+        max_queue: int = OUTBOUND_MAX_QUEUE,
+        max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+    ):
+        self.sender = sender  # callable(payload) -> httpx.Response
+        self.number_mps = number_mps
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.max_attempts = max_attempts
+        self._executor = KeyedExecutor(max_workers=concurrency, max_in_flight=max_queue)
+        self._number_buckets = {}
+        self._recipient_buckets = {}
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _bucket(self, buckets: dict, key, rate: float, capacity: float) -> TokenBucket:
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TokenBucket(rate, capacity)
+            return bucket
+
+    def submit(self, payload: dict, phone_number_id: str = None):
+        """Queue a send; returns a Future resolving to the final response."""
+        recipient = payload.get("to")
+        enqueued_at = time.monotonic()
+        self._executor.wait_for_capacity()  # backpressure once the queue is full
+        return self._executor.submit(
+            recipient, self._deliver, payload, phone_number_id, enqueued_at
+        )
+
+    def send(self, payload: dict, phone_number_id: str = None, timeout: float = None):
+        """Queue a send and block until it is delivered (or finally fails)."""
+        return self.submit(payload, phone_number_id).result(timeout=timeout)
+
+    def _deliver(self, payload, phone_number_id, enqueued_at):
+        recipient = payload.get("to")
+        number_bucket = self._bucket(
+            self._number_buckets, phone_number_id, self.number_mps, self.number_mps
+        )
+        recipient_bucket = self._bucket(
+            self._recipient_buckets,
+            recipient,
+            self.recipient_rate,
+            self.recipient_burst,
+        )
+
+        response = None
+        for attempt in range(1, self.max_attempts + 1):
+            recipient_bucket.acquire()
+            number_bucket.acquire()
+            try:
+                response = self.sender(payload)
+            except httpx.TransportError as e:
+                if attempt == self.max_attempts:
+                    self._record(enqueued_at, ok=False)
+                    raise
+                logging.warning(
+                    "[Outbound] Transport error to %s (attempt %d): %s",
+                    recipient,
+                    attempt,
+                    e,
+                )
+                self._backoff(attempt)
+                continue
+
+            if not is_retryable(response) or attempt == self.max_attempts:
+                break
+
+            delay = _retry_after(response)
+            if response.status_code == 429 or _graph_error_code(response) in (
+                4,
+                80007,
+                130429,
+            ):
+                # Number-wide throttle: hold every send from this number
+                number_bucket.pause(delay or 1.0)
+            logging.warning(
+                "[Outbound] Retryable response %s for %s (attempt %d)",
+                response.status_code,
+                recipient,
+                attempt,
+            )
+            self._backoff(attempt, delay)
+
+        self._record(enqueued_at, ok=response is not None and response.status_code < 400)
+        return response
+
+    def _backoff(self, attempt: int, delay: float = None):
+        with self._lock:
+            self.retries += 1
+        if delay is None:
+            delay = min(30.0, 0.5 * 2 ** (attempt - 1))
+        time.sleep(delay + random.uniform(0, delay / 2))
+
+    def _record(self, enqueued_at: float, ok: bool):
+        latency = time.monotonic() - enqueued_at
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._executor.in_flight
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.sent + self.failed
+            return {
+                "queue_depth": self.queue_depth,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "avg_latency": (self.total_latency / done) if done else 0.0,
+                "max_latency": self.max_latency,
+            }
@@ -0,0 +1,100 @@
+# --- app/services/reply_streaming.py ---
+import logging
+import os
+import re
+
+from app.services.whatsapp_service import (
+    send_message,
+    get_text_message_input,
+    process_text_for_whatsapp,
+)
+
+# Opt-in: send the reply sentence-by-sentence while the run is still streaming
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "0") == "1"
+STREAM_MIN_CHARS = int(os.getenv("STREAM_MIN_CHARS", "80"))
+
+# End of a sentence (optionally followed by a 【…】 citation) or a paragraph
+_BOUNDARY = re.compile(r"[.!?](?:【[^】]*】)?\s+|\n\s*\n")
+
+
+class WhatsAppSentenceStreamer:
+    """
+    Buffers assistant text deltas and sends complete sentences/paragraphs to
+    WhatsApp once at least min_chars have accumulated. Pass on_event to
+    generate_response / execute_run, then call finish(reply) after the run.
+    """
+
+    def __init__(self, wa_id: str, min_chars: int = STREAM_MIN_CHARS, send=None):
+        self.wa_id = wa_id
+        self.min_chars = min_chars
+        self._send = send or send_message
+        self._buffer = ""
+        self._streamed = ""  # every delta fed so far, sent or buffered
+        self.failed = False
+        self.sent_chunks = 0
+
+    @property
+    def sent_any(self) -> bool:
+        return self.sent_chunks > 0
+
+    def on_event(self, event):
+        if event.type == "delta":
+            self.feed(event.text)
+        elif event.type == "failed":
+            # Don't send the tail of a run that didn't complete
+            self.failed = True
+            self._buffer = ""
+
+    def feed(self, text: str):
+        if self.failed:
+            return
+        self._streamed += text
+        self._buffer += text
+        cut = self._flush_point()
+        if cut:
+            self._emit(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+
+    def finish(self, reply: str = None):
+        """
+        Send whatever is left once the run has completed. reply is the run's
+        full text: when the stream dropped partway and the run was polled to
+        completion, the part that never streamed is sent from it.
+        """
+        if self.failed:
+            return
+        rest = self._buffer
+        if reply:
+            streamed = self._streamed.lstrip()
+            if reply.startswith(streamed.rstrip()):
+                # Everything past what already went out, buffered tail included
+                rest = reply[max(0, len(streamed) - len(self._buffer)):]
+            else:
+                logging.warning(
+                    "[Streamer] Reply to %s doesn't continue the streamed text", self.wa_id
+                )
+        if rest.strip():
+            self._emit(rest)
+        self._buffer = ""
+
+    def _flush_point(self) -> int:
+        cut = 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            cut = match.end()
+        if cut < self.min_chars:
+            return 0
+        head = self._buffer[:cut]
+        # Never split a **bold** span or a 【citation】 across two messages
+        if head.count("**") % 2 or head.count("【") != head.count("】"):
+            return 0
+        return cut
+
+    def _emit(self, chunk: str):
+        text = process_text_for_whatsapp(chunk)
+        if not text:
+            return
+        try:
+            self._send(get_text_message_input(self.wa_id, text))
+            self.sent_chunks += 1
+        except Exception:
+            logging.exception("[Streamer] Failed to send chunk to %s", self.wa_id)
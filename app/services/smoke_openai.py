@@ -19,23 +19,26 @@ print(
     [t.type for t in (a.tools or [])],
 )
 
-# Create a scratch thread and run
+# Create a scratch thread and run; the thread is deleted afterwards
 th = client.beta.threads.create()
-client.beta.threads.messages.create(thread_id=th.id, role="user", content="ping")
+try:
+    client.beta.threads.messages.create(thread_id=th.id, role="user", content="ping")
 
-run = client.beta.threads.runs.create(
-    thread_id=th.id, assistant_id=a.id, instructions="Reply with 'pong' only."
-)
+    run = client.beta.threads.runs.create(
+        thread_id=th.id, assistant_id=a.id, instructions="Reply with 'pong' only."
+    )
 
-# Poll
-for _ in range(40):
-    r = client.beta.threads.runs.retrieve(thread_id=th.id, run_id=run.id)
-    if r.status == "completed":
-        break
-    if r.status in ("failed", "cancelled", "expired"):
-        print("Run failed:", r.last_error)
-        raise SystemExit(1)
-    time.sleep(0.25)
+    # Poll
+    for _ in range(40):
+        r = client.beta.threads.runs.retrieve(thread_id=th.id, run_id=run.id)
+        if r.status == "completed":
+            break
+        if r.status in ("failed", "cancelled", "expired"):
+            print("Run failed:", r.last_error)
+            raise SystemExit(1)
+        time.sleep(0.25)
 
-msgs = client.beta.threads.messages.list(thread_id=th.id, limit=5)
-print("LATEST:", msgs.data[0].role, msgs.data[0].content[0].text.value.strip())
+    msgs = client.beta.threads.messages.list(thread_id=th.id, limit=5)
+    print("LATEST:", msgs.data[0].role, msgs.data[0].content[0].text.value.strip())
+finally:
+    client.beta.threads.delete(th.id)
@@ -12,6 +12,9 @@ sqs_client = boto3.client("sqs", region_name=os.getenv("AWS_REGION", "us-east-2"
 # Target queue URL (set in .env or App Runner secrets)
 SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL")
 
+# SendMessageBatch accepts at most 10 entries per call
+SQS_BATCH_SIZE = 10
+
 
 def push_message_to_sqs(message_dict: dict):
     """
@@ -25,19 +28,7 @@ def push_message_to_sqs(message_dict: dict):
         raise ValueError("SQS_QUEUE_URL environment variable not set")
 
     try:
-        wa_id = message_dict.get("wa_id") or "unknown"
-        dedup_id = message_dict.get("message_id") or f"{wa_id}-{uuid.uuid4().hex}"
-
-        params = {
-            "QueueUrl": SQS_QUEUE_URL,
-            "MessageBody": json.dumps(message_dict),
-        }
-
-        # If using FIFO, add group & dedup to enforce per-user ordering + idempotency
-        if SQS_QUEUE_URL.endswith(".fifo"):
-            params["MessageGroupId"] = wa_id
-            params["MessageDeduplicationId"] = dedup_id
-
+        params = {"QueueUrl": SQS_QUEUE_URL, **_message_params(message_dict)}
         response = sqs_client.send_message(**params)
 
         logging.info("Message pushed to SQS: %s", response.get("MessageId"))
@@ -47,3 +38,61 @@ def push_message_to_sqs(message_dict: dict):
     except (BotoCoreError, ClientError) as e:
         logging.exception("Failed to push message to SQS")
         raise
+
+
+def _message_params(message_dict: dict) -> dict:
+    """Body plus FIFO group/dedup fields for one message."""
+    wa_id = message_dict.get("wa_id") or "unknown"
+    dedup_id = message_dict.get("message_id") or f"{wa_id}-{uuid.uuid4().hex}"
+
+    params = {"MessageBody": json.dumps(message_dict)}
+
+    # If using FIFO, add group & dedup to enforce per-user ordering + idempotency
+    if SQS_QUEUE_URL.endswith(".fifo"):
+        params["MessageGroupId"] = wa_id
+        params["MessageDeduplicationId"] = dedup_id
+    return params
+
+
+def push_messages_to_sqs(messages: list) -> int:
+    """
+    Push many WhatsApp message events with SendMessageBatch (chunks of 10).
+    Order within a chunk is preserved, so FIFO groups still see each user's
+    messages in webhook order. Returns the number of messages accepted.
+    Raises RuntimeError if any entry was rejected, so the webhook returns 5xx
+    and Meta redelivers (FIFO dedup IDs absorb the already-sent ones).
+    """
+    if not SQS_QUEUE_URL:
+        raise ValueError("SQS_QUEUE_URL environment variable not set")
+
+    sent = 0
+    failed = []
+    for start in range(0, len(messages), SQS_BATCH_SIZE):
+        chunk = messages[start : start + SQS_BATCH_SIZE]
+        entries = [
+            {"Id": str(i), **_message_params(message_dict)}
+            for i, message_dict in enumerate(chunk)
+        ]
+        try:
+            response = sqs_client.send_message_batch(
+                QueueUrl=SQS_QUEUE_URL, Entries=entries
+            )
+        except (BotoCoreError, ClientError):
+            logging.exception("Failed to push message batch to SQS")
+            raise
+
+        sent += len(response.get("Successful", []))
+        for failure in response.get("Failed", []):
+            message_dict = chunk[int(failure["Id"])]
+            logging.error(
+                "SQS rejected message %s: %s %s",
+                message_dict.get("message_id"),
+                failure.get("Code"),
+                failure.get("Message"),
+            )
+            failed.append(message_dict)
+
+    logging.info("Pushed %d/%d messages to SQS in batches", sent, len(messages))
+    if failed:
+        raise RuntimeError(f"{len(failed)} message(s) were rejected by SQS")
+    return sent
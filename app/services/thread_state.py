@@ -0,0 +1,107 @@
+# --- app/services/thread_state.py ---
+# Local view of each OpenAI thread's run state, so the hot path can append
+# messages and decide whether a run is active without listing runs/messages.
+# The view is per process; anything we haven't observed ourselves (first
+# sight, restart, stale entry, unexpected error) is UNKNOWN and callers fall
+# back to one remote check.
+import os
+import threading
+import time
+from collections import Counter
+
+from app.services.assistant_runs import ACTIVE_RUN_STATUSES
+
+UNKNOWN = "unknown"
+IDLE = "idle"
+RUNNING = "running"
+
+# Trust local state only this long; other processes may touch the thread too
+THREAD_STATE_TTL = float(os.getenv("THREAD_STATE_TTL", "300"))
+THREAD_STATE_MAX = 10000
+
+
+class ThreadState:
+    def __init__(self):
+        self.lock = threading.RLock()  # held while a worker mutates the thread
+        self._status = UNKNOWN
+        self.run_id = None
+        self.updated_at = 0.0
+        self.superseded = set()  # run_ids we cancelled for a newer message
+
+    @property
+    def status(self) -> str:
+        if self._status != UNKNOWN and time.time() - self.updated_at > THREAD_STATE_TTL:
+            return UNKNOWN
+        return self._status
+
+    def set(self, status: str, run_id: str = None):
+        self._status = status
+        self.run_id = run_id
+        self.updated_at = time.time()
+
+
+class ThreadStateRegistry:
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+        self.counters = Counter()  # run outcomes: completed, cancelled, superseded...
+
+    def get(self, thread_id: str) -> ThreadState:
+        with self._lock:
+            state = self._states.get(thread_id)
+            if state is None:
+                if len(self._states) >= THREAD_STATE_MAX:
+                    self._prune()
+                state = self._states[thread_id] = ThreadState()
+            return state
+
+    def _prune(self):
+        # Expired entries read as UNKNOWN anyway, so forgetting them is free
+        for key in [k for k, v in self._states.items() if v.status == UNKNOWN]:
+            del self._states[key]
+
+    def status(self, thread_id: str) -> str:
+        return self.get(thread_id).status
+
+    def mark_idle(self, thread_id: str):
+        self.get(thread_id).set(IDLE)
+
+    def mark_running(self, thread_id: str, run_id: str):
+        self.get(thread_id).set(RUNNING, run_id)
+
+    def mark_unknown(self, thread_id: str):
+        self.get(thread_id).set(UNKNOWN)
+
+    def mark_superseded(self, thread_id: str, run_id: str):
+        self.get(thread_id).superseded.add(run_id)
+
+    def unmark_superseded(self, thread_id: str, run_id: str):
+        self.get(thread_id).superseded.discard(run_id)
+
+    def was_superseded(self, thread_id: str, run_id: str) -> bool:
+        state = self.get(thread_id)
+        if run_id in state.superseded:
+            state.superseded.discard(run_id)
+            return True
+        return False
+
+    def track_run_events(self, thread_id: str, on_event=None):
+        """Wrap a RunEvent callback so run start/finish update local state."""
+
+        def handle(event):
+            if event.type == "created":
+                self.mark_running(thread_id, event.run_id)
+            elif event.type in ("completed", "failed"):
+                self.counters[event.status or event.type] += 1
+                if event.status in ACTIVE_RUN_STATUSES:
+                    # Timed out while still running remotely: we no longer know
+                    self.mark_unknown(thread_id)
+                else:
+                    self.mark_idle(thread_id)
+            if on_event:
+                on_event(event)
+
+        return handle
+
+
+thread_states = ThreadStateRegistry()
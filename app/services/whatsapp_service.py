@@ -1,23 +1,66 @@
 # --- app/services/whatsapp_service.py ---
+import asyncio
 import os
 import logging
 import re
-import requests
+import hashlib
+import queue
+import tempfile
+import uuid
 import boto3
+import botocore.exceptions
 import httpx
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 
-WHATSAPP_API_URL = (
-    f"https://graph.facebook.com/v18.0/{os.getenv('PHONE_NUMBER_ID')}/messages"
+from app.services.outbound import OutboundDispatcher
+from app.services.graph_client import (
+    get_async_graph_client,
+    get_graph_client,
+    graph_url,
 )
+from app.utils.deadline import bounded_timeout
+
+WHATSAPP_API_URL = graph_url(f"v18.0/{os.getenv('PHONE_NUMBER_ID')}/messages")
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 VERSION = os.getenv("VERSION", "v18.0")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 RESUME_BUCKET = os.getenv("RESUME_BUCKET")
 
+# Route sends through the rate-limited, retrying outbound dispatcher
+OUTBOUND_DISPATCH = os.getenv("OUTBOUND_DISPATCH", "1") == "1"
+
+# Media is moved in fixed-size chunks so memory per document stays constant.
+# S3 multipart parts must be >= 5 MiB (except the last one).
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Spooled downloads stay in memory up to this size, then move to a temp file
+MEDIA_SPOOL_MAX_MEMORY = 1024 * 1024
+
+# Documents are uploaded here while they are being classified, then promoted
+# to their final key or deleted. Objects a crashed worker leaves behind are
+# expired by an S3 lifecycle rule on this prefix (see README, "Resume storage").
+STAGING_PREFIX = os.getenv("S3_STAGING_PREFIX", "staging/")
+_stage_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DOC_STAGE_WORKERS", "8")),
+    thread_name_prefix="s3-stage",
+)
+
+
+@dataclass
+class MediaInfo:
+    filename: str
+    content_type: str
+    sha256: str
+    size: int
+    s3_key: Optional[str] = None
+    s3_url: Optional[str] = None
 
-def log_http_response(response: requests.Response) -> None:
+
+def log_http_response(response) -> None:
     logging.info("Status: %s", response.status_code)
     logging.info("Content-type: %s", response.headers.get("content-type"))
     logging.info("Body: %s", response.text)
@@ -32,16 +75,65 @@ def get_text_message_input(recipient: str, text: str) -> dict:
     }
 
 
-def send_message(payload: dict) -> requests.Response:
+def get_template_message_input(
+    recipient: str, template_name: str, language: str = "en_US", body_params=None
+) -> dict:
+    template = {"name": template_name, "language": {"code": language}}
+    if body_params:
+        template["components"] = [
+            {
+                "type": "body",
+                "parameters": [{"type": "text", "text": str(p)} for p in body_params],
+            }
+        ]
+    return {
+        "messaging_product": "whatsapp",
+        "to": recipient,
+        "type": "template",
+        "template": template,
+    }
+
+
+def _post_message(payload: dict) -> httpx.Response:
     if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
         raise RuntimeError("WhatsApp ACCESS_TOKEN or PHONE_NUMBER_ID is not set")
 
-    url = f"https://graph.facebook.com/{VERSION}/{PHONE_NUMBER_ID}/messages"
+    url = graph_url(f"{VERSION}/{PHONE_NUMBER_ID}/messages")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {ACCESS_TOKEN}",
     }
-    response = requests.post(url, json=payload, headers=headers, timeout=10)
+    response = get_graph_client().post(url, json=payload, headers=headers)
+    log_http_response(response)
+    return response
+
+
+outbound = OutboundDispatcher(sender=_post_message)
+
+
+def send_message(payload: dict) -> httpx.Response:
+    if not OUTBOUND_DISPATCH:
+        return _post_message(payload)
+    return outbound.send(payload, phone_number_id=PHONE_NUMBER_ID)
+
+
+async def send_message_async(payload: dict) -> httpx.Response:
+    if OUTBOUND_DISPATCH:
+        # Share limits and per-recipient ordering with the threaded path.
+        # submit() blocks while the queue is full; keep that off the loop.
+        future = await asyncio.to_thread(
+            outbound.submit, payload, phone_number_id=PHONE_NUMBER_ID
+        )
+        return await asyncio.wrap_future(future)
+    if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
+        raise RuntimeError("WhatsApp ACCESS_TOKEN or PHONE_NUMBER_ID is not set")
+
+    url = graph_url(f"{VERSION}/{PHONE_NUMBER_ID}/messages")
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {ACCESS_TOKEN}",
+    }
+    response = await get_async_graph_client().post(url, json=payload, headers=headers)
     log_http_response(response)
     return response
 
@@ -53,15 +145,26 @@ def _get_s3_client():
     )
 
 
-def download_whatsapp_media(media_id: str, filename: str = None):
-    meta_url = f"https://graph.facebook.com/{VERSION}/{media_id}"
+def media_metadata(media_id: str) -> dict:
+    """Graph's record for a media_id: url, mime_type, sha256, file_size."""
     headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-
-    meta_res = requests.get(meta_url, headers=headers, timeout=5)
+    meta_res = get_graph_client().get(
+        graph_url(f"{VERSION}/{media_id}"), headers=headers, timeout=bounded_timeout(5)
+    )
     meta_res.raise_for_status()
-    media_url = meta_res.json().get("url")
+    return meta_res.json()
+
+
+def _media_url(media_id: str) -> str:
+    return media_metadata(media_id).get("url")
 
-    media_res = requests.get(media_url, headers=headers, timeout=10)
+
+def download_whatsapp_media(media_id: str, filename: str = None):
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+    # Media URLs may redirect to a CDN; httpx doesn't follow by default
+    media_res = get_graph_client().get(
+        _media_url(media_id), headers=headers, follow_redirects=True
+    )
     media_res.raise_for_status()
 
     content_type = media_res.headers.get("Content-Type")
@@ -79,8 +182,7 @@ def save_file_to_s3(file_bytes: bytes, filename: str, content_type: str) -> str:
         raise RuntimeError("RESUME_BUCKET is not set in environment")
 
     client = _get_s3_client()
-    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    key = f"raw/{timestamp}_{_safe_name(filename)}"
+    key = _s3_key(filename)
     client.put_object(
         Bucket=RESUME_BUCKET,
         Key=key,
@@ -91,6 +193,264 @@ def save_file_to_s3(file_bytes: bytes, filename: str, content_type: str) -> str:
     return f"https://{RESUME_BUCKET}.s3.amazonaws.com/{key}"
 
 
+@contextmanager
+def _open_media_stream(media_id: str, url: str = None):
+    """Resolve a media_id (unless its url is known) and open the download as a streamed response."""
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+    with get_graph_client().stream(
+        "GET", url or _media_url(media_id), headers=headers, follow_redirects=True
+    ) as media_res:
+        media_res.raise_for_status()
+        yield media_res
+
+
+def _fixed_size_chunks(pieces, chunk_size: int = MEDIA_CHUNK_SIZE):
+    """Regroup arbitrary-sized byte pieces into chunk_size chunks (last may be short)."""
+    buf = bytearray()
+    for piece in pieces:
+        buf += piece
+        while len(buf) >= chunk_size:
+            yield bytes(buf[:chunk_size])
+            del buf[:chunk_size]
+    if buf:
+        yield bytes(buf)
+
+
+def _media_filename(media_id: str, filename: str, content_type: str) -> str:
+    if filename:
+        return filename
+    ext = (content_type or "application/octet-stream").split("/")[-1]
+    return f"{media_id}.{ext}"
+
+
+def _s3_key(filename: str, prefix: str = "raw/") -> str:
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    return f"{prefix}{timestamp}_{_safe_name(filename)}"
+
+
+def _multipart_upload(chunks, key: str, content_type: str, on_chunk=None) -> str:
+    """Upload an iterable of chunks to RESUME_BUCKET/key as an S3 multipart upload."""
+    if not RESUME_BUCKET:
+        raise RuntimeError("RESUME_BUCKET is not set in environment")
+
+    client = _get_s3_client()
+    upload = client.create_multipart_upload(
+        Bucket=RESUME_BUCKET, Key=key, ContentType=content_type
+    )
+    upload_id = upload["UploadId"]
+    parts = []
+    try:
+        for number, chunk in enumerate(chunks, start=1):
+            if on_chunk:
+                on_chunk(chunk)
+            part = client.upload_part(
+                Bucket=RESUME_BUCKET,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=chunk,
+            )
+            parts.append({"ETag": part["ETag"], "PartNumber": number})
+        if not parts:
+            # S3 needs at least one part, even for an empty file
+            part = client.upload_part(
+                Bucket=RESUME_BUCKET, Key=key, UploadId=upload_id, PartNumber=1, Body=b""
+            )
+            parts.append({"ETag": part["ETag"], "PartNumber": 1})
+        client.complete_multipart_upload(
+            Bucket=RESUME_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except Exception:
+        client.abort_multipart_upload(Bucket=RESUME_BUCKET, Key=key, UploadId=upload_id)
+        raise
+
+    logging.info("Uploaded to S3 key: %s/%s (%d parts)", RESUME_BUCKET, key, len(parts))
+    return s3_url(key)
+
+
+def stream_whatsapp_media_to_s3(media_id: str, filename: str = None) -> MediaInfo:
+    """
+    Pipe a WhatsApp media download straight into an S3 multipart upload,
+    hashing it on the way. Never holds more than one chunk in memory.
+    """
+    with _open_media_stream(media_id) as media_res:
+        content_type = media_res.headers.get("Content-Type")
+        filename = _media_filename(media_id, filename, content_type)
+        key = _s3_key(filename)
+        digest = hashlib.sha256()
+        size = 0
+
+        def track(chunk):
+            nonlocal size
+            digest.update(chunk)
+            size += len(chunk)
+
+        s3_url = _multipart_upload(
+            _fixed_size_chunks(media_res.iter_bytes(chunk_size=64 * 1024)),
+            key,
+            content_type,
+            on_chunk=track,
+        )
+    return MediaInfo(filename, content_type, digest.hexdigest(), size, key, s3_url)
+
+
+def download_and_stage_media(
+    media_id: str, filename: str = None, stage: bool = True, url: str = None
+):
+    """
+    Stream a WhatsApp media download into a spooled temp file (in memory up to
+    1 MiB, on disk beyond that), also streaming the bytes to a staging S3 key
+    as they arrive unless stage is False. Returns (fileobj, MediaInfo,
+    StagedUpload or None); the caller closes fileobj and must promote() or
+    discard() the staged object. The file is rewound and ready to read.
+    """
+    fileobj = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MAX_MEMORY)
+    staged = None
+    try:
+        with _open_media_stream(media_id, url) as media_res:
+            content_type = media_res.headers.get("Content-Type")
+            filename = _media_filename(media_id, filename, content_type)
+            if stage:
+                staged = StagedUpload(filename, content_type)
+            digest = hashlib.sha256()
+            for piece in media_res.iter_bytes(chunk_size=64 * 1024):
+                digest.update(piece)
+                fileobj.write(piece)
+                if staged:
+                    staged.feed(piece)
+        if staged:
+            staged.close()
+        size = fileobj.tell()
+        fileobj.seek(0)
+    except Exception:
+        if staged:
+            staged.abort()
+        fileobj.close()
+        raise
+
+    return fileobj, MediaInfo(filename, content_type, digest.hexdigest(), size), staged
+
+
+_STAGE_DONE = object()
+
+
+class StagedUpload:
+    """
+    Multipart upload to STAGING_PREFIX fed piece by piece by another thread
+    (the media download), so S3 persistence overlaps download and
+    classification. Once the verdict is in, promote() moves the object to its
+    final key or discard() deletes it in the background.
+    """
+
+    def __init__(self, filename: str, content_type: str):
+        self.key = f"{STAGING_PREFIX}{uuid.uuid4().hex}_{_safe_name(filename)}"
+        self.content_type = content_type
+        # Bounded so a slow S3 holds back the download instead of filling memory
+        self._queue = queue.Queue(maxsize=max(4, 2 * MEDIA_CHUNK_SIZE // (64 * 1024)))
+        self._aborted = False
+        self._finished = False  # _STAGE_DONE has been taken off the queue
+        self.error = None
+        self._future = _stage_pool.submit(self._run)
+
+    def _pieces(self):
+        while True:
+            piece = self._queue.get()
+            if piece is _STAGE_DONE:
+                self._finished = True
+                if self._aborted:
+                    raise RuntimeError("staged upload aborted")
+                return
+            yield piece
+
+    def _run(self):
+        try:
+            return _multipart_upload(
+                _fixed_size_chunks(self._pieces()), self.key, self.content_type
+            )
+        except Exception as e:
+            self.error = e
+            logging.warning("Staging upload %s failed: %s", self.key, e)
+            # Keep draining so feed() never blocks on a full queue
+            while not self._finished:
+                self._finished = self._queue.get() is _STAGE_DONE
+            raise
+
+    def feed(self, piece: bytes):
+        if self.error is None:
+            self._queue.put(piece)
+
+    def close(self):
+        self._queue.put(_STAGE_DONE)
+
+    def abort(self):
+        self._aborted = True
+        self._queue.put(_STAGE_DONE)
+
+    def wait(self) -> str:
+        """Block until the staging upload is done; raises if it failed."""
+        return self._future.result()
+
+    def promote(self, final_key: str) -> str:
+        """Move the staged object to final_key (kept as is if that already exists)."""
+        self.wait()
+        client = _get_s3_client()
+        if not s3_object_exists(final_key):
+            client.copy_object(
+                Bucket=RESUME_BUCKET,
+                Key=final_key,
+                CopySource={"Bucket": RESUME_BUCKET, "Key": self.key},
+                ContentType=self.content_type or "application/octet-stream",
+                MetadataDirective="REPLACE",
+            )
+        client.delete_object(Bucket=RESUME_BUCKET, Key=self.key)
+        return s3_url(final_key)
+
+    def discard(self):
+        _stage_pool.submit(self._discard)
+
+    def _discard(self):
+        try:
+            self.wait()
+        except Exception:
+            return  # nothing was stored (the failed multipart was aborted)
+        try:
+            _get_s3_client().delete_object(Bucket=RESUME_BUCKET, Key=self.key)
+        except Exception as e:
+            logging.warning("Could not delete staged object %s: %s", self.key, e)
+
+
+def save_fileobj_to_s3(
+    fileobj, filename: str, content_type: str, key: str = None
+) -> str:
+    """Multipart-upload a file object to S3 chunk by chunk."""
+    fileobj.seek(0)
+    chunks = iter(lambda: fileobj.read(MEDIA_CHUNK_SIZE), b"")
+    return _multipart_upload(chunks, key or _s3_key(filename), content_type)
+
+
+def content_s3_key(sha256: str, filename: str, prefix: str = "raw/") -> str:
+    """Key derived from the bytes, so a resent document maps to the same object."""
+    ext = os.path.splitext(_safe_name(filename or ""))[1].lower()
+    return f"{prefix}sha256/{sha256}{ext}"
+
+
+def s3_url(key: str) -> str:
+    return f"https://{RESUME_BUCKET}.s3.amazonaws.com/{key}"
+
+
+def s3_object_exists(key: str) -> bool:
+    try:
+        _get_s3_client().head_object(Bucket=RESUME_BUCKET, Key=key)
+        return True
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
 _SAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]")
 
 
@@ -0,0 +1,100 @@
+# --- app/services/write_behind.py ---
+import atexit
+import logging
+import threading
+import time
+
+
+class WriteBehindBuffer:
+    """
+    Collects records in memory and hands them to sink(items) in batches, either
+    when flush_size records are pending or every flush_interval seconds.
+    sink returns the items it could not write; those are counted as failed.
+    Flushes on close() and at interpreter exit; atexit doesn't run on SIGTERM,
+    so the process's signal handler must call close().
+    """
+
+    def __init__(self, sink, name="write-behind", flush_size=25, flush_interval=1.0):
+        self.name = name
+        self.sink = sink
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = []  # (enqueued_at, item)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.flushed = 0
+        self.failed = 0
+        self.last_flush_lag = 0.0  # age of the oldest record at its flush
+        atexit.register(self.close)
+
+    def put(self, item: dict):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} buffer is closed")
+            self._pending.append((time.monotonic(), item))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.flush_size,
+                    timeout=self.flush_interval,
+                )
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write everything pending now, in flush_size batches."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            for start in range(0, len(batch), self.flush_size):
+                chunk = batch[start : start + self.flush_size]
+                items = [item for _, item in chunk]
+                try:
+                    unprocessed = self.sink(items) or []
+                except Exception:
+                    logging.exception("[%s] Flush of %d items failed", self.name, len(items))
+                    unprocessed = items
+                self.flushed += len(items) - len(unprocessed)
+                self.failed += len(unprocessed)
+                self.last_flush_lag = time.monotonic() - chunk[0][0]
+                if unprocessed:
+                    logging.error(
+                        "[%s] %d items could not be written", self.name, len(unprocessed)
+                    )
+            if batch:
+                logging.debug(
+                    "[%s] Flushed %d items (lag %.3fs)",
+                    self.name,
+                    len(batch),
+                    self.last_flush_lag,
+                )
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "last_flush_lag": self.last_flush_lag,
+        }
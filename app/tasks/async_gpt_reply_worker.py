@@ -0,0 +1,97 @@
+# --- app/tasks/async_gpt_reply_worker.py ---
+import asyncio
+import logging
+
+from app.services.assistant_runs import RunSuperseded
+from app.services.whatsapp_service import (
+    send_message_async,
+    get_text_message_input,
+    process_text_for_whatsapp,
+)
+from app.services.intent_router import intent_router
+from app.services.openai_async import ensure_thread_async, generate_response_async
+from app.services.openai_service import MIN_REPLY_SECS, REPLY_BACKEND, fast_reply
+from app.tasks.gpt_reply_worker import handle_gpt_reply
+from app.utils.deadline import DeadlineExceeded, deadline_expired, deadline_scope
+
+
+async def handle_gpt_reply_async(payload):
+    """
+    Async handle_gpt_reply for the text flow. Documents are rare and mostly
+    bounded by S3/file uploads, so they reuse the sync handler in a thread.
+    """
+    with deadline_scope(payload.get("deadline_at")):
+        await _handle_gpt_reply_async(payload)
+
+
+async def _handle_gpt_reply_async(payload):
+    wa_id = payload["wa_id"]
+    name = payload.get("name", "Candidate")
+    message_type = payload.get("message_type", "text")
+    message_body = (payload.get("message_body") or "").strip()
+
+    if message_type == "document":
+        await asyncio.to_thread(handle_gpt_reply, payload)
+        return
+
+    logging.info(
+        "[GPT Async] Handling message from %s (type=%s): %s",
+        wa_id,
+        message_type,
+        message_body[:200],
+    )
+
+    try:
+        if message_type != "text" or not message_body:
+            logging.warning(
+                "[GPT Async] Skipping unsupported or empty message from %s", wa_id
+            )
+            return
+
+        if REPLY_BACKEND == "threads":
+            await ensure_thread_async(wa_id)
+
+        # Canned answers (upload questions, greetings, ...) skip the assistant
+        route = intent_router.route(message_body)
+        if route:
+            await send_message_async(get_text_message_input(wa_id, route.reply(name)))
+            return
+
+        if deadline_expired(MIN_REPLY_SECS):
+            logging.warning("[GPT Async] Deadline nearly spent for %s; fast reply", wa_id)
+            await send_message_async(
+                get_text_message_input(wa_id, fast_reply(message_body, name))
+            )
+            return
+
+        try:
+            reply = await generate_response_async(message_body, wa_id, name)
+        except RunSuperseded:
+            logging.info("[GPT Async] Reply for %s superseded by a newer message", wa_id)
+            return
+        except DeadlineExceeded:
+            logging.warning("[GPT Async] Deadline hit while replying to %s", wa_id)
+            await send_message_async(
+                get_text_message_input(wa_id, fast_reply(message_body, name))
+            )
+            return
+        except Exception as gpt_error:
+            logging.exception("[GPT Async] GPT failed for %s: %s", wa_id, gpt_error)
+            await send_message_async(
+                get_text_message_input(
+                    wa_id,
+                    "Sorry, we're facing a temporary issue. Please try again in a few minutes.",
+                )
+            )
+            return
+
+        if reply:
+            await send_message_async(
+                get_text_message_input(wa_id, process_text_for_whatsapp(reply))
+            )
+            logging.info("[GPT Async] Replied to %s", wa_id)
+        else:
+            logging.warning("[GPT Async] No assistant reply for %s", wa_id)
+
+    except Exception as e:
+        logging.exception("[GPT Async] Failed to process message for %s: %s", wa_id, e)
@@ -1,10 +1,13 @@
 # app/tasks/background_tasks.py
 from celery_app import app
-from app.services.whatsapp_service import (
-    download_whatsapp_media,
-    save_file_to_s3,
+from app.services.whatsapp_service import stream_whatsapp_media_to_s3
+from app.services.dynamodb import (
+    MESSAGES_TABLE,
+    batch_write_items,
+    save_thread,
+    save_message,
 )
-from app.services.dynamodb import save_thread, save_message
+from app.services.openai_service import resource_reaper
 import logging
 
 
@@ -13,6 +16,14 @@ def store_message_to_dynamodb(wa_id, message_id, body, msg_type):
     save_message(wa_id, message_id, body, msg_type)
 
 
+@app.task(name="store_messages_batch_to_dynamodb")
+def store_messages_batch_to_dynamodb(items):
+    # Flush sink for the write-behind buffer (MESSAGE_WRITE_SINK=celery)
+    unprocessed = batch_write_items(MESSAGES_TABLE, items)
+    if unprocessed:
+        logging.error("[Celery] %d messages could not be written", len(unprocessed))
+
+
 @app.task(name="store_thread_to_dynamodb")
 def store_thread_to_dynamodb(wa_id: str, thread_id: str):
     try:
@@ -27,9 +38,9 @@ def store_thread_to_dynamodb(wa_id: str, thread_id: str):
 def handle_document_upload_async(wa_id, media_id, filename, thread_id=None):
     try:
         logging.info("[Celery] Start upload for %s file=%s", wa_id, filename)
-        file_bytes, _, content_type = download_whatsapp_media(media_id, filename)
-        s3_url = save_file_to_s3(file_bytes, filename, content_type)
-        logging.info("[Celery] Uploaded to S3: %s", s3_url)
+        media = stream_whatsapp_media_to_s3(media_id, filename)
+        s3_url = media.s3_url
+        logging.info("[Celery] Uploaded to S3: %s (sha256=%s)", s3_url, media.sha256)
 
         if thread_id:
             save_thread(wa_id, thread_id)
@@ -38,3 +49,9 @@ def handle_document_upload_async(wa_id, media_id, filename, thread_id=None):
     except Exception as e:
         logging.exception("[Celery] Document upload failed for %s", wa_id)
         return {"ok": False, "error": str(e)}
+
+
+@app.task(name="reap_openai_resources")
+def reap_openai_resources():
+    # Periodic (beat_schedule): delete OpenAI files/threads past their TTL
+    return resource_reaper.reap()
@@ -0,0 +1,118 @@
+# --- app/tasks/coalescer.py ---
+# Candidates often send three or four short texts in a row. The coalescer
+# holds each wa_id's text messages for a short debounce window and hands them
+# over as one batch, so they are appended together and answered by one run.
+#
+# With a FIFO queue SQS won't hand out a group's next message while earlier
+# ones are in flight, so there only messages received together coalesce; the
+# window matters most with a Standard queue.
+import os
+import threading
+import time
+
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))  # seconds; 0 = off
+COALESCE_MAX_WAIT = float(os.getenv("COALESCE_MAX_WAIT", "6"))
+
+
+def _thread_call_later(delay, fn):
+    timer = threading.Timer(delay, fn)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.first_at = time.monotonic()
+        self.timer = None
+
+
+class MessageCoalescer:
+    """
+    Debounces items per key. Each new item restarts the key's window, but a
+    batch never waits longer than max_wait after its first item. Items that
+    must not be merged (documents) flush the pending batch first, then go on
+    alone, so per-key order is kept.
+
+    flush(key, items) is called with every batch. call_later(delay, fn) must
+    return something with cancel(); the default uses threading.Timer, async
+    callers pass loop.call_later.
+    """
+
+    def __init__(
+        self,
+        flush,
+        window: float = COALESCE_WINDOW,
+        max_wait: float = COALESCE_MAX_WAIT,
+        call_later=None,
+    ):
+        self.flush = flush
+        self.window = window
+        self.max_wait = max_wait
+        self._call_later = call_later or _thread_call_later
+        self._batches = {}
+        self._lock = threading.Lock()
+        self.batches_flushed = 0
+        self.items_coalesced = 0
+
+    def add(self, key, item, coalescible: bool = True):
+        if not coalescible:
+            with self._lock:
+                pending = self._pop(key)
+            if pending:
+                self._flush(key, pending.items)
+            self._flush(key, [item])
+            return
+
+        with self._lock:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = _Batch()
+            batch.items.append(item)
+            if batch.timer is not None:
+                batch.timer.cancel()
+            remaining = batch.first_at + self.max_wait - time.monotonic()
+            delay = max(0.0, min(self.window, remaining))
+            batch.timer = self._call_later(delay, lambda: self._fire(key, batch))
+
+    def _pop(self, key):
+        batch = self._batches.pop(key, None)
+        if batch and batch.timer is not None:
+            batch.timer.cancel()
+        return batch
+
+    def _fire(self, key, batch):
+        with self._lock:
+            if self._batches.get(key) is not batch:
+                return  # already flushed by a document or flush_all
+            del self._batches[key]
+        self._flush(key, batch.items)
+
+    def _flush(self, key, items):
+        self.batches_flushed += 1
+        self.items_coalesced += len(items) - 1
+        self.flush(key, items)
+
+    def flush_all(self):
+        with self._lock:
+            batches = [(key, self._pop(key)) for key in list(self._batches)]
+        for key, batch in batches:
+            self._flush(key, batch.items)
+
+
+def merge_payloads(payloads: list) -> dict:
+    """Fold several text payloads from one wa_id into a single worker payload."""
+    if len(payloads) == 1:
+        return payloads[0]
+    merged = dict(payloads[-1])
+    merged["message_body"] = "\n".join(
+        (p.get("message_body") or "").strip()
+        for p in payloads
+        if (p.get("message_body") or "").strip()
+    )
+    merged["message_ids"] = [p.get("message_id") for p in payloads]
+    deadlines = [p["deadline_at"] for p in payloads if p.get("deadline_at")]
+    if deadlines:
+        merged["deadline_at"] = min(deadlines)  # the oldest message sets the pace
+    return merged
@@ -1,89 +1,185 @@
 # --- app/tasks/gpt_reply_worker.py ---
 import logging
 import uuid
-import re
-from openai import OpenAI
 
-from app.services.dynamodb import save_thread
+from app.services.dynamodb import (
+    get_document_verdict,
+    save_document_verdict,
+    save_thread,
+)
+from app.services.assistant_runs import RunSuperseded
 from app.services.whatsapp_service import (
     send_message,
     get_text_message_input,
     process_text_for_whatsapp,
-    download_whatsapp_media,
-    save_file_to_s3,  # <-- use your existing S3 helper
+    content_s3_key,
+    download_and_stage_media,
+    media_metadata,
+    s3_object_exists,
+    save_fileobj_to_s3,
 )
+from app.services.document_classifier import AMBIGUOUS, pre_classify
+from app.services.intent_router import intent_router
+from app.services.reply_streaming import STREAM_REPLIES, WhatsAppSentenceStreamer
+from app.utils.deadline import DeadlineExceeded, deadline_expired, deadline_scope
+from app.utils.stage_timer import StageStats, StageTimings
 from app.services.openai_service import (
+    MIN_REPLY_SECS,
+    REPLY_BACKEND,
+    answer_cache,
     check_if_thread_exists,
+    client,
+    fast_reply,
     generate_response,
+    analyze_document_text_with_gpt,
     analyze_uploaded_document_with_gpt,
 )
 
-client = OpenAI()
-
-# simple detector so we always say "yes" when users ask about uploads
-_UPLOAD_Q = re.compile(r"\b(upload|attach|send)\b.*\b(resume|cv|document|file)\b", re.I)
+# Per-stage latency of handle_document, reported on the worker's /stats
+document_stage_stats = StageStats()
 
 
-def handle_gpt_reply(payload):
-    wa_id = payload["wa_id"]
-    name = payload.get("name", "Candidate")
-    media_id = payload.get("media_id")
-    filename = payload.get("filename") or f"{wa_id}_{uuid.uuid4()}.pdf"
-    message_type = payload.get("message_type", "text")
+def starts_run(payload) -> bool:
+    """
+    Whether handling this payload will ask the model for a reply, rather than
+    send a canned intent, a cached answer or a deadline fast reply. Only such
+    a message may supersede the run in flight: the new run sees the earlier
+    question too, a canned reply would leave it unanswered.
+    """
     message_body = (payload.get("message_body") or "").strip()
+    if payload.get("message_type", "text") != "text" or not message_body:
+        return False
+    if intent_router.match(message_body):
+        return False
+    if answer_cache and answer_cache.has_answer(message_body):
+        return False
+    with deadline_scope(payload.get("deadline_at")):
+        return not deadline_expired(MIN_REPLY_SECS)
 
-    logging.info(
-        "[GPT Worker] Handling message from %s (type=%s): %s",
-        wa_id,
-        message_type,
-        message_body[:200],
+
+def classify_document(wa_id, name, fileobj, media) -> dict:
+    """
+    Obvious resumes and non-resumes are decided locally. Ambiguous ones go to
+    GPT as extracted text, or as a file (TEMP thread, keeps JSON out of the
+    chat thread) when we couldn't read the text ourselves.
+    """
+    pre = pre_classify(fileobj)
+    if pre.decision != AMBIGUOUS:
+        return pre.as_verdict()
+    if deadline_expired(MIN_REPLY_SECS):
+        # No time for the model; the candidate is asked to resend
+        logging.warning("[GPT Worker] Deadline nearly spent; not sending %s to GPT", media.filename)
+        return None
+    if pre.text:
+        return analyze_document_text_with_gpt(wa_id, name, pre.text, media.filename)
+    return analyze_uploaded_document_with_gpt(
+        wa_id=wa_id,
+        name=name,
+        file_bytes=fileobj,
+        filename=media.filename,
+        content_type=media.content_type,
     )
 
-    try:
-        # Ensure an OpenAI thread exists for this user
-        thread_id = check_if_thread_exists(wa_id)
-        if not thread_id:
-            thread = client.beta.threads.create()
-            thread_id = thread.id
-            save_thread(wa_id, thread_id)
-            logging.info("[GPT Worker] Created new thread %s for %s", thread_id, wa_id)
 
-        # ========== DOCUMENT FLOW (synchronous upload) ==========
-        if message_type == "document":
-            try:
-                # 1) Download media from WhatsApp
-                file_bytes, effective_filename, content_type = download_whatsapp_media(
-                    media_id, filename
-                )
-                filename = effective_filename or filename
-
-                # 2) Analyze in a TEMP thread (keeps JSON out of chat thread)
-                result = analyze_uploaded_document_with_gpt(
-                    wa_id=wa_id,
-                    name=name,
-                    file_bytes=file_bytes,
-                    filename=filename,
-                    content_type=content_type,
+def _persist_resume(fileobj, media, staged) -> str:
+    """
+    Store a resume under its content-addressed key (a resent resume is stored
+    once): promote the staged copy, or upload directly if there is none or
+    staging failed.
+    """
+    key = content_s3_key(media.sha256, media.filename)
+    if staged:
+        try:
+            staged.promote(key)
+            return key
+        except Exception as e:
+            logging.warning("[GPT Worker] Staged copy unusable (%s); uploading directly", e)
+            staged.discard()
+    if s3_object_exists(key):
+        logging.info("[GPT Worker] Resume already in S3: %s", key)
+    else:
+        save_fileobj_to_s3(fileobj, media.filename, media.content_type, key=key)
+    return key
+
+
+def _discard(staged):
+    if staged:
+        staged.discard()
+
+
+def handle_document(wa_id, name, media_id, filename):
+    """
+    Staged document pipeline: acknowledge at once, look up an earlier verdict
+    by the checksum Graph reports, then download while the bytes stream to a
+    staging S3 key (skipped when the verdict is known), classify while that
+    upload finishes, and finally promote or delete the staged object. Stage
+    timings are logged and aggregated in document_stage_stats.
+    """
+    timings = StageTimings()
+    staged = None
+    try:
+        # 1) Immediate receipt, so the candidate isn't left waiting on the verdict
+        with timings.stage("ack"):
+            send_message(
+                get_text_message_input(
+                    wa_id, "Thanks! We've received your document. Checking it now..."
                 )
+            )
+        timings.mark("first_response")
 
-                if not result:
-                    send_message(
-                        get_text_message_input(
-                            wa_id,
-                            "Sorry, we couldn't verify your document right now. Please try again.",
-                        )
+        # 2) Same bytes classified before? Graph reports the checksum up
+        #    front, so a known document is never staged just to be deleted
+        with timings.stage("verdict"):
+            meta = media_metadata(media_id)
+            verdict = get_document_verdict(meta.get("sha256"))
+
+        # 3) Spool the download locally while it is also uploaded to staging
+        with timings.stage("download"):
+            fileobj, media, staged = download_and_stage_media(
+                media_id, filename, stage=not verdict, url=meta.get("url")
+            )
+        with fileobj:
+            # 4) Reuse the verdict if the bytes match; otherwise classify
+            #    locally, asking GPT only when that's inconclusive
+            with timings.stage("classify"):
+                if verdict and verdict.get("sha256") != media.sha256:
+                    verdict = None
+                if verdict:
+                    logging.info(
+                        "[GPT Worker] Reusing verdict for document %s",
+                        media.sha256[:12],
                     )
-                    return
+                    result = verdict
+                else:
+                    result = classify_document(wa_id, name, fileobj, media)
 
-                if result.get("is_resume"):
-                    # 3) Upload to S3 synchronously
+            if not result:
+                _discard(staged)
+                send_message(
+                    get_text_message_input(
+                        wa_id,
+                        "Sorry, we couldn't verify your document right now. Please try again.",
+                    )
+                )
+                return
+
+            if result.get("is_resume"):
+                # 5) Promote the staged object (or drop it if already stored)
+                with timings.stage("persist"):
                     try:
-                        s3_url = save_file_to_s3(file_bytes, filename, content_type)
-                        logging.info("[GPT Worker] Uploaded resume to S3: %s", s3_url)
+                        if result.get("s3_key"):
+                            _discard(staged)
+                        else:
+                            key = _persist_resume(fileobj, media, staged)
+                            save_document_verdict(
+                                media.sha256,
+                                True,
+                                result.get("reason"),
+                                s3_key=key,
+                                details=result.get("details"),
+                            )
                     except Exception:
-                        logging.exception(
-                            "[GPT Worker] Synchronous S3 upload failed for %s", wa_id
-                        )
+                        logging.exception("[GPT Worker] S3 persist failed for %s", wa_id)
                         send_message(
                             get_text_message_input(
                                 wa_id,
@@ -92,29 +188,73 @@ def handle_gpt_reply(payload):
                         )
                         return
 
-                    # 4) Acknowledge only after successful upload
-                    send_message(
-                        get_text_message_input(
-                            wa_id, "Thanks! We've received your resume."
-                        )
+                send_message(
+                    get_text_message_input(
+                        wa_id, "Your resume looks good and has been saved. Our team will review it shortly."
                     )
-                else:
-                    reason = result.get("reason", "No reason provided.")
-                    send_message(
-                        get_text_message_input(
-                            wa_id,
-                            f"Sorry, this doesn't appear to be a resume.\nReason: {reason}",
-                        )
+                )
+            else:
+                _discard(staged)
+                if not verdict:
+                    save_document_verdict(
+                        media.sha256,
+                        False,
+                        result.get("reason"),
+                        details=result.get("details"),
                     )
-
-            except Exception:
-                logging.exception("[GPT Worker] Error handling document for %s", wa_id)
+                reason = result.get("reason", "No reason provided.")
                 send_message(
                     get_text_message_input(
                         wa_id,
-                        "Something went wrong while processing your document. Please try again.",
+                        f"Sorry, this doesn't appear to be a resume.\nReason: {reason}",
                     )
                 )
+
+    except Exception:
+        logging.exception("[GPT Worker] Error handling document for %s", wa_id)
+        _discard(staged)
+        send_message(
+            get_text_message_input(
+                wa_id,
+                "Something went wrong while processing your document. Please try again.",
+            )
+        )
+    finally:
+        document_stage_stats.record(timings)
+        logging.info("[GPT Worker] Document stages for %s: %s", wa_id, timings.as_dict())
+
+
+def handle_gpt_reply(payload):
+    # Every stage below runs against the message's deadline, if it has one
+    with deadline_scope(payload.get("deadline_at")):
+        _handle_gpt_reply(payload)
+
+
+def _handle_gpt_reply(payload):
+    wa_id = payload["wa_id"]
+    name = payload.get("name", "Candidate")
+    media_id = payload.get("media_id")
+    filename = payload.get("filename") or f"{wa_id}_{uuid.uuid4()}.pdf"
+    message_type = payload.get("message_type", "text")
+    message_body = (payload.get("message_body") or "").strip()
+
+    logging.info(
+        "[GPT Worker] Handling message from %s (type=%s): %s",
+        wa_id,
+        message_type,
+        message_body[:200],
+    )
+
+    try:
+        # Ensure an OpenAI thread exists for this user (threads backend only)
+        if REPLY_BACKEND == "threads" and not check_if_thread_exists(wa_id):
+            thread = client.beta.threads.create()
+            save_thread(wa_id, thread.id)
+            logging.info("[GPT Worker] Created new thread %s for %s", thread.id, wa_id)
+
+        # ========== DOCUMENT FLOW (synchronous upload) ==========
+        if message_type == "document":
+            handle_document(wa_id, name, media_id, filename)
             return  # end document branch
 
         # ========== TEXT FLOW ==========
@@ -124,20 +264,38 @@ def handle_gpt_reply(payload):
             )
             return
 
-        # Friendly fast-path: if user asks about uploading, always say YES
-        if _UPLOAD_Q.search(message_body):
-            send_message(
-                get_text_message_input(
-                    wa_id,
-                    "Yes — you can upload your resume here as a document (PDF/DOC/DOCX). "
-                    "Once I receive it, I’ll analyze it and help you update or tailor it.",
-                )
-            )
+        # Canned answers (upload questions, greetings, ...) skip the assistant
+        route = intent_router.route(message_body)
+        if route:
+            send_message(get_text_message_input(wa_id, route.reply(name)))
+            return
+
+        # Out of time (queue backlog, slow retries): answer now instead of
+        # starting a run that would outlive the message's SQS visibility
+        if deadline_expired(MIN_REPLY_SECS):
+            logging.warning("[GPT Worker] Deadline nearly spent for %s; fast reply", wa_id)
+            send_message(get_text_message_input(wa_id, fast_reply(message_body, name)))
             return
 
-        # Normal assistant reply (context-aware)
+        # Normal assistant reply (context-aware). In streaming mode sentences
+        # are sent while the run is still generating.
+        streamer = WhatsAppSentenceStreamer(wa_id) if STREAM_REPLIES else None
         try:
-            reply = generate_response(message_body, wa_id, name)
+            reply = generate_response(
+                message_body,
+                wa_id,
+                name,
+                on_event=streamer.on_event if streamer else None,
+            )
+        except RunSuperseded:
+            logging.info("[GPT Worker] Reply for %s superseded by a newer message", wa_id)
+            return
+        except DeadlineExceeded:
+            logging.warning("[GPT Worker] Deadline hit while replying to %s", wa_id)
+            if not (streamer and streamer.sent_any):
+                # After streamed sentences a stock reply would only contradict them
+                send_message(get_text_message_input(wa_id, fast_reply(message_body, name)))
+            return
         except Exception as gpt_error:
             logging.exception("[GPT Worker] GPT failed for %s: %s", wa_id, gpt_error)
             send_message(
@@ -148,7 +306,14 @@ def handle_gpt_reply(payload):
             )
             return
 
-        if reply:
+        if streamer and streamer.sent_any and not streamer.failed:
+            streamer.finish(reply)
+            logging.info(
+                "[GPT Worker] Streamed reply to %s in %d messages",
+                wa_id,
+                streamer.sent_chunks,
+            )
+        elif reply:
             send_message(
                 get_text_message_input(wa_id, process_text_for_whatsapp(reply))
             )
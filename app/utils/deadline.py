@@ -0,0 +1,59 @@
+# --- app/utils/deadline.py ---
+# Per-message time budget. The webhook stamps "deadline_at" (epoch seconds)
+# into the SQS payload; the worker activates it with deadline_scope() while
+# it handles the message. Each stage sizes its timeouts with bounded_timeout()
+# and checks deadline_expired() before starting work it can't finish in time.
+# Outside a scope there is no deadline and timeouts pass through unchanged.
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Webhook receipt to reply; keep it under the SQS visibility timeout
+MESSAGE_BUDGET_SECS = float(os.getenv("MESSAGE_BUDGET_SECS", "60"))
+
+_deadline = ContextVar("deadline_at", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The message's time budget ran out before this stage could start."""
+
+
+def new_deadline(budget: float = MESSAGE_BUDGET_SECS) -> float:
+    return time.time() + budget
+
+
+@contextmanager
+def deadline_scope(deadline_at: float):
+    token = _deadline.set(deadline_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float:
+    """Seconds left on the current deadline (never negative); None without one."""
+    deadline_at = _deadline.get()
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - time.time())
+
+
+def bounded_timeout(timeout: float, floor: float = 1.0) -> float:
+    """timeout capped to the time left, but at least floor (a call still needs some)."""
+    left = time_left()
+    if left is None:
+        return timeout
+    return max(floor, min(timeout, left))
+
+
+def deadline_expired(reserve: float = 0.0) -> bool:
+    """True once less than reserve seconds are left."""
+    left = time_left()
+    return left is not None and left <= reserve
+
+
+def check_deadline(stage: str, reserve: float = 0.0):
+    if deadline_expired(reserve):
+        raise DeadlineExceeded(stage)
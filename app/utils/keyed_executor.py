@@ -0,0 +1,129 @@
+# --- app/utils/keyed_executor.py ---
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class KeyedExecutor:
+    """
+    Thread pool where tasks sharing a key run serially in submission order,
+    while tasks for different keys run in parallel.
+
+    - max_workers bounds how many keys make progress at the same time.
+    - max_in_flight bounds submitted-but-unfinished tasks (queued or running),
+      so callers can size their prefetch with free_capacity().
+    """
+
+    def __init__(self, max_workers: int = 8, max_in_flight: int = None):
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers * 2
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="keyed-worker"
+        )
+        self._cond = threading.Condition()
+        self._queues = {}  # key -> deque of pending (fn, args, kwargs, future)
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        with self._cond:
+            return self._in_flight
+
+    def free_capacity(self) -> int:
+        with self._cond:
+            return max(0, self.max_in_flight - self._in_flight)
+
+    def wait_for_capacity(self, timeout: float = None) -> int:
+        """Block until at least one slot is free; return the free slot count."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._in_flight < self.max_in_flight, timeout=timeout
+            )
+            return max(0, self.max_in_flight - self._in_flight)
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        future = Future()
+        item = (fn, args, kwargs, future)
+        with self._cond:
+            self._in_flight += 1
+            if key in self._queues:
+                # Key already has a running task; it will pick this one up next
+                self._queues[key].append(item)
+                return future
+            self._queues[key] = deque()
+        self._pool.submit(self._drain, key, item)
+        return future
+
+    def _drain(self, key, item):
+        while item is not None:
+            fn, args, kwargs, future = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+                pending = self._queues.get(key)
+                if pending:
+                    item = pending.popleft()
+                else:
+                    self._queues.pop(key, None)
+                    item = None
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class AsyncKeyedExecutor:
+    """
+    asyncio flavour of KeyedExecutor: coroutines sharing a key are chained so
+    they run in submission order, different keys run concurrently, and at most
+    max_in_flight coroutines are pending at once. Must be used from one loop.
+    """
+
+    def __init__(self, max_in_flight: int = 200):
+        self.max_in_flight = max_in_flight
+        self._tails = {}  # key -> last submitted task for that key
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def free_capacity(self) -> int:
+        return max(0, self.max_in_flight - self._in_flight)
+
+    async def wait_for_capacity(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.max_in_flight)
+            return self.free_capacity()
+
+    def submit(self, key, coro_fn, *args, **kwargs) -> asyncio.Task:
+        prev = self._tails.get(key)
+        task = asyncio.ensure_future(self._run(key, prev, coro_fn, args, kwargs))
+        self._tails[key] = task
+        self._in_flight += 1
+        return task
+
+    async def _run(self, key, prev, coro_fn, args, kwargs):
+        try:
+            if prev is not None:
+                # Wait for the previous task for this key; its outcome is its own
+                await asyncio.wait([prev])
+            return await coro_fn(*args, **kwargs)
+        finally:
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+            self._in_flight -= 1
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def join(self):
+        """Wait for every submitted task to finish."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight == 0)
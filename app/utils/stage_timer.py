@@ -0,0 +1,56 @@
+# --- app/utils/stage_timer.py ---
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """Wall-clock seconds per named stage of one pipeline run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        begin = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.monotonic() - begin
+
+    def mark(self, name: str):
+        """Record the time from start until now (e.g. time to first response)."""
+        self.stages[name] = time.monotonic() - self.started
+
+    def as_dict(self) -> dict:
+        timings = {name: round(secs, 3) for name, secs in self.stages.items()}
+        timings["total"] = round(time.monotonic() - self.started, 3)
+        return timings
+
+
+class StageStats:
+    """Count / mean / max per stage across many runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}  # name -> [count, total, max]
+
+    def record(self, timings: StageTimings):
+        with self._lock:
+            for name, secs in timings.as_dict().items():
+                entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += secs
+                entry[2] = max(entry[2], secs)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "count": count,
+                    "mean_secs": round(total / count, 3),
+                    "max_secs": round(peak, 3),
+                }
+                for name, (count, total, peak) in self._stages.items()
+            }
@@ -0,0 +1,60 @@
+# --- app/utils/token_bucket.py ---
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens/second up to `capacity`.
+    acquire() blocks until enough tokens are available (or timeout expires).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0, reserve: float = 0.0) -> float:
+        """
+        Take tokens if available and return 0; otherwise return seconds to
+        wait. With a reserve, at least that many tokens must be left afterwards.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens - tokens >= reserve:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens + reserve - self._tokens) / self.rate
+
+    def refund(self, tokens: float = 1.0):
+        """Give back tokens taken by a request that didn't go out after all."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so nothing is granted for `seconds` (e.g. Retry-After)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
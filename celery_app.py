@@ -5,7 +5,12 @@ import os
 BROKER_URL = os.getenv("CELERY_BROKER_URL", "sqs://")
 REGION = os.getenv("AWS_REGION", "us-east-2")
 
-app = Celery("whatsapp_worker", broker=BROKER_URL)
+# Seconds between passes of the OpenAI temp-resource reaper
+OPENAI_REAPER_INTERVAL = float(os.getenv("OPENAI_REAPER_INTERVAL", "900"))
+
+app = Celery(
+    "whatsapp_worker", broker=BROKER_URL, include=["app.tasks.background_tasks"]
+)
 
 # AWS SQS specific settings
 app.conf.update(
@@ -17,4 +22,12 @@ app.conf.update(
     task_default_queue="whatsapp-bot",
     accept_content=["json"],
     task_serializer="json",
+    # Periodic tasks; run `celery -A celery_app beat` next to the worker
+    beat_schedule={
+        "reap-openai-resources": {
+            "task": "reap_openai_resources",
+            "schedule": OPENAI_REAPER_INTERVAL,
+            "options": {"expires": OPENAI_REAPER_INTERVAL},
+        },
+    },
 )
@@ -0,0 +1,56 @@
+# run_campaign.py
+#
+# Send a campaign to a candidate list, e.g.
+#   python run_campaign.py candidates.csv --text "Hi {name}, we have a role for you!"
+#   python run_campaign.py candidates.jsonl --template role_alert --params name,role
+# Re-running with the same --checkpoint resumes without double-sending.
+# Point GRAPH_API_BASE at start/mock_graph_api.py to try it locally.
+
+import argparse
+import json
+import logging
+
+from app.services.campaigns import (
+    CampaignCheckpoint,
+    load_candidates,
+    run_campaign,
+    template_message_builder,
+    text_message_builder,
+)
+
+logging.basicConfig(level=logging.INFO)
+# httpx logs every request at INFO; keep campaign output readable
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a WhatsApp campaign")
+    parser.add_argument("candidates", help="CSV (with header) or JSONL file")
+    message = parser.add_mutually_exclusive_group(required=True)
+    message.add_argument("--text", help="Text body; {field} placeholders allowed")
+    message.add_argument("--template", help="Approved template name")
+    parser.add_argument("--language", default="en_US")
+    parser.add_argument(
+        "--params", default="", help="Comma-separated candidate fields for the template body"
+    )
+    parser.add_argument("--checkpoint", help="Progress log (default: <candidates>.progress.jsonl)")
+    args = parser.parse_args()
+
+    if args.text:
+        build = text_message_builder(args.text)
+    else:
+        params = [p for p in args.params.split(",") if p]
+        build = template_message_builder(args.template, args.language, params)
+
+    checkpoint = CampaignCheckpoint(
+        args.checkpoint or f"{args.candidates}.progress.jsonl"
+    )
+    try:
+        stats = run_campaign(load_candidates(args.candidates), build, checkpoint)
+    finally:
+        checkpoint.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,38 @@
 # run_worker.py
 
+import asyncio
 import boto3
 import json
 import logging
 import os
+import signal
+import sys
 import threading
 import time
+from contextlib import contextmanager
 from flask import Flask
 from botocore.exceptions import ClientError
 
-from app.tasks.gpt_reply_worker import handle_gpt_reply
+from app.services.dynamodb import claim_message, complete_message, message_writer
+from app.services.openai_service import (
+    SUPERSEDE_RUNS,
+    answer_cache,
+    resource_reaper,
+    supersede_active_run,
+)
+from app.services.document_classifier import decisions as document_decisions
+from app.services.openai_scheduler import scheduler as openai_scheduler
+from app.services.intent_router import intent_router
+from app.services.thread_state import thread_states
+from app.services.whatsapp_service import outbound
+from app.tasks.gpt_reply_worker import (
+    document_stage_stats,
+    handle_gpt_reply,
+    starts_run,
+)
+from app.tasks.async_gpt_reply_worker import handle_gpt_reply_async
+from app.tasks.coalescer import COALESCE_WINDOW, MessageCoalescer, merge_payloads
+from app.utils.keyed_executor import AsyncKeyedExecutor, KeyedExecutor
 
 logging.basicConfig(level=logging.INFO)
 
@@ -17,6 +40,21 @@ logging.basicConfig(level=logging.INFO)
 sqs = boto3.client("sqs", region_name=os.getenv("AWS_REGION", "us-east-2"))
 QUEUE_URL = os.getenv("SQS_QUEUE_URL")
 
+# "threads" (default) or "async" (single event loop, many conversations in flight)
+WORKER_MODE = os.getenv("WORKER_MODE", "threads")
+
+# Worker pool: messages for the same wa_id run serially, different users in parallel
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WORKER_MAX_IN_FLIGHT = int(
+    os.getenv("WORKER_MAX_IN_FLIGHT", str(WORKER_CONCURRENCY * 2))
+)
+ASYNC_WORKER_MAX_IN_FLIGHT = int(os.getenv("ASYNC_WORKER_MAX_IN_FLIGHT", "200"))
+
+# A received message must be handled (and deleted) before it becomes visible
+# again, or another worker picks it up; its deadline is capped accordingly
+SQS_VISIBILITY_TIMEOUT = int(os.getenv("SQS_VISIBILITY_TIMEOUT", "90"))
+VISIBILITY_MARGIN_SECS = float(os.getenv("VISIBILITY_MARGIN_SECS", "10"))
+
 app = Flask(__name__)
 
 
@@ -25,46 +63,260 @@ def health_check():
     return {"status": "ok"}, 200
 
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    return {
+        "runs": dict(thread_states.counters),
+        "intents": intent_router.stats(),
+        "documents": dict(document_decisions),
+        "document_stages": document_stage_stats.snapshot(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "openai_reaper": resource_reaper.stats(),
+        "openai_budget": openai_scheduler.stats(),
+        "message_writer": message_writer.stats(),
+        "outbound": outbound.stats(),
+    }, 200
+
+
+def _visible_at(received_at: float) -> float:
+    """When a message received at received_at may be redelivered, less the margin."""
+    return received_at + SQS_VISIBILITY_TIMEOUT - VISIBILITY_MARGIN_SECS
+
+
+def _with_deadline(body: dict, received_at: float) -> dict:
+    """Stamp the effective deadline: the webhook's, or earlier if visibility ends first."""
+    visible_at = _visible_at(received_at)
+    body["deadline_at"] = min(body.get("deadline_at") or visible_at, visible_at)
+    return body
+
+
+# wa_id -> message_ids whose reply is being generated right now
+_answering = {}
+_answering_lock = threading.Lock()
+
+
+@contextmanager
+def _answering_scope(bodies):
+    wa_id = bodies[0].get("wa_id")
+    ids = {body.get("message_id") for body in bodies}
+    with _answering_lock:
+        _answering.setdefault(wa_id, set()).update(ids)
+    try:
+        yield
+    finally:
+        with _answering_lock:
+            remaining = _answering.get(wa_id, set()) - ids
+            if remaining:
+                _answering[wa_id] = remaining
+            else:
+                _answering.pop(wa_id, None)
+
+
+def _admit(body, received_at: float) -> bool:
+    """
+    Claim a received message before it is queued; False for a duplicate.
+    Claiming here (not in process_messages) matters for superseding: the new
+    message waits behind the stale run for its wa_id, so it must cancel that
+    run on arrival, and only once it is known to be a different message that
+    will start a run of its own.
+    """
+    message_id = body.get("message_id")
+    # The claim lapses just before SQS redelivers the message. Not at its
+    # deadline: a backlogged message's deadline has already passed, and a
+    # concurrent redelivery could claim it again straight away
+    if not claim_message(message_id, lease_until=_visible_at(received_at)):
+        logging.info("[Worker] Duplicate message %s ignored.", message_id)
+        return False
+    wa_id = body.get("wa_id")
+    if SUPERSEDE_RUNS and starts_run(body):
+        with _answering_lock:
+            answering = message_id in _answering.get(wa_id, ())
+        if not answering:
+            # A newer text makes the reply being generated stale
+            supersede_active_run(wa_id)
+    return True
+
+
+def _complete(bodies):
+    for body in bodies:
+        complete_message(body.get("message_id"))
+
+
+def delete_messages(receipt_handles):
+    if len(receipt_handles) == 1:
+        sqs.delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=receipt_handles[0])
+    else:
+        for start in range(0, len(receipt_handles), 10):
+            sqs.delete_message_batch(
+                QueueUrl=QUEUE_URL,
+                Entries=[
+                    {"Id": str(i), "ReceiptHandle": handle}
+                    for i, handle in enumerate(receipt_handles[start : start + 10])
+                ],
+            )
+    logging.info("[Worker] Deleted %d message(s) from queue.", len(receipt_handles))
+
+
+def process_messages(items):
+    """
+    Handle one admitted (body, receipt_handle), or a coalesced batch from one
+    wa_id; the messages are marked done and deleted once the reply is out.
+    """
+    bodies = [body for body, _ in items]
+    try:
+        with _answering_scope(bodies):
+            handle_gpt_reply(merge_payloads(bodies))
+        _complete(bodies)
+        delete_messages([handle for _, handle in items])
+    except Exception as e:
+        logging.exception(f"[Worker] Failed to process message: {e}")
+
+
 def poll_sqs():
-    logging.info("[Worker] Starting polling loop...")
+    executor = KeyedExecutor(
+        max_workers=WORKER_CONCURRENCY, max_in_flight=WORKER_MAX_IN_FLIGHT
+    )
+    coalescer = None
+    if COALESCE_WINDOW > 0:
+        coalescer = MessageCoalescer(
+            lambda key, items: executor.submit(key, process_messages, items)
+        )
+    logging.info(
+        "[Worker] Starting polling loop (workers=%d, max_in_flight=%d)...",
+        WORKER_CONCURRENCY,
+        WORKER_MAX_IN_FLIGHT,
+    )
 
     while True:
         try:
+            # Only prefetch what the pool can start on; the rest stays in SQS
+            free = executor.wait_for_capacity()
             response = sqs.receive_message(
                 QueueUrl=QUEUE_URL,
-                MaxNumberOfMessages=5,
+                MaxNumberOfMessages=min(10, free),
                 WaitTimeSeconds=20,  # long polling
-                VisibilityTimeout=90,
+                VisibilityTimeout=SQS_VISIBILITY_TIMEOUT,
             )
 
+            received_at = time.time()
             messages = response.get("Messages", [])
             if not messages:
+                # tiny sleep to avoid tight loop on empty
+                time.sleep(0.5)
                 continue
 
             for msg in messages:
-                receipt_handle = msg["ReceiptHandle"]
                 try:
-                    body = json.loads(msg["Body"])
-                    logging.info(f"[Worker] Received message: {body}")
-                    handle_gpt_reply(body)
-                    sqs.delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=receipt_handle)
-                    logging.info("[Worker] Deleted message from queue.")
-                except Exception as e:
-                    logging.exception(f"[Worker] Failed to process message: {e}")
-            # tiny sleep to avoid tight loop on empty
-            if not response.get("Messages"):
-                time.sleep(0.5)
+                    body = _with_deadline(json.loads(msg["Body"]), received_at)
+                except (TypeError, ValueError) as e:
+                    logging.exception(f"[Worker] Failed to parse message: {e}")
+                    continue
+                logging.info(f"[Worker] Received message: {body}")
+                if not _admit(body, received_at):
+                    delete_messages([msg["ReceiptHandle"]])
+                    continue
+                key = body.get("wa_id") or msg["MessageId"]
+                item = (body, msg["ReceiptHandle"])
+                if coalescer:
+                    coalescer.add(
+                        key, item, coalescible=body.get("message_type") == "text"
+                    )
+                else:
+                    executor.submit(key, process_messages, [item])
 
         except ClientError as e:
             logging.error(f"[Worker] AWS ClientError: {e}")
             time.sleep(5)
 
 
+async def process_messages_async(items):
+    bodies = [body for body, _ in items]
+    try:
+        with _answering_scope(bodies):
+            await handle_gpt_reply_async(merge_payloads(bodies))
+        await asyncio.to_thread(_complete, bodies)
+        await asyncio.to_thread(delete_messages, [handle for _, handle in items])
+    except Exception as e:
+        logging.exception(f"[Worker] Failed to process message: {e}")
+
+
+async def poll_sqs_async():
+    # boto3 is blocking; receive/delete run in the default thread pool so the
+    # 20s long poll never stalls the conversations already in flight
+    executor = AsyncKeyedExecutor(max_in_flight=ASYNC_WORKER_MAX_IN_FLIGHT)
+    coalescer = None
+    if COALESCE_WINDOW > 0:
+        coalescer = MessageCoalescer(
+            lambda key, items: executor.submit(key, process_messages_async, items),
+            call_later=asyncio.get_running_loop().call_later,
+        )
+    logging.info(
+        "[Worker] Starting async polling loop (max_in_flight=%d)...",
+        ASYNC_WORKER_MAX_IN_FLIGHT,
+    )
+
+    while True:
+        try:
+            free = await executor.wait_for_capacity()
+            response = await asyncio.to_thread(
+                sqs.receive_message,
+                QueueUrl=QUEUE_URL,
+                MaxNumberOfMessages=min(10, free),
+                WaitTimeSeconds=20,
+                VisibilityTimeout=SQS_VISIBILITY_TIMEOUT,
+            )
+
+            received_at = time.time()
+            messages = response.get("Messages", [])
+            if not messages:
+                await asyncio.sleep(0.5)
+                continue
+
+            for msg in messages:
+                try:
+                    body = _with_deadline(json.loads(msg["Body"]), received_at)
+                except (TypeError, ValueError) as e:
+                    logging.exception(f"[Worker] Failed to parse message: {e}")
+                    continue
+                logging.info(f"[Worker] Received message: {body}")
+                if not await asyncio.to_thread(_admit, body, received_at):
+                    await asyncio.to_thread(delete_messages, [msg["ReceiptHandle"]])
+                    continue
+                key = body.get("wa_id") or msg["MessageId"]
+                item = (body, msg["ReceiptHandle"])
+                if coalescer:
+                    coalescer.add(
+                        key, item, coalescible=body.get("message_type") == "text"
+                    )
+                else:
+                    executor.submit(key, process_messages_async, [item])
+
+        except ClientError as e:
+            logging.error(f"[Worker] AWS ClientError: {e}")
+            await asyncio.sleep(5)
+
+
+def _shutdown(signum, frame):
+    """SIGTERM (App Runner, docker stop) skips atexit: flush buffered messages first."""
+    logging.info("[Worker] SIGTERM received; flushing buffered messages")
+    message_writer.close()
+    sys.exit(0)
+
+
+def start_polling():
+    if WORKER_MODE == "async":
+        target, args = asyncio.run, (poll_sqs_async(),)
+    else:
+        target, args = poll_sqs, ()
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
 # Start SQS polling AFTER env vars are guaranteed to be available
-threading.Thread(target=poll_sqs, daemon=True).start()
+start_polling()
 
 if __name__ == "__main__":
     logging.info("[Worker] Bootstrapping...")
+    signal.signal(signal.SIGTERM, _shutdown)
 
     # Start Flask app (needed for App Runner health check)
     port = int(os.getenv("PORT", 8080))
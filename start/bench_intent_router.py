@@ -0,0 +1,91 @@
+# start/bench_intent_router.py
+#
+# Micro-benchmark for the intent router:
+#   python start/bench_intent_router.py
+# Times route() on a realistic message mix with the real intent table, then
+# with 10x / 100x / 1000x synthetic intents added, to show the per-message
+# cost stays flat as the table grows. Compares against the naive approach of
+# trying one regex per intent.
+
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_router import INTENTS, Intent, IntentRouter  # noqa: E402
+
+MESSAGES = [
+    "Can I upload my resume here?",
+    "hello",
+    "Is the DevOps role remote or on-site?",
+    "I have 6 years of experience with Spring Boot, AWS and Kubernetes.",
+    "how do I apply",
+    "thanks!",
+    "What is the salary range for the data scientist position?",
+    "I have an updated CV, where should I send it?",
+    "Could you tell me more about the interview process and the timeline for a decision?",
+    "ok",
+]
+
+
+def synthetic_intents(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 9)))
+
+    return [
+        Intent(
+            f"synthetic_{i}",
+            groups=(tuple(word() for _ in range(4)), tuple(word() for _ in range(4))),
+            reply="synthetic",
+        )
+        for i in range(count)
+    ]
+
+
+def per_message_us(fn, rounds: int = 2000) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            fn(message)
+    return (time.perf_counter() - started) / (rounds * len(MESSAGES)) * 1e6
+
+
+def naive_regexes(intents):
+    compiled = [
+        [re.compile(r"\b(" + "|".join(map(re.escape, group)) + r")\b", re.I) for group in i.groups]
+        for i in intents
+    ]
+
+    def match(text):
+        for groups in compiled:
+            if all(g.search(text) for g in groups):
+                return groups
+        return None
+
+    return match
+
+
+def main():
+    print(f"{'intents':>8} {'router us/msg':>14} {'regex-per-intent us/msg':>24}")
+    for extra in (0, 10 * len(INTENTS), 100 * len(INTENTS), 1000 * len(INTENTS)):
+        intents = INTENTS + synthetic_intents(extra)
+        router = IntentRouter(intents)
+        rounds = 2000 if extra < 1000 else 200
+        routed = per_message_us(router.match, rounds)
+        naive = per_message_us(naive_regexes(intents), max(5, rounds // max(1, extra // 50)))
+        print(f"{len(intents):>8} {routed:>14.2f} {naive:>24.2f}")
+
+    router = IntentRouter()
+    for message in MESSAGES:
+        router.route(message)
+    print(router.stats())
+
+
+if __name__ == "__main__":
+    main()
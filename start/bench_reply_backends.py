@@ -0,0 +1,97 @@
+# start/bench_reply_backends.py
+#
+# Compare the two reply backends on the same scripted conversation:
+#   python start/bench_reply_backends.py                 # both backends
+#   python start/bench_reply_backends.py --backend local --turns 8
+# Needs the usual OPENAI_API_KEY / OPENAI_ASSISTANT_ID / AWS settings. Each
+# run uses a fresh bench-* wa_id, so it never touches a real conversation.
+# Reports per-turn latency and the OpenAI / DynamoDB round trips per reply.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import openai_service  # noqa: E402
+from app.services.dynamodb import dynamodb, message_writer  # noqa: E402
+
+SCRIPT = [
+    "Hi, I got your message about a Java developer role. Is it remote?",
+    "I have 6 years of experience with Spring Boot and AWS.",
+    "What would the interview process look like?",
+    "Is the salary range negotiable?",
+    "I am currently in Dallas, would relocation be needed?",
+    "Can I send my updated resume later this week?",
+    "What was the role you mentioned at the start again?",
+    "Thanks! What is the next step?",
+]
+
+calls = Counter()
+
+
+def _count_openai(request):
+    calls["openai"] += 1
+
+
+def _count_dynamodb(**kwargs):
+    calls["dynamodb"] += 1
+
+
+def bench(backend: str, turns: int) -> dict:
+    openai_service.REPLY_BACKEND = backend
+    wa_id = f"bench-{uuid.uuid4().hex[:10]}"
+    latencies, per_turn_calls = [], []
+    for message in (SCRIPT * (turns // len(SCRIPT) + 1))[:turns]:
+        calls.clear()
+        started = time.perf_counter()
+        reply = openai_service.generate_response(message, wa_id, "Bench Candidate")
+        latencies.append(time.perf_counter() - started)
+        per_turn_calls.append(dict(calls))
+        print(f"[{backend}] {latencies[-1]:.2f}s {dict(calls)} {reply[:60]!r}")
+    message_writer.flush()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "turns": turns,
+        "p50_secs": round(statistics.median(latencies), 3),
+        "p95_secs": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 3),
+        "mean_secs": round(statistics.mean(latencies), 3),
+        "openai_calls_per_turn": round(
+            statistics.mean(c.get("openai", 0) for c in per_turn_calls), 2
+        ),
+        "dynamodb_calls_per_turn": round(
+            statistics.mean(c.get("dynamodb", 0) for c in per_turn_calls), 2
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reply backends")
+    parser.add_argument("--backend", choices=["threads", "local", "both"], default="both")
+    parser.add_argument("--turns", type=int, default=len(SCRIPT))
+    args = parser.parse_args()
+
+    # Same client settings, plus a hook that counts every HTTP request
+    openai_service.client = OpenAI(
+        api_key=openai_service.OPENAI_API_KEY,
+        http_client=httpx.Client(event_hooks={"request": [_count_openai]}),
+    )
+    dynamodb.meta.client.meta.events.register("before-call", _count_dynamodb)
+
+    backends = ["threads", "local"] if args.backend == "both" else [args.backend]
+    results = [bench(backend, args.turns) for backend in backends]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
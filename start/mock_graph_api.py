@@ -0,0 +1,67 @@
+# start/mock_graph_api.py
+#
+# Local stand-in for the WhatsApp Cloud API "send message" endpoint, for
+# trying campaigns and the outbound dispatcher without touching Meta:
+#   python start/mock_graph_api.py               # listens on :5055
+#   GRAPH_API_BASE=http://localhost:5055 ACCESS_TOKEN=x PHONE_NUMBER_ID=123 \
+#       python run_campaign.py candidates.csv --text "Hi {name}"
+# MOCK_MPS throttles like a business number (429 + code 130429 above it),
+# MOCK_FAILURE_RATE injects transient 500s, MOCK_LATENCY adds delay per call.
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import Flask, jsonify, request
+
+MOCK_MPS = float(os.getenv("MOCK_MPS", "80"))
+MOCK_FAILURE_RATE = float(os.getenv("MOCK_FAILURE_RATE", "0"))
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.05"))
+
+app = Flask(__name__)
+_lock = threading.Lock()
+_window = []  # send timestamps within the last second
+received = Counter()
+
+
+@app.route("/<version>/<phone_number_id>/messages", methods=["POST"])
+def send(version, phone_number_id):
+    time.sleep(MOCK_LATENCY)
+    now = time.monotonic()
+    with _lock:
+        _window[:] = [t for t in _window if now - t < 1.0]
+        if len(_window) >= MOCK_MPS:
+            return (
+                jsonify({"error": {"code": 130429, "message": "Rate limit hit"}}),
+                429,
+                {"Retry-After": "1"},
+            )
+        _window.append(now)
+
+    if random.random() < MOCK_FAILURE_RATE:
+        return jsonify({"error": {"code": 2, "message": "Service unavailable"}}), 500
+
+    to = (request.get_json(silent=True) or {}).get("to")
+    with _lock:
+        received[to] += 1
+    return jsonify(
+        {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+        }
+    )
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    with _lock:
+        duplicates = {k: v for k, v in received.items() if v > 1}
+        return jsonify({"recipients": len(received), "duplicates": duplicates})
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5055")), threaded=True)
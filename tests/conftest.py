@@ -0,0 +1,14 @@
+# Importing anything under app/ builds the Flask app, the OpenAI clients and
+# the boto3 resources; none of them talk to the network until used, so dummy
+# settings are enough for unit tests.
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+os.environ.setdefault(
+    "JD_INDEX_PATH", os.path.join(tempfile.mkdtemp(), "jd_index.json.gz")
+)
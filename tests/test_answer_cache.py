@@ -0,0 +1,79 @@
+from app.services.answer_cache import (
+    AnswerCache,
+    is_cacheable_question,
+    normalize,
+    same_question,
+)
+
+
+def make(fingerprint="v1"):
+    state = {"fingerprint": fingerprint}
+    return AnswerCache(lambda: state["fingerprint"], maxsize=10, ttl=60), state
+
+
+def test_normalize_drops_filler_and_punctuation():
+    assert normalize("Hi team, what is the SALARY?") == "what is the salary"
+
+
+def test_personal_and_sensitive_questions_are_not_cacheable():
+    assert is_cacheable_question("Is the DevOps role remote?")
+    assert not is_cacheable_question("Did you get my resume?")
+    assert not is_cacheable_question("Call me on 9876543210")
+    assert not is_cacheable_question("")
+
+
+def test_exact_hit_fills_in_the_candidate_name():
+    cache, _ = make()
+    cache.store("Is the DevOps role remote?", "Priya Shah", "Yes Priya, it is fully remote.", 2.5)
+    assert cache.lookup("is the devops role remote", "Ravi") == "Yes Ravi, it is fully remote."
+    assert cache.lookup("Is the DevOps role remote?") == "Yes there, it is fully remote."
+    stats = cache.stats()
+    assert stats["exact_hits"] == 2
+    assert stats["latency_saved_secs"] == 5.0
+
+
+def test_rephrasing_is_a_similar_hit():
+    cache, _ = make()
+    cache.store("Is the DevOps role remote?", "", "It is remote.")
+    assert cache.lookup("Is the DevOps role remotely?") == "It is remote."
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_negation_and_different_entity_miss():
+    cache, _ = make()
+    cache.store("Is the DevOps role remote?", "", "It is remote.")
+    assert cache.lookup("Is the DevOps role not remote?") is None
+    assert cache.lookup("Is the Java role remote?") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_personal_question_bypasses_cache():
+    cache, _ = make()
+    cache.store("Did you get my resume?", "", "Yes.")
+    assert cache.lookup("Did you get my resume?") is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_fingerprint_change_clears_entries():
+    cache, state = make()
+    cache.store("What is the salary?", "", "Competitive.")
+    state["fingerprint"] = "v2"
+    assert cache.lookup("What is the salary?") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_same_question_allows_minor_words_and_variants_only():
+    assert same_question("is the devops role remote", "devops job remotely")
+    assert not same_question("is devops role remote", "is devops role not remote")
+    assert not same_question("is java role remote", "is python role remote")
+
+
+def test_has_answer_does_not_count_as_a_lookup():
+    cache, _ = make()
+    cache.store("Is the DevOps role remote?", "", "It is remote.")
+    assert cache.has_answer("Is the DevOps role remotely?")
+    assert not cache.has_answer("Is the Java role remote?")
+    assert not cache.has_answer("Did you get my resume?")
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["similar_hits"], stats["misses"]) == (0, 0, 0)
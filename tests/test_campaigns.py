@@ -0,0 +1,97 @@
+import json
+from concurrent.futures import Future
+
+from app.services.campaigns import (
+    CampaignCheckpoint,
+    load_candidates,
+    run_campaign,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, message_id="wamid.1"):
+        self.status_code = status_code
+        self.text = "error" if status_code >= 400 else ""
+        self._message_id = message_id
+
+    def json(self):
+        return {"messages": [{"id": self._message_id}]}
+
+
+class FakeDispatcher:
+    """Completes each submit immediately; wa_ids in `failing` get a 400."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    def submit(self, message):
+        self.sent.append(message["to"])
+        future = Future()
+        if message["to"] == "raise":
+            future.set_exception(RuntimeError("boom"))
+        else:
+            status = 400 if message["to"] in self.failing else 200
+            future.set_result(FakeResponse(status))
+        return future
+
+
+def build(candidate):
+    return {"to": candidate["wa_id"]}
+
+
+def test_load_candidates_reads_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / "list.csv"
+    csv_path.write_text("phone,name\n+15550001,Ana\n,Nobody\n15550002,Ben\n")
+    assert [c["wa_id"] for c in load_candidates(str(csv_path))] == ["15550001", "15550002"]
+
+    jsonl_path = tmp_path / "list.jsonl"
+    jsonl_path.write_text('{"wa_id": "15550003", "name": "Cy"}\n\n{"name": "none"}\n')
+    candidates = list(load_candidates(str(jsonl_path)))
+    assert candidates == [{"wa_id": "15550003", "name": "Cy"}]
+
+
+def test_checkpoint_resumes_sent_ids_and_ignores_torn_line(tmp_path):
+    path = tmp_path / "campaign.jsonl"
+    path.write_text(
+        json.dumps({"wa_id": "1", "status": "sent"}) + "\n"
+        + json.dumps({"wa_id": "2", "status": "failed"}) + "\n"
+        + '{"wa_id": "3", "sta'
+    )
+    checkpoint = CampaignCheckpoint(str(path))
+    assert checkpoint.sent == {"1"}
+    checkpoint.record("4", "sent")
+    checkpoint.close()
+    assert CampaignCheckpoint(str(path)).sent == {"1", "4"}
+
+
+def test_run_campaign_skips_sent_and_duplicate_ids(tmp_path):
+    checkpoint = CampaignCheckpoint(str(tmp_path / "campaign.jsonl"))
+    checkpoint.record("1", "sent")
+    dispatcher = FakeDispatcher()
+    candidates = [{"wa_id": w} for w in ("1", "2", "3", "2")]
+
+    result = run_campaign(candidates, build, checkpoint, dispatcher=dispatcher)
+
+    assert dispatcher.sent == ["2", "3"]
+    assert (result["sent"], result["failed"], result["skipped"]) == (2, 0, 2)
+    assert checkpoint.sent == {"1", "2", "3"}
+
+
+def test_run_campaign_records_failures(tmp_path):
+    path = tmp_path / "campaign.jsonl"
+    checkpoint = CampaignCheckpoint(str(path))
+    dispatcher = FakeDispatcher(failing={"2"})
+    candidates = [{"wa_id": w} for w in ("1", "2", "raise")]
+
+    result = run_campaign(candidates, build, checkpoint, dispatcher=dispatcher, max_pending=1)
+    checkpoint.close()
+
+    assert (result["sent"], result["failed"]) == (1, 2)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    by_id = {r["wa_id"]: r for r in records}
+    assert by_id["1"]["message_id"] == "wamid.1"
+    assert by_id["2"]["status_code"] == 400
+    assert by_id["raise"]["error"] == "boom"
+    # A failed candidate is retried on the next run
+    assert CampaignCheckpoint(str(path)).sent == {"1"}
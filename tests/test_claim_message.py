@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services import dynamodb
+from app.services.dynamodb import claim_message, complete_message, recent_message_ids
+
+
+def matches(condition, item) -> bool:
+    """Evaluate the boto3 conditions claim_message uses against a stored item."""
+    expression = condition.get_expression()
+    operator, values = expression["operator"], expression["values"]
+    if operator == "OR":
+        return matches(values[0], item) or matches(values[1], item)
+    if operator == "AND":
+        return matches(values[0], item) and matches(values[1], item)
+    if operator == "attribute_not_exists":
+        return item is None or values[0].name not in item
+    if item is None or values[0].name not in item:
+        return False
+    if operator == "=":
+        return item[values[0].name] == values[1]
+    if operator == "<":
+        return item[values[0].name] < values[1]
+    raise NotImplementedError(operator)
+
+
+class FakeProcessedTable:
+    def __init__(self):
+        self.items = {}
+        self.puts = 0
+
+    def put_item(self, Item, ConditionExpression, ReturnValuesOnConditionCheckFailure):
+        self.puts += 1
+        old = self.items.get(Item["message_id"])
+        if not matches(ConditionExpression, old):
+            raise ClientError(
+                {
+                    "Error": {"Code": "ConditionalCheckFailedException"},
+                    "Item": {k: {"S": v} for k, v in old.items() if isinstance(v, str)},
+                },
+                "PutItem",
+            )
+        self.items[Item["message_id"]] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        self.items[Key["message_id"]]["status"] = ExpressionAttributeValues[":done"]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    fake = FakeProcessedTable()
+    monkeypatch.setattr(dynamodb, "processed_table", fake)
+    recent_message_ids.clear()
+    yield fake
+    recent_message_ids.clear()
+
+
+def test_second_claim_fails_while_the_lease_holds(table):
+    assert claim_message("wamid.1", lease_until=time.time() + 60)
+    assert not claim_message("wamid.1", lease_until=time.time() + 60)
+    assert table.items["wamid.1"]["status"] == "processing"
+    assert "wamid.1" not in recent_message_ids  # may still need a redelivery
+
+
+def test_expired_lease_can_be_claimed_again(table):
+    assert claim_message("wamid.1", lease_until=time.time() - 5)
+    assert claim_message("wamid.1", lease_until=time.time() + 60)
+
+
+def test_completed_message_is_a_duplicate_from_then_on(table):
+    assert claim_message("wamid.1", lease_until=time.time() - 5)
+    complete_message("wamid.1")
+    assert table.items["wamid.1"]["status"] == "done"
+    assert not claim_message("wamid.1")
+    puts = table.puts
+    assert not claim_message("wamid.1")  # answered from recent_message_ids
+    assert table.puts == puts
+
+
+def test_record_without_status_counts_as_done(table):
+    table.items["wamid.1"] = {"message_id": "wamid.1", "processed_at": "2025-01-01"}
+    assert not claim_message("wamid.1")
+    assert "wamid.1" in recent_message_ids
+
+
+def test_default_lease_and_missing_id(table):
+    assert claim_message(None)
+    assert claim_message("wamid.2")
+    lease = table.items["wamid.2"]["lease_until"]
+    assert lease == pytest.approx(time.time() + dynamodb.CLAIM_LEASE_SECONDS, abs=2)
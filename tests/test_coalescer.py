@@ -0,0 +1,97 @@
+from app.tasks.coalescer import MessageCoalescer, merge_payloads
+
+
+class FakeTimer:
+    def __init__(self, delay, fn):
+        self.delay = delay
+        self.fn = fn
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeClock:
+    """call_later that only records timers; fire() runs the live ones."""
+
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, fn):
+        timer = FakeTimer(delay, fn)
+        self.timers.append(timer)
+        return timer
+
+    def fire(self):
+        for timer in list(self.timers):
+            if not timer.cancelled:
+                timer.fn()
+
+
+def make(window=2.0, max_wait=6.0):
+    flushed = []
+    clock = FakeClock()
+    coalescer = MessageCoalescer(
+        lambda key, items: flushed.append((key, items)),
+        window=window,
+        max_wait=max_wait,
+        call_later=clock.call_later,
+    )
+    return coalescer, clock, flushed
+
+
+def test_items_for_one_key_flush_as_one_batch():
+    coalescer, clock, flushed = make()
+    coalescer.add("a", 1)
+    coalescer.add("b", 10)
+    coalescer.add("a", 2)
+    assert flushed == []
+    assert [t.cancelled for t in clock.timers] == [True, False, False]
+
+    clock.fire()
+    assert sorted(flushed) == [("a", [1, 2]), ("b", [10])]
+    assert coalescer.batches_flushed == 2
+    assert coalescer.items_coalesced == 1
+
+
+def test_non_coalescible_item_flushes_pending_batch_first():
+    coalescer, clock, flushed = make()
+    coalescer.add("a", "text")
+    coalescer.add("a", "document", coalescible=False)
+    assert flushed == [("a", ["text"]), ("a", ["document"])]
+    clock.fire()  # the cancelled timer must not flush again
+    assert len(flushed) == 2
+
+
+def test_flush_all_drains_every_key():
+    coalescer, clock, flushed = make()
+    coalescer.add("a", 1)
+    coalescer.add("b", 2)
+    coalescer.flush_all()
+    assert sorted(flushed) == [("a", [1]), ("b", [2])]
+    clock.fire()
+    assert len(flushed) == 2
+
+
+def test_window_never_exceeds_max_wait():
+    coalescer, clock, _ = make(window=2.0, max_wait=0.5)
+    coalescer.add("a", 1)
+    assert clock.timers[0].delay <= 0.5
+
+
+def test_merge_payloads_joins_texts():
+    payloads = [
+        {"wa_id": "1", "message_id": "m1", "message_body": "Hi ", "deadline_at": 20},
+        {"wa_id": "1", "message_id": "m2", "message_body": " "},
+        {"wa_id": "1", "message_id": "m3", "message_body": "any jobs?", "deadline_at": 25},
+    ]
+    merged = merge_payloads(payloads)
+    assert merged["message_body"] == "Hi\nany jobs?"
+    assert merged["message_ids"] == ["m1", "m2", "m3"]
+    assert merged["message_id"] == "m3"
+    assert merged["deadline_at"] == 20
+
+
+def test_merge_single_payload_is_unchanged():
+    payload = {"wa_id": "1", "message_id": "m1", "message_body": "Hi"}
+    assert merge_payloads([payload]) is payload
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from app.utils.deadline import (
+    DeadlineExceeded,
+    bounded_timeout,
+    check_deadline,
+    deadline_expired,
+    deadline_scope,
+    new_deadline,
+    time_left,
+)
+
+
+def test_no_deadline_outside_a_scope():
+    assert time_left() is None
+    assert bounded_timeout(30) == 30
+    assert not deadline_expired(reserve=1000)
+    check_deadline("anything", 1000)
+
+
+def test_timeouts_are_capped_to_time_left():
+    with deadline_scope(new_deadline(5)):
+        assert 4 < time_left() <= 5
+        assert 4 < bounded_timeout(30) <= 5
+        assert bounded_timeout(2) == 2
+    assert time_left() is None
+
+
+def test_bounded_timeout_keeps_a_floor_once_expired():
+    with deadline_scope(time.time() - 1):
+        assert time_left() == 0
+        assert bounded_timeout(30) == 1.0
+        assert bounded_timeout(30, floor=0.5) == 0.5
+
+
+def test_check_deadline_honours_reserve():
+    with deadline_scope(new_deadline(5)):
+        check_deadline("reply", 1)
+        assert deadline_expired(reserve=10)
+        with pytest.raises(DeadlineExceeded, match="reply"):
+            check_deadline("reply", 10)
+
+
+def test_scopes_nest_and_restore():
+    with deadline_scope(new_deadline(100)):
+        with deadline_scope(new_deadline(1)):
+            assert time_left() <= 1
+        assert time_left() > 50
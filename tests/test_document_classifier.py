@@ -0,0 +1,107 @@
+import io
+import zipfile
+
+import pytest
+
+from app.services.document_classifier import (
+    AMBIGUOUS,
+    NOT_RESUME,
+    RESUME,
+    _has_phone,
+    pre_classify,
+    score_resume,
+    sniff_type,
+)
+
+RESUME_TEXT = """Priya Shah
+priya.shah@example.com | +1 (555) 123-4567 | linkedin.com/in/priyashah
+
+Professional Summary
+DevOps engineer with eight years of experience running cloud infrastructure.
+
+Experience
+Senior DevOps Engineer, Acme Corp, Jan 2020 - Present
+Built Kubernetes platforms and Terraform modules for forty product teams.
+DevOps Engineer, Globex, 2016 - 2019
+Automated deployments and cut release time from days to minutes.
+
+Education
+B.Tech Computer Science, 2012 - 2016
+
+Skills
+Kubernetes, Terraform, AWS, Python, Go, Jenkins, Prometheus, Grafana, Linux,
+networking, incident response, mentoring, cost optimization, security reviews.
+"""
+
+INVOICE_TEXT = "Invoice 2291\nAmount due: $420.00\nThank you for your business."
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Call +1 (555) 123-4567", True),
+        ("Phone: 98765 43210", True),
+        ("Acme 2019 - 2021 2022", False),
+        ("Worked 2015-2018, 2018 – 2021", False),
+        ("Order 123456", False),
+    ],
+)
+def test_has_phone_ignores_year_ranges(text, expected):
+    assert _has_phone(text) is expected
+
+
+def test_score_resume_rewards_resume_signals():
+    score, reasons = score_resume(RESUME_TEXT)
+    assert score >= 6
+    assert "email address" in reasons
+    assert "phone number" in reasons
+
+
+def test_pre_classify_accepts_a_text_resume():
+    result = pre_classify(io.BytesIO(RESUME_TEXT.encode()))
+    assert (result.decision, result.kind) == (RESUME, "text")
+    assert result.text.startswith("Priya Shah")
+    assert result.as_verdict()["is_resume"] is True
+
+
+def test_pre_classify_rejects_short_invoice_with_a_candidate_facing_reason():
+    result = pre_classify(io.BytesIO(INVOICE_TEXT.encode()))
+    assert result.decision == NOT_RESUME
+    assert "invoice" not in result.reason and "words" not in result.reason
+    verdict = result.as_verdict()
+    assert verdict["is_resume"] is False
+    assert "invoice" in verdict["details"]
+
+
+def test_headings_without_contact_details_are_not_accepted_locally():
+    report = "\n\n".join(
+        f"{heading}\n" + " ".join(["The team reviewed the quarterly numbers in detail."] * 4)
+        for heading in ("Summary", "Experience", "Education", "Skills", "Projects")
+    )
+    score, _ = score_resume(report)
+    assert score >= 6
+    result = pre_classify(io.BytesIO(report.encode()))
+    assert result.decision == AMBIGUOUS
+    assert "no contact details" in result.details
+
+
+def test_pre_classify_leaves_unclear_text_to_the_model():
+    text = " ".join(["Notes from the weekly planning meeting."] * 20)
+    assert pre_classify(io.BytesIO(text.encode())).decision == AMBIGUOUS
+
+
+def test_images_are_rejected_by_magic_bytes():
+    renamed_jpeg = io.BytesIO(b"\xff\xd8\xff\xe0" + b"\x00" * 32)
+    result = pre_classify(renamed_jpeg)
+    assert (result.decision, result.kind) == (NOT_RESUME, "image")
+
+
+def test_sniff_type_tells_docx_from_other_zips():
+    docx, xlsx = io.BytesIO(), io.BytesIO()
+    with zipfile.ZipFile(docx, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document/>")
+    with zipfile.ZipFile(xlsx, "w") as archive:
+        archive.writestr("xl/workbook.xml", "<workbook/>")
+    assert sniff_type(docx) == "docx"
+    assert sniff_type(xlsx) == "spreadsheet"
+    assert docx.tell() == 0
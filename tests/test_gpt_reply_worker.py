@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from app.tasks import gpt_reply_worker
+from app.tasks.gpt_reply_worker import starts_run
+
+
+class FakeCache:
+    def __init__(self, answered=()):
+        self.answered = set(answered)
+
+    def has_answer(self, message):
+        return message in self.answered
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fake = FakeCache({"What is the salary?"})
+    monkeypatch.setattr(gpt_reply_worker, "answer_cache", fake)
+    return fake
+
+
+def text(body, deadline_in=60):
+    return {"message_type": "text", "message_body": body, "deadline_at": time.time() + deadline_in}
+
+
+def test_question_for_the_model_starts_a_run(cache):
+    assert starts_run(text("Which Java roles need AWS experience?"))
+
+
+def test_fast_paths_do_not_start_a_run(cache):
+    assert not starts_run(text("ok thanks"))  # canned intent
+    assert not starts_run(text("What is the salary?"))  # cached answer
+    assert not starts_run(text("Which Java roles need AWS experience?", deadline_in=1))
+    assert not starts_run({"message_type": "document", "media_id": "m1"})
+    assert not starts_run(text("   "))
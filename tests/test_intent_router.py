@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.intent_router import Intent, IntentRouter
+
+router = IntentRouter()
+
+
+@pytest.mark.parametrize(
+    "text, intent",
+    [
+        ("Can I upload my resume here?", "upload_resume"),
+        ("I want to send my updated CV", "upload_resume"),
+        ("I have a new resume", "update_resume"),
+        ("Can I update my CV?", "update_resume"),
+        ("Here is my latest resume", "update_resume"),
+        ("How do I apply?", "how_to_apply"),
+        ("Hello", "greeting"),
+        ("Good morning!", "greeting"),
+        ("Thank you so much", "thanks"),
+    ],
+)
+def test_messages_route_to_their_intent(text, intent):
+    assert router.match(text).name == intent
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "No thanks, not interested",
+        "nah thanks",
+        "Any update on my application? I sent my resume last week.",
+        "Do you have new roles that match my resume?",
+        "Can you send me the job description file?",
+        "What is the salary for the DevOps role?",
+        "Hi, I saw your posting for a Java developer and wanted to know more",
+        "This is archival",  # "hi" inside a word is not a greeting
+        "",
+    ],
+)
+def test_other_messages_are_not_routed(text):
+    assert router.match(text) is None
+
+
+def test_route_renders_name_and_counts():
+    counted = IntentRouter()
+    route = counted.route("hey")
+    assert route.name == "greeting"
+    assert route.reply("Ravi").startswith("Hi Ravi!")
+    assert counted.route("what roles are open?") is None
+    assert counted.stats() == {
+        "routed": 2,
+        "matched": 1,
+        "match_rate": 0.5,
+        "by_intent": {"greeting": 1},
+    }
+
+
+def test_higher_priority_intent_wins_and_shared_keywords_work():
+    intents = [
+        Intent("low", groups=(("visa",),), reply="low"),
+        Intent("high", groups=(("visa",), ("sponsor", "sponsorship")), reply="high", priority=1),
+    ]
+    custom = IntentRouter(intents)
+    assert custom.match("Do you offer visa sponsorship?").name == "high"
+    assert custom.match("Visa question").name == "low"
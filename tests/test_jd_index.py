@@ -0,0 +1,74 @@
+import os
+
+from app.services.jd_index import JDIndex, chunk_document, tokenize
+
+JAVA_JD = """1. Java Developer
+Key Responsibilities
+* Build Spring Boot microservices on AWS.
+Required Qualifications
+* 5+ years of Java experience.
+"""
+
+DEVOPS_JD = """1. DevOps Engineer
+Key Responsibilities
+* Run Kubernetes clusters and Terraform pipelines.
+"""
+
+
+def make_index(tmp_path, **files):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for name, text in files.items():
+        (corpus / f"{name}.txt").write_text(text, encoding="utf-8")
+    return JDIndex(str(corpus), str(tmp_path / "index.json.gz")), corpus
+
+
+def test_tokenize_drops_stopwords_and_plural_s():
+    assert tokenize("What are the Developers' skills in C++?") == ["developer", "skill", "c++"]
+
+
+def test_chunk_document_splits_sections_under_job_title():
+    chunks = chunk_document(JAVA_JD)
+    headings = [c["text"].splitlines()[0] for c in chunks]
+    assert headings == [
+        "Java Developer - Key Responsibilities",
+        "Java Developer - Required Qualifications",
+    ]
+
+
+def test_search_ranks_matching_job_first(tmp_path):
+    index, _ = make_index(tmp_path, java=JAVA_JD, devops=DEVOPS_JD)
+    hits = index.search("kubernetes terraform", k=2)
+    assert hits and hits[0][1].startswith("DevOps Engineer")
+    assert index.search("underwater basket weaving") == []
+
+
+def test_refresh_picks_up_edits_and_removals(tmp_path):
+    index, corpus = make_index(tmp_path, java=JAVA_JD)
+    index.refresh()
+    version = index.version
+    assert not index.search("kubernetes")
+
+    (corpus / "devops.txt").write_text(DEVOPS_JD, encoding="utf-8")
+    assert index.refresh()
+    assert index.version != version
+    assert index.search("kubernetes")
+
+    os.remove(corpus / "java.txt")
+    assert index.refresh()
+    assert not index.search("spring")
+    assert not index.refresh()
+
+
+def test_persisted_index_is_reused(tmp_path):
+    index, corpus = make_index(tmp_path, java=JAVA_JD)
+    index.refresh()
+    reloaded = JDIndex(str(corpus), index.index_path)
+    assert not reloaded.refresh()  # nothing re-chunked
+    assert reloaded.stats() == index.stats()
+
+
+def test_has_passages_is_false_for_empty_corpus(tmp_path):
+    index, _ = make_index(tmp_path)
+    assert not index.has_passages()
+    assert index.search("java") == []
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utils.keyed_executor import AsyncKeyedExecutor, KeyedExecutor
+
+
+def test_same_key_runs_in_submission_order():
+    executor = KeyedExecutor(max_workers=4)
+    order = []
+
+    def work(n):
+        time.sleep(0.01 * (3 - n))  # later tasks are faster; order must hold anyway
+        order.append(n)
+
+    futures = [executor.submit("wa1", work, n) for n in range(3)]
+    for future in futures:
+        future.result(timeout=5)
+    assert order == [0, 1, 2]
+    executor.shutdown()
+
+
+def test_different_keys_run_in_parallel():
+    executor = KeyedExecutor(max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    # Deadlocks (BrokenBarrierError) unless both keys run at the same time
+    futures = [executor.submit(key, barrier.wait) for key in ("wa1", "wa2")]
+    for future in futures:
+        future.result(timeout=5)
+    executor.shutdown()
+
+
+def test_exceptions_reach_the_future_and_the_key_keeps_draining():
+    executor = KeyedExecutor(max_workers=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    failed = executor.submit("wa1", fail)
+    after = executor.submit("wa1", lambda: "ok")
+    with pytest.raises(ValueError):
+        failed.result(timeout=5)
+    assert after.result(timeout=5) == "ok"
+    executor.shutdown()
+
+
+def test_in_flight_counts_queued_and_running_tasks():
+    executor = KeyedExecutor(max_workers=1, max_in_flight=3)
+    release = threading.Event()
+    futures = [executor.submit("wa1", release.wait, 5) for _ in range(3)]
+    assert executor.in_flight == 3
+    assert executor.free_capacity() == 0
+    assert executor.wait_for_capacity(timeout=0.05) == 0
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert executor.wait_for_capacity(timeout=1) == 3
+    executor.shutdown()
+
+
+def test_async_executor_orders_per_key_and_tracks_capacity():
+    async def main():
+        executor = AsyncKeyedExecutor(max_in_flight=4)
+        order = []
+
+        async def work(key, n):
+            await asyncio.sleep(0.01 * (3 - n))
+            order.append((key, n))
+
+        for n in range(3):
+            executor.submit("wa1", work, "wa1", n)
+        executor.submit("wa2", work, "wa2", 0)
+        assert executor.free_capacity() == 0
+        await executor.join()
+        assert [n for key, n in order if key == "wa1"] == [0, 1, 2]
+        # wa2 didn't wait behind wa1's chain
+        assert order.index(("wa2", 0)) < order.index(("wa1", 2))
+        assert executor.in_flight == 0
+
+    asyncio.run(main())
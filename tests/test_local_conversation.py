@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import openai_service
+from app.services.openai_service import (
+    _load_conversation,
+    _summarize_turns,
+    build_context_messages,
+    conversation_cache,
+)
+
+
+def ts(minute):
+    return f"2026-01-01T10:{minute:02d}:00+00:00"
+
+
+def stored(message_id, body, message_type, minute):
+    return {
+        "message_id": message_id,
+        "message_body": body,
+        "message_type": message_type,
+        "timestamp": ts(minute),
+    }
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Fake messages and summaries tables behind openai_service."""
+    state = {"messages": [], "summary": None, "saved": []}
+    monkeypatch.setattr(
+        openai_service, "get_recent_messages", lambda wa_id, limit: list(state["messages"])
+    )
+    monkeypatch.setattr(openai_service, "get_conversation_summary", lambda wa_id: state["summary"])
+    monkeypatch.setattr(
+        openai_service,
+        "save_conversation_summary",
+        lambda wa_id, summary, through: state["saved"].append((summary, through)),
+    )
+    monkeypatch.setattr(openai_service, "CONVERSATION_SYNC_SECS", 0)
+    conversation_cache.clear()
+    yield state
+    conversation_cache.clear()
+
+
+def test_cold_load_restores_saved_summary_and_skips_folded_turns(store):
+    store["summary"] = {"summary": "Asked about Java roles.", "summarized_through": ts(1)}
+    store["messages"] = [
+        stored("m2", "Is it remote?", "user", 2),
+        stored("m1", "Java roles?", "user", 1),
+        stored("m3", "Yes, fully remote.", "assistant", 3),
+    ]
+    convo = _load_conversation("15550001")
+    assert convo["summary"] == "Asked about Java roles."
+    assert [t["message_id"] for t in convo["turns"]] == ["m2", "m3"]
+
+    messages = build_context_messages("system", convo["summary"], convo["turns"], 1000)
+    assert messages[-1] == {"role": "assistant", "content": "Yes, fully remote."}
+
+
+def test_cached_conversation_picks_up_turns_from_other_workers(store):
+    store["messages"] = [stored("m1", "Hi", "user", 1)]
+    convo = _load_conversation("15550001")
+    store["messages"] = [
+        stored("m3", "Answered elsewhere", "assistant", 3),
+        stored("m2", "Question elsewhere", "user", 2),
+        stored("m1", "Hi", "user", 1),
+    ]
+    assert _load_conversation("15550001") is convo
+    assert [t["message_id"] for t in convo["turns"]] == ["m1", "m2", "m3"]
+
+
+def test_summary_is_saved_and_folded_turns_stay_out(store, monkeypatch):
+    completion = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Candidate asked about Java."))]
+    )
+    fake_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: completion))
+    )
+    monkeypatch.setattr(openai_service, "client", fake_client)
+    store["messages"] = [stored("m1", "Java roles?", "user", 1), stored("m2", "Two open.", "assistant", 2)]
+    convo = _load_conversation("15550001")
+
+    _summarize_turns("15550001", convo, convo["turns"][:1], "")
+
+    assert store["saved"] == [("Candidate asked about Java.", ts(1))]
+    assert [t["message_id"] for t in _load_conversation("15550001")["turns"]] == ["m2"]
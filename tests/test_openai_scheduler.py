@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from app.services.openai_scheduler import (
+    AsyncScheduledTransport,
+    MemoryBudget,
+    OpenAIScheduler,
+    ScheduledTransport,
+    background_priority,
+    estimate_request_tokens,
+    parse_duration,
+    retry_after,
+)
+
+
+class FakeBackend:
+    remote = False
+
+    def __init__(self, wait=0.0):
+        self.wait = wait
+        self.taken = []
+        self.paused = []
+
+    def try_take(self, tokens, reserve=0.0):
+        self.taken.append((tokens, reserve))
+        return self.wait
+
+    def pause(self, seconds):
+        self.paused.append(seconds)
+
+
+def client_for(scheduler, handler):
+    return httpx.Client(
+        transport=ScheduledTransport(scheduler, httpx.MockTransport(handler)),
+        base_url="https://api.openai.test/v1",
+    )
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [("1s", 1.0), ("6m0s", 360.0), ("120ms", 0.12), ("1h2m", 3720.0), ("", None), (None, None)],
+)
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after({"retry-after": "2"}) == 2.0
+    assert retry_after({"retry-after": "soon"}) is None
+    assert retry_after({}) is None
+
+
+def test_memory_budget_keeps_reserve_for_interactive_calls():
+    budget = MemoryBudget(rpm=10, tpm=100000)
+    for _ in range(8):
+        assert budget.try_take(0, reserve=0.2) == 0
+    assert budget.try_take(0, reserve=0.2) > 0
+    assert budget.try_take(0) == 0
+    budget.pause(5)
+    assert budget.try_take(0) > 0
+
+
+def test_memory_budget_refunds_request_when_tokens_run_out():
+    budget = MemoryBudget(rpm=2, tpm=1000)
+    assert budget.try_take(1000) == 0
+    assert budget.try_take(10) > 0
+    # The refused call gave its request back, so one more still fits
+    assert budget.requests.try_acquire() == 0
+
+
+def test_acquire_passes_reserve_only_for_background_work():
+    backend = FakeBackend()
+    scheduler = OpenAIScheduler(backend, reserve=0.25)
+    scheduler.acquire(100)
+    with background_priority():
+        scheduler.acquire(50)
+    assert backend.taken == [(100, 0.0), (50, 0.25)]
+    assert sum(scheduler.stats()["granted"].values()) == 2
+
+
+def test_acquire_sends_anyway_after_max_wait():
+    scheduler = OpenAIScheduler(FakeBackend(wait=10), max_wait=0.05)
+    scheduler.acquire()
+    assert scheduler.stats()["forced"] == 1
+
+
+def test_get_requests_skip_the_budget():
+    backend = FakeBackend()
+    client = client_for(OpenAIScheduler(backend), lambda request: httpx.Response(200))
+    client.get("/threads/t1/runs/r1")
+    assert backend.taken == []
+    client.post("/chat/completions", json={"messages": [{"content": "x" * 40}], "max_tokens": 10})
+    assert backend.taken == [(24, 0.0)]
+
+
+def test_429_pauses_budget_once_and_returns_response():
+    backend = FakeBackend()
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"retry-after": "2"}, json={"error": {}})
+
+    scheduler = OpenAIScheduler(backend)
+    response = client_for(scheduler, handler).post("/threads/t1/runs", json={})
+    assert response.status_code == 429
+    assert len(calls) == 1  # the SDK owns retries
+    assert len(backend.paused) == 1 and 2 <= backend.paused[0] <= 2.5
+    assert scheduler.stats()["throttled"] == 1
+
+
+def test_insufficient_quota_does_not_pause():
+    backend = FakeBackend()
+    body = {"error": {"code": "insufficient_quota"}}
+    client = client_for(OpenAIScheduler(backend), lambda r: httpx.Response(429, json=body))
+    client.post("/chat/completions", json={})
+    assert backend.paused == []
+
+
+def test_exhausted_limit_header_pauses_until_reset():
+    backend = FakeBackend()
+    headers = {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1.5s"}
+    client = client_for(OpenAIScheduler(backend), lambda r: httpx.Response(200, headers=headers))
+    client.post("/chat/completions", json={})
+    assert backend.paused == [1.5]
+
+
+def test_run_token_estimate_counts_instructions():
+    request = httpx.Request(
+        "POST",
+        "https://api.openai.test/v1/threads/t1/runs",
+        content=json.dumps({"instructions": "x" * 400}).encode(),
+    )
+    assert estimate_request_tokens(request) > 100
+    get = httpx.Request("GET", "https://api.openai.test/v1/threads/t1/runs")
+    assert estimate_request_tokens(get) == 0
+
+
+def test_async_transport_pauses_remote_budget_off_the_event_loop():
+    class RemoteBackend(FakeBackend):
+        remote = True
+
+        def pause(self, seconds):
+            self.paused.append((seconds, threading.current_thread()))
+
+    backend = RemoteBackend()
+    headers = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"}
+
+    async def handler(request):
+        return httpx.Response(200, headers=headers)
+
+    async def send():
+        transport = AsyncScheduledTransport(
+            OpenAIScheduler(backend), httpx.MockTransport(handler)
+        )
+        async with httpx.AsyncClient(
+            transport=transport, base_url="https://api.openai.test/v1"
+        ) as client:
+            await client.get("/models")
+
+    asyncio.run(send())
+    assert [seconds for seconds, _ in backend.paused] == [2.0]
+    assert backend.paused[0][1] is not threading.main_thread()
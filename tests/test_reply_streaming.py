@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from app.services.assistant_runs import RunEvent, execute_run
+from app.services.reply_streaming import WhatsAppSentenceStreamer
+
+
+def make_streamer(min_chars=10):
+    sent = []
+    streamer = WhatsAppSentenceStreamer(
+        "15550001", min_chars=min_chars, send=lambda message: sent.append(message["text"]["body"])
+    )
+    return streamer, sent
+
+
+def delta(text, message_id="msg_1"):
+    block = SimpleNamespace(text=SimpleNamespace(value=text))
+    data = SimpleNamespace(id=message_id, delta=SimpleNamespace(content=[block]))
+    return SimpleNamespace(event="thread.message.delta", data=data)
+
+
+class DroppingStream:
+    """Run stream that yields some events, then loses the connection."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        yield from self.events
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.test"))
+
+
+def fake_client(stream):
+    runs = SimpleNamespace(
+        stream=lambda **kwargs: stream,
+        retrieve=lambda **kwargs: SimpleNamespace(status="completed"),
+    )
+    return SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+
+
+def test_sentences_are_sent_once_enough_text_accumulates():
+    streamer, sent = make_streamer()
+    for text in ("Hi. ", "First sentence is here. ", "Second one"):
+        streamer.on_event(RunEvent("delta", text=text))
+    assert sent == ["Hi. First sentence is here."]
+    streamer.finish("Hi. First sentence is here. Second one")
+    assert sent == ["Hi. First sentence is here.", "Second one"]
+
+
+def test_failed_run_drops_the_unsent_tail():
+    streamer, sent = make_streamer(min_chars=1000)
+    streamer.on_event(RunEvent("delta", text="Partial answer. "))
+    streamer.on_event(RunEvent("failed", status="failed"))
+    streamer.finish("Partial answer. More")
+    assert sent == []
+
+
+def test_stream_dropped_midway_sends_the_rest_of_the_polled_reply():
+    streamer, sent = make_streamer(min_chars=20)
+    created = SimpleNamespace(
+        event="thread.run.created", data=SimpleNamespace(id="run_1", status="queued")
+    )
+    stream = DroppingStream([created, delta("First sentence is here. "), delta("Second one ")])
+
+    result = execute_run(
+        fake_client(stream), "thread_1", "asst_1", on_event=streamer.on_event, stream=True
+    )
+
+    assert result.completed and result.text == ""  # fetched from messages.list later
+    assert sent == ["First sentence is here."]
+    assert not streamer.failed
+    streamer.finish("First sentence is here. Second one is longer. Third.")
+    assert sent == ["First sentence is here.", "Second one is longer. Third."]
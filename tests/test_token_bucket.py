@@ -0,0 +1,50 @@
+import time
+
+from app.utils.token_bucket import TokenBucket
+
+
+def test_try_acquire_takes_tokens_until_empty():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 1
+
+
+def test_reserve_keeps_tokens_back():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.try_acquire(reserve=1) == 0
+    assert bucket.try_acquire(reserve=1) > 0
+    assert bucket.try_acquire() == 0
+
+
+def test_refund_returns_tokens_up_to_capacity():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.try_acquire() == 0
+    bucket.refund()
+    assert bucket.try_acquire() == 0
+    bucket.refund(5)
+    assert bucket.try_acquire(2) > 0
+
+
+def test_acquire_times_out_when_bucket_is_empty():
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    assert bucket.acquire()
+    start = time.monotonic()
+    assert not bucket.acquire(timeout=0.05)
+    assert time.monotonic() - start < 1
+
+
+def test_acquire_waits_for_refill():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.acquire()
+    start = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - start >= 0.03
+
+
+def test_pause_blocks_grants_for_the_given_time():
+    bucket = TokenBucket(rate=10, capacity=10)
+    bucket.pause(1)
+    wait = bucket.try_acquire()
+    assert 1 < wait <= 1.2
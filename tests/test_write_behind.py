@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from app.services.write_behind import WriteBehindBuffer
+
+
+def test_flushes_once_flush_size_is_reached():
+    batches = []
+    written = threading.Event()
+
+    def sink(items):
+        batches.append(items)
+        written.set()
+        return []
+
+    buffer = WriteBehindBuffer(sink, flush_size=3, flush_interval=60)
+    for n in range(3):
+        buffer.put({"n": n})
+    assert written.wait(5)
+    assert batches == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+    buffer.close()
+
+
+def test_flushes_on_interval_below_flush_size():
+    written = threading.Event()
+    buffer = WriteBehindBuffer(
+        lambda items: written.set(), flush_size=100, flush_interval=0.05
+    )
+    buffer.put({"n": 1})
+    assert written.wait(5)
+    buffer.close()
+
+
+def test_flush_splits_into_batches_and_counts_failures():
+    batches = []
+
+    def sink(items):
+        batches.append(len(items))
+        return items[:1]  # first item of each batch "unprocessed"
+
+    buffer = WriteBehindBuffer(sink, flush_size=2, flush_interval=60)
+    buffer._closed = True  # keep the background thread out of it
+    buffer._pending = [(0.0, {"n": n}) for n in range(5)]
+    buffer.flush()
+    assert batches == [2, 2, 1]
+    assert buffer.stats()["flushed"] == 2
+    assert buffer.stats()["failed"] == 3
+
+
+def test_sink_exception_marks_the_batch_failed():
+    def sink(items):
+        raise RuntimeError("dynamodb down")
+
+    buffer = WriteBehindBuffer(sink, flush_size=10, flush_interval=60)
+    buffer.put({"n": 1})
+    buffer.close()
+    assert buffer.stats()["failed"] == 1
+    assert buffer.stats()["pending"] == 0
+
+
+def test_close_flushes_pending_and_rejects_new_items():
+    batches = []
+    buffer = WriteBehindBuffer(batches.append, flush_size=10, flush_interval=60)
+    buffer.put({"n": 1})
+    buffer.close()
+    assert batches == [[{"n": 1}]]
+    with pytest.raises(RuntimeError):
+        buffer.put({"n": 2})